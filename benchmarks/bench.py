@@ -0,0 +1,284 @@
+# Licensed under a 3-clause BSD style license - see LICENSE
+"""
+Benchmarks of the shipped example input files. Each case runs headless, with
+no plots and no progress bar, in a fresh process so that its peak resident
+memory is its own. The wall time of the solve, the right hand side
+evaluations, the peak RSS and the time spent writing the hdf5 database are
+recorded for each case.
+
+The timestep ``dt``, the final time ``tf`` and the pebble mesh size ``l`` of an
+input file can be overridden, which gives the scaling of the hot path with the
+number of timesteps and with the number of mesh components:
+
+    python benchmarks/bench.py
+    python benchmarks/bench.py --case default --sweep dt=0.01,0.005,0.0025
+    python benchmarks/bench.py --case pbfhr_sensitivity --solver BDF \\
+        --sweep l=0.001,0.0005,0.00025 --outfile scaling.csv
+"""
+import argparse
+import csv
+import multiprocessing
+import os
+import random
+import re
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import types
+import numpy as np
+from pyrk import driver
+from pyrk.db import database
+from pyrk.utilities.perf import perf
+
+examples = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                        'examples')
+
+CASES = {'default': ('default/input.py', {}),
+         'sfr_min': ('sfr/min.py', {}),
+         'pbfhr_impulse': ('pbfhr/coupled_0.001_impulse/input.py',
+                           {'tf': 0.5}),
+         'pbfhr_sensitivity': ('pbfhr/sensitivity/input.py', {'tf': 10.0}),
+         'pbfhr_prt_pke': ('pbfhr/multi_pt/prt_pke/input.py',
+                           {'t_feedback': 5.0, 'tf': 10.0}),
+         'pbfhr_prt_2ref': ('pbfhr/multi_pt/prt_2ref/input.py',
+                            {'t_feedback': 5.0, 'tf': 10.0})}
+"""CASES (dict): the input file of each case, relative to the examples
+directory, and the overrides that shorten it to a few seconds of wall time
+"""
+
+UNITS = {'dt': 'seconds', 'tf': 'seconds', 't_feedback': 'seconds',
+         'l': 'meter'}
+"""UNITS (dict): the parameters that can be overridden, and their units"""
+
+RHS = ['f_n', 'f_th', 'f_coupled', 'dtempdt']
+"""RHS (list): the perf counters of the right hand side evaluations"""
+
+FIELDS = ['case', 'solver', 'dt', 'tf', 'l', 'timesteps', 'solved',
+          'components', 'wall', 'rhs_evals'] + RHS + ['h5_write',
+                                                      'peak_rss_mb']
+
+
+def load_case(infile_path, seed=0, **overrides):
+    """Imports the input file as a new module, with some of its parameters
+    replaced. The random module is seeded first, for the input files that
+    draw their parameters at random.
+
+    :param infile_path: path to the input file
+    :type infile_path: string
+    :param seed: the seed of the random module
+    :type seed: int
+    :param overrides: the new values of dt, tf, t_feedback or l, as floats in
+      seconds or meters
+    :type overrides: dict
+    """
+    with open(infile_path) as f:
+        source = f.read()
+    for name, value in overrides.items():
+        if name not in UNITS:
+            msg = "Only " + ", ".join(sorted(UNITS)) + " can be overridden, "
+            msg += "not " + name + "."
+            raise KeyError(msg)
+        line = name + " = " + repr(float(value)) + " * units." + UNITS[name]
+        source, n = re.subn(r'^' + name + r'\s*=.*$', line, source, count=1,
+                            flags=re.MULTILINE)
+        if n == 0:
+            msg = "The input file " + infile_path + " does not set " + name
+            msg += " at the top level, so it can not be overridden."
+            raise ValueError(msg)
+    random.seed(seed)
+    np.random.seed(seed)
+    infile = types.ModuleType(driver.name_from_path(infile_path))
+    infile.__file__ = infile_path
+    exec(compile(source, infile_path, 'exec'), infile.__dict__)
+    return infile
+
+
+def peak_rss_mb():
+    """The peak resident memory of this process, in MiB"""
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macOS bytes
+    if sys.platform == 'darwin':
+        return maxrss / 2.0**20
+    return maxrss / 2.0**10
+
+
+def run_case(case, solver=None, **overrides):
+    """Simulates one case and measures it. The database is written to a
+    temporary directory, which is removed afterwards.
+
+    :param case: the name of the case, among CASES
+    :type case: str
+    :param solver: the solver, that of the input file by default
+    :type solver: str
+    :param overrides: the new values of dt, tf, t_feedback or l, on top of
+      those of the case
+    :type overrides: dict
+    :return: a row of measurements, with the FIELDS as keys
+    :rtype: dict
+    """
+    path, defaults = CASES[case]
+    params = dict(defaults)
+    params.update(overrides)
+    infile_path = os.path.abspath(os.path.join(examples, path))
+    infile = load_case(infile_path, **params)
+    if solver is not None:
+        infile.solver = solver
+    tmpdir = tempfile.mkdtemp(prefix='pyrk_bench_')
+    try:
+        db = database.Database(filepath=os.path.join(tmpdir, 'pyrk.h5'))
+        si = driver.sim_from_infile(infile, db, infile_path=infile_path,
+                                    checkpoint=os.path.join(tmpdir, 'ckpt'))
+        start = time.perf_counter()
+        sol = driver.solve(si=si, y=si.y, infile=infile,
+                           show_progress=False)
+        wall = time.perf_counter() - start
+        db.close_db()
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    row = {'case': case,
+           'solver': si.solver,
+           'dt': si.timer._dt,
+           'tf': float(si.timer._series[-1]),
+           'l': params.get('l', getattr(infile, 'l', None)),
+           'timesteps': si.timer.timesteps(),
+           # fewer if the integrator gave up, or a terminal event occurred
+           'solved': len(sol),
+           'components': len(si.components),
+           'wall': wall,
+           'rhs_evals': sum(perf.count(name) for name in RHS),
+           'h5_write': perf.times.get('record_all', 0.0),
+           'peak_rss_mb': peak_rss_mb()}
+    if hasattr(row['l'], 'magnitude'):
+        row['l'] = float(row['l'].to('meter').magnitude)
+    for name in RHS:
+        row[name] = perf.count(name)
+    return row
+
+
+def _run_case(args):
+    case, solver, overrides = args
+    return run_case(case, solver=solver, **overrides)
+
+
+def run(cases, sweep=None, solver=None):
+    """Runs each case, each point of the sweep, in a fresh process
+
+    :param cases: the names of the cases
+    :type cases: list of str
+    :param sweep: the parameter to sweep and its values, e.g. ('dt', [0.01,
+      0.005])
+    :type sweep: tuple
+    :param solver: the solver, that of each input file by default
+    :type solver: str
+    :return: the rows of measurements
+    :rtype: list of dicts
+    """
+    tasks = []
+    for case in cases:
+        if case not in CASES:
+            msg = "Unknown case " + case + ", the cases are "
+            msg += ", ".join(sorted(CASES)) + "."
+            raise KeyError(msg)
+        if sweep is None:
+            tasks.append((case, solver, {}))
+        else:
+            name, values = sweep
+            tasks.extend((case, solver, {name: v}) for v in values)
+    rows = []
+    # a process per task, so that the peak RSS is that of the task alone
+    ctx = multiprocessing.get_context('spawn')
+    for task in tasks:
+        with ctx.Pool(1, maxtasksperchild=1) as pool:
+            rows.append(pool.apply(_run_case, (task,)))
+        print_row(rows[-1])
+    return rows
+
+
+def print_row(row):
+    """Prints a row of measurements on a single line"""
+    print("{case:<18} {solver:<9} dt={dt:<8g} steps={solved}/{timesteps} "
+          "comps={components:<4d} wall={wall:8.3f}s "
+          "rhs={rhs_evals:<8d} h5={h5_write:7.3f}s "
+          "rss={peak_rss_mb:7.1f}MiB".format(**row))
+    sys.stdout.flush()
+
+
+def write_csv(rows, outfile):
+    """Writes the rows of measurements to a csv file
+
+    :param rows: the rows of measurements
+    :type rows: list of dicts
+    :param outfile: the location of the csv file
+    :type outfile: str
+    """
+    with open(outfile, 'w') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def plot_scaling(rows, name, plotfile):
+    """Plots the wall time, the rhs evaluations and the hdf5 write time of
+    each case against the swept parameter, on log-log axes
+
+    :param rows: the rows of measurements
+    :type rows: list of dicts
+    :param name: the swept parameter
+    :type name: str
+    :param plotfile: the location of the figure
+    :type plotfile: str
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    fig, axes = plt.subplots(1, 3, figsize=(15, 4.5))
+    for case in sorted(set(row['case'] for row in rows)):
+        case_rows = [row for row in rows if row['case'] == case]
+        x = [row[name] for row in case_rows]
+        for ax, y in zip(axes, ['wall', 'rhs_evals', 'h5_write']):
+            ax.loglog(x, [row[y] for row in case_rows], 'o-', label=case)
+            ax.set_xlabel(name)
+            ax.set_ylabel(y)
+    axes[0].legend()
+    fig.tight_layout()
+    fig.savefig(plotfile)
+    plt.close(fig)
+
+
+def parse_sweep(arg):
+    """Parses a sweep argument, e.g. 'dt=0.01,0.005'"""
+    name, _, values = arg.partition('=')
+    if name not in UNITS or not values:
+        msg = "A sweep is given as name=v1,v2,..., with name among "
+        msg += ", ".join(sorted(UNITS)) + ", not " + arg + "."
+        raise ValueError(msg)
+    return name, [float(v) for v in values.split(',')]
+
+
+"""Run it as a script"""
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description='PyRK benchmarks')
+    ap.add_argument('--case',
+                    help='a case to run, all of them by default',
+                    action='append',
+                    choices=sorted(CASES))
+    ap.add_argument('--sweep',
+                    help='a parameter to sweep, e.g. dt=0.01,0.005,0.0025',
+                    default=None)
+    ap.add_argument('--solver',
+                    help='the solver, that of each input file by default',
+                    default=None)
+    ap.add_argument('--outfile',
+                    help='the name of the csv file of measurements',
+                    default='pyrk_bench.csv')
+    ap.add_argument('--plotfile',
+                    help='the name of the scaling plot of a sweep',
+                    default='pyrk_scaling.png')
+    args = ap.parse_args()
+    sweep = None if args.sweep is None else parse_sweep(args.sweep)
+    rows = run(args.case or sorted(CASES), sweep, args.solver)
+    write_csv(rows, args.outfile)
+    if sweep is not None:
+        plot_scaling(rows, sweep[0], args.plotfile)
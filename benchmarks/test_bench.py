@@ -0,0 +1,22 @@
+import pytest
+import bench
+
+
+def test_load_case():
+    path = bench.examples + '/pbfhr/sensitivity/input.py'
+    infile = bench.load_case(path, dt=0.05, tf=1.0, l=0.001)
+    assert infile.ti.timesteps() == 21
+    assert len(infile.components) == 16
+    with pytest.raises(ValueError):
+        bench.load_case(bench.examples + '/default/input.py', l=0.001)
+    with pytest.raises(KeyError):
+        bench.load_case(path, nsteps=10)
+
+
+def test_run_case():
+    row = bench.run_case('default', tf=0.05)
+    assert row['timesteps'] == row['solved'] == 11
+    assert row['components'] == 6
+    assert row['rhs_evals'] == sum(row[name] for name in bench.RHS) > 0
+    assert row['wall'] > row['h5_write'] > 0.0
+    assert row['peak_rss_mb'] > 0.0
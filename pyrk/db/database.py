@@ -1,10 +1,17 @@
 # Licensed under a 3-clause BSD style license - see LICENSE
+import numpy as np
 import tables as tb
 from pyrk.db import descriptions as desc
+from pyrk.inp import validation
+from pyrk.utilities.perf import perf
 
+import bisect
 import contextlib
 import sys
+import threading
+import time
 import six
+from six.moves import queue
 
 
 @contextlib.contextmanager
@@ -29,6 +36,94 @@ def nostderr():
         sys.stderr = savestderr
 
 
+def set_up_shared(h5file):
+    """Returns the tables shared by the runs of a multi-run file, by path,
+    creating those that are missing: sim_info, with one row per distinct
+    input file, and summary, with one row per run.
+
+    :param h5file: the open multi-run file
+    :type h5file: pytables File object
+    :rtype: dict
+    """
+    shared = [('sim_info', desc.SimInfoRow, 'Shared Simulation Information'),
+              ('summary', desc.RunSummaryRow, 'Run Summaries')]
+    tables = {}
+    for tablename, description, tabletitle in shared:
+        p = '/' + tablename
+        if p in h5file:
+            tables[p] = h5file.get_node(p)
+        else:
+            tables[p] = h5file.create_table('/', tablename, description,
+                                            tabletitle)
+    return tables
+
+
+def find_or_append(table, row_dict, key):
+    """Returns the index of the row of the table whose key column equals that
+    of row_dict, which is appended if there is none
+
+    :param table: handle to the table
+    :type table: pytables Table object
+    :param row_dict: the row
+    :type row_dict: dictionary of row keys and values
+    :param key: the column identifying the row
+    :type key: str
+    :rtype: int
+    """
+    # cut off as it would be in the table
+    value = np.array(row_dict[key], dtype=table.coldtypes[key])
+    hits = table.get_where_list('col == value',
+                                condvars={'col': table.colinstances[key],
+                                          'value': value})
+    if len(hits) > 0:
+        return int(hits[0])
+    for k, v in six.iteritems(row_dict):
+        table.row[k] = v
+    table.row.append()
+    table.flush()
+    return table.nrows - 1
+
+
+def merge_runs(srcpath, dstpath):
+    """Merges the runs of the multi-run database srcpath into dstpath, which
+    is created if it is missing. The rows of their input files join the
+    identical ones in the sim_info table of dstpath, and their summary rows
+    are appended. Processes that simulate runs in files of their own leave
+    dstpath a single writer, the one merging them.
+
+    :param srcpath: the location of the h5 file holding the runs
+    :type srcpath: str
+    :param dstpath: the location of the h5 file gathering the runs
+    :type dstpath: str
+    :returns: the ids of the merged runs
+    :rtype: list of str
+    """
+    with tb.open_file(srcpath, mode='r') as src, \
+            tb.open_file(dstpath, mode='a', title='PyRKDatabase') as dst:
+        if '/runs' not in src:
+            return []
+        run_ids = [g._v_name for g in src.root.runs]
+        if '/runs' not in dst:
+            dst.create_group('/', 'runs', 'Simulation Runs')
+        for run_id in run_ids:
+            if run_id in dst.root.runs:
+                msg = "A run named " + run_id + " already exists in "
+                msg += dstpath + "."
+                raise ValueError(msg)
+        for g in src.root.runs:
+            g._f_copy(newparent=dst.root.runs, recursive=True)
+        shared = set_up_shared(dst)
+        rows = src.root.sim_info.read()
+        idx = [find_or_append(shared['/sim_info'],
+                              dict((k, row[k]) for k in rows.dtype.names),
+                              'inputblob') for row in rows]
+        summary = src.root.summary.read()
+        summary['sim_info_idx'] = [idx[i] for i in summary['sim_info_idx']]
+        shared['/summary'].append(summary)
+        shared['/summary'].flush()
+    return run_ids
+
+
 class Database(object):
     """The Database class handles operations on the pyrk simulation backend and
     provides utilities for interacting with it.
@@ -36,25 +131,91 @@ class Database(object):
 
     def __init__(self, filepath='pyrk.h5',
                  mode='w',
-                 title='PyRKDatabase'
+                 title='PyRKDatabase',
+                 buffer_rows=4096,
+                 flush_interval=10.0,
+                 layout='table',
+                 background=False,
+                 queue_chunks=16,
+                 run_id=None,
+                 resume=False
                 ):
         """Creates an hdf5 database for simulation information
 
+        The rows of the timeseries recorders are buffered, and appended to
+        their tables in chunks: once a table has buffer_rows rows pending,
+        once flush_interval seconds have passed since the last flush, when
+        the table is fetched with get_table, and at close_db. In the
+        background mode, the chunks are appended by a writer thread, through
+        a bounded queue, and close_db waits for it to finish.
+
         :param filepath: the location of the h5 file. e.g. 'pyrk.h5'
         :type filepath: str
         :param mode: mode for file opening
         :type mode: str (a, w, and r are supported)
         :param title: The title of the database
         :type title: str
+        :param buffer_rows: the number of rows buffered per table
+        :type buffer_rows: int
+        :param flush_interval: the wall time, in seconds, after which the
+          buffered rows are flushed, None for no time budget
+        :type flush_interval: float
+        :param layout: the layout of the thermal hydraulics timeseries.
+          'table' records one th/th_timeseries row per component and
+          timestep. 'columnar' records compressed (timesteps x components)
+          arrays of each quantity, see add_earray.
+        :type layout: str
+        :param background: should the buffered rows be written by a
+          background thread, so that the writes overlap with the simulation?
+        :type background: bool
+        :param queue_chunks: the number of chunks of rows that may wait for
+          the background thread, before flushes block until it catches up
+        :type queue_chunks: int
+        :param run_id: the name of the run, in a multi-run file, None for a
+          file of its own. The groups of a run are under /runs/<run_id>, its
+          input file is recorded once in the sim_info table at the root, which
+          its runs share, and its scalar outputs in the summary table. Open
+          the file with mode 'a' to add a run to it, see also merge_runs.
+        :type run_id: str
+        :param resume: should the tables of a simulation already in the
+          file, or of its run, be reopened rather than created, to resume it
+          from a checkpoint? see truncate. The file is opened with mode 'a'.
+        :type resume: bool
         """
         self.recorders = []
+        # returns the timestep and time [s] that record_all records
+        self.clock = None
+        self.steps = 0
         self.tablehandles = {}
-        self.mode = mode
+        self.buffers = {}
+        self.buffer_rows = buffer_rows
+        self.flush_interval = flush_interval
+        self.last_flush = time.perf_counter()
+        self.layout = validation.validate_supported("layout", layout,
+                                                    ['table', 'columnar'])
+        self.background = background
+        self.queue = queue.Queue(maxsize=queue_chunks)
+        self.writer = None
+        self.writer_error = None
+        # pytables is not thread safe, the writer holds the lock to write
+        self.lock = threading.RLock()
+        self.resume = resume
+        # the paths of the tables and arrays reopened to resume a simulation
+        self.reopened = set()
+        self.mode = 'a' if resume else mode
         self.title = title
         self.filepath = filepath
+        self.run_id = run_id
+        self.root = '/' if run_id is None else '/runs/' + run_id
         self.h5file = tb.File(filename=self.filepath,
                               title=self.title,
                               mode=self.mode)
+        if run_id is not None:
+            try:
+                self.set_up_run()
+            except ValueError:
+                self.h5file.close()
+                raise
         self.groups = self.set_up_groups()
         self.tables = self.set_up_tables()
         self.make_groups()
@@ -79,7 +240,7 @@ class Database(object):
 
     def add_table(self, groupname, tablename, description, tabletitle):
         """Creates a new table
-        All groupnames must be directly under root
+        All groupnames must be directly under root, or the group of the run
 
         :param groupname: name of the group to add
         :type groupname: str
@@ -92,12 +253,62 @@ class Database(object):
         """
         self.open_db()
         p = self.get_tablepath(groupname, tablename)
-        self.tablehandles[p] = self.h5file.create_table('/' + groupname,
-                                                        tablename,
-                                                        description,
-                                                        tabletitle)
+        if self.resume and p in self.h5file:
+            self.reopened.add(p)
+            self.tablehandles[p] = self.h5file.get_node(p)
+            return self.tablehandles[p]
+        self.tablehandles[p] = self.h5file.create_table(
+            self.get_grouppath(groupname), tablename, description,
+            tabletitle)
         return self.tablehandles[p]
 
+    def add_earray(self, groupname, arrayname, columns, arraytitle,
+                   atom=None, expectedrows=10000):
+        """Creates a new extendable array, of one row per timestep and one
+        column per name in columns, chunked and compressed. The names of the
+        columns are stored once, in its columns attribute. Recorders of the
+        array return one row, an np.ndarray, at a time. An array that already
+        exists is returned as is.
+        All groupnames must be directly under root, or the group of the run
+
+        :param groupname: name of the group to add
+        :type groupname: str
+        :param arrayname: name of the array to add
+        :type arrayname: str
+        :param columns: names of the columns, None for a 1-D array
+        :type columns: list of str
+        :param arraytitle: metadata to store in plain english, a title
+        :type arraytitle: str
+        :param atom: the type of the entries, Float64Atom by default
+        :type atom: pytables Atom object
+        :param expectedrows: the expected number of rows, to size the chunks
+        :type expectedrows: int
+        """
+        self.open_db()
+        p = self.get_tablepath(groupname, arrayname)
+        shape = (0,) if columns is None else (0, len(columns))
+        if self.resume and p in self.h5file and p not in self.tablehandles:
+            self.reopened.add(p)
+            self.tablehandles[p] = self.h5file.get_node(p)
+        if p in self.tablehandles:
+            # e.g. the simulations of an ensemble share the database
+            if self.tablehandles[p].shape[1:] != shape[1:]:
+                msg = "The array " + p + " already exists, with a "
+                msg += "different number of columns."
+                raise ValueError(msg)
+            return self.tablehandles[p]
+        # zlib keeps the file readable by any hdf5 tool
+        filters = tb.Filters(complevel=5, complib='zlib', shuffle=True)
+        earray = self.h5file.create_earray(self.get_grouppath(groupname),
+                                           arrayname,
+                                           atom or tb.Float64Atom(), shape,
+                                           arraytitle, filters=filters,
+                                           expectedrows=expectedrows)
+        if columns is not None:
+            earray.attrs.columns = list(columns)
+        self.tablehandles[p] = earray
+        return earray
+
     def add_row(self, table, row_dict):
         """Adds a row to the table and flushes the table
 
@@ -106,11 +317,165 @@ class Database(object):
         :param row_dict: metadata to store in plain english, a title
         :type row_dict: dictionary of row keys and values
         """
-        self.open_db()
-        for k, v in six.iteritems(row_dict):
-            table.row[k] = v
-        table.row.append()
-        table.flush()
+        with self.lock:
+            self.open_db()
+            for k, v in six.iteritems(row_dict):
+                table.row[k] = v
+            table.row.append()
+            table.flush()
+
+    def add_shared_row(self, tablename, row_dict, key):
+        """Adds a row to a table shared by the runs of a multi-run file,
+        unless a row with the same key is already there
+
+        :param tablename: name of the shared table, e.g. 'sim_info'
+        :type tablename: str
+        :param row_dict: the row
+        :type row_dict: dictionary of row keys and values
+        :param key: the column identifying the row
+        :type key: str
+        :returns: the index of the row in the table
+        :rtype: int
+        """
+        with self.lock:
+            self.open_db()
+            return find_or_append(self.get_shared_table(tablename), row_dict,
+                                  key)
+
+    def get_shared_table(self, tablename):
+        """Returns the table handle for a table shared by the runs of a
+        multi-run file
+
+        :param tablename: name of the shared table, e.g. 'summary'
+        :type tablename: str
+        """
+        if self.run_id is None:
+            msg = "The database " + self.filepath + " holds a single run, "
+            msg += "it has no shared " + tablename + " table."
+            raise KeyError(msg)
+        return self.tablehandles['/' + tablename]
+
+    def buffer_row(self, table, row_dict):
+        """Adds a row to the buffer of the table. The buffer is appended to
+        the table once it is full.
+
+        :param table: handle to the table where the row will reside
+        :type tablename: pytables Table or EArray object
+        :param row_dict: metadata to store in plain english, a title
+        :type row_dict: dictionary of row keys and values, or np.ndarray
+        """
+        p = table._v_pathname
+        if p not in self.buffers:
+            self.buffers[p] = [np.zeros(shape=(self.buffer_rows,) +
+                                        table.shape[1:],
+                                        dtype=table.dtype), 0]
+        buf = self.buffers[p]
+        if isinstance(row_dict, dict):
+            row = buf[0][buf[1]]
+            for k, v in six.iteritems(row_dict):
+                row[k] = v
+        else:
+            # a row of an extendable array
+            buf[0][buf[1]] = row_dict
+        buf[1] += 1
+        if buf[1] == self.buffer_rows:
+            self.flush_table(p)
+
+    @perf.timed('flush_table')
+    def flush_table(self, tablepath):
+        """Appends the buffered rows of a table to it, in one chunk
+
+        :param tablepath: the path to the table, see get_tablepath
+        :type tablepath: str
+        """
+        buf = self.buffers.get(tablepath)
+        if buf is None or buf[1] == 0:
+            return
+        rows = buf[0][:buf[1]]
+        if self.background:
+            # the rows are handed to the writer thread, with their buffer
+            buf[0] = np.zeros_like(buf[0])
+            self.enqueue(tablepath, rows)
+        else:
+            self.append_rows(tablepath, rows)
+        buf[1] = 0
+
+    def append_rows(self, tablepath, rows):
+        """Appends rows to a table, or to an extendable array
+
+        :param tablepath: the path to the table, see get_tablepath
+        :type tablepath: str
+        :param rows: the rows
+        :type rows: np.ndarray
+        """
+        with self.lock:
+            table = self.open_db().get_node(tablepath)
+            table.append(rows)
+            table.flush()
+
+    def flush(self):
+        """Appends the buffered rows of every table to it"""
+        for p in self.buffers:
+            self.flush_table(p)
+        self.last_flush = time.perf_counter()
+
+    def enqueue(self, tablepath, rows):
+        """Queues rows for the background writer thread, which is started if
+        it is not running. This blocks while the queue is full.
+
+        :param tablepath: the path to the table, see get_tablepath
+        :type tablepath: str
+        :param rows: the rows
+        :type rows: np.ndarray
+        """
+        self.check_writer()
+        if self.writer is None or not self.writer.is_alive():
+            self.writer = threading.Thread(target=self.drain,
+                                           name='pyrk-db-writer')
+            self.writer.daemon = True
+            self.writer.start()
+        self.queue.put((tablepath, rows))
+
+    def drain(self):
+        """The loop of the background writer thread: appends the queued
+        rows to their tables, until it is sent None. After an error, the
+        rows are discarded, and the error is raised by check_writer.
+        """
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                if self.writer_error is None:
+                    start = time.perf_counter()
+                    self.append_rows(*item)
+                    perf.add('write_rows', 1, time.perf_counter() - start)
+            except Exception as e:
+                self.writer_error = e
+            finally:
+                self.queue.task_done()
+
+    def wait_writer(self):
+        """Blocks until the background writer thread has written every
+        queued row"""
+        self.queue.join()
+        self.check_writer()
+
+    def stop_writer(self):
+        """Writes every queued row, and stops the background writer
+        thread"""
+        if self.writer is not None and self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join()
+        self.writer = None
+        self.check_writer()
+
+    def check_writer(self):
+        """Raises the error of the background writer thread, if it failed
+        """
+        if self.writer_error is not None:
+            e, self.writer_error = self.writer_error, None
+            raise e
 
     def group_exists(self, path_to_group, groupname):
         """Checks whether the group exsts, with that name, at that path
@@ -133,7 +498,7 @@ class Database(object):
     def open_db(self):
         """Returns a handle to the open db"""
         # if it is not open, open it.
-        if self.h5file.isopen is True:
+        if self.h5file.isopen:
             return self.h5file
         else:
             self.h5file = tb.open_file(filename=self.filepath, mode='a')
@@ -141,17 +506,92 @@ class Database(object):
         return self.h5file
 
     def close_db(self):
-        """Closes all currently open handles to the database."""
-        with nostderr():
-            tb.file._open_files.close_all()
-
+        """Flushes the buffered rows, and closes all currently open handles
+        to the database. The handles to other files, e.g. the Results of
+        another simulation, stay open."""
+        self.flush()
+        self.stop_writer()
+        with self.lock, nostderr():
+            for h5file in list(tb.file._open_files.get_handlers_by_name(
+                    self.h5file.filename)):
+                h5file.close()
+
+    @perf.timed('record_all')
     def record_all(self):
-        """For each row sent by current recorders, add the row.
+        """For each row sent by current recorders, add the row to the buffer
+        of its table, unless the recording policy of the recorder skips this
+        timestep. The timestep, and its time, are given by the clock of the
+        database, set by the simulation, else the calls are counted.
         """
+        if self.clock is not None:
+            step, t_step = self.clock()
+        else:
+            step, t_step = self.steps, None
+        self.steps += 1
         for i in self.recorders:
             t = i[0]
             r = i[1]
-            self.add_row(t, r())
+            if len(i) == 2:
+                self.buffer_row(t, r())
+                continue
+            row = i[2].select(step, t_step, r)
+            if row is not None:
+                self.buffer_row(t, row)
+        if (self.flush_interval is not None and
+                time.perf_counter() - self.last_flush > self.flush_interval):
+            self.flush()
+
+    def record_final(self):
+        """Records a row of every recorder, whatever its recording policy,
+        e.g. at the last timestep of the simulation, so that every timeseries
+        ends at the end of the simulation.
+        """
+        step = self.clock()[0] if self.clock is not None else self.steps
+        for i in self.recorders:
+            self.buffer_row(i[0], i[1]())
+            if len(i) > 2:
+                i[2].step = step
+                i[2].due = True
+
+    def truncate(self, t_idx):
+        """Removes the rows of the timesteps from t_idx on from the
+        timeseries of the simulation, e.g. to resume it from its checkpoint
+        at timestep t_idx. The events, the performance counters and, in a
+        multi-run file, the summary of the run are removed altogether, the
+        resumed simulation records them again.
+
+        :param t_idx: the first timestep removed
+        :type t_idx: int
+        """
+        self.flush()
+        if self.background:
+            self.wait_writer()
+        with self.lock:
+            self.open_db()
+            sizes = {}
+            for table in set(i[0] for i in self.recorders):
+                if isinstance(table, tb.Table):
+                    steps = table.cols.t_idx
+                else:
+                    # the rows of an array are those of the t_idx array of
+                    # its group
+                    steps = table._v_parent._f_get_child('t_idx')
+                # the timesteps are recorded in order
+                sizes[table] = bisect.bisect_left(steps, t_idx)
+            for table, size in sizes.items():
+                table.truncate(size)
+            for name in ['events', 'perf']:
+                self.tablehandles[self.get_tablepath('metadata',
+                                                     name)].truncate(0)
+            if self.run_id is not None:
+                summary = self.get_shared_table('summary')
+                name = np.array(self.run_id,
+                                dtype=summary.coldtypes['run_id'])
+                rows = summary.get_where_list('run_id == name',
+                                              condvars={'name': name})
+                for row in sorted(rows, reverse=True):
+                    summary.remove_row(row)
+            self.h5file.flush()
 
     def delete_db(self):
         """If the database exists, delete it"""
@@ -175,6 +615,23 @@ class Database(object):
                            description=t['description'],
                            tabletitle=t['tabletitle'])
 
+    def set_up_run(self):
+        """Adds the group of this run to a multi-run file, and the tables
+        its runs share, if they are missing.
+        """
+        if '/' in self.run_id or not self.run_id:
+            msg = "The run id " + repr(self.run_id) + " must be a non-empty "
+            msg += "name, without '/'."
+            raise ValueError(msg)
+        if (self.group_exists('/runs', self.run_id) is not False and
+                not self.resume):
+            msg = "A run named " + self.run_id + " already exists in "
+            msg += self.filepath + "."
+            raise ValueError(msg)
+        self.add_group('runs', 'Simulation Runs', '/')
+        self.add_group(self.run_id, 'Run ' + self.run_id, '/runs')
+        self.tablehandles.update(set_up_shared(self.h5file))
+
     def set_up_groups(self):
         """We know what groups need to exist for a PyRK simulation. This is
         their info.
@@ -184,13 +641,13 @@ class Database(object):
         groups = []
         groups.append({'groupname': 'th',
                        'grouptitle': 'TH',
-                       'path': '/'})
+                       'path': self.root})
         groups.append({'groupname': 'neutronics',
                        'grouptitle': 'Neutronics',
-                       'path': '/'})
+                       'path': self.root})
         groups.append({'groupname': 'metadata',
                        'grouptitle': 'Simulation Metadata',
-                       'path': '/'})
+                       'path': self.root})
         return groups
 
     def set_up_tables(self):
@@ -200,14 +657,24 @@ class Database(object):
         :returns: tables that define the simulation in PyRK
         """
         tables = []
-        tables.append({'groupname': 'metadata',
-                       'tablename': 'sim_info',
-                       'description': desc.SimInfoRow,
-                       'tabletitle': 'Simulation Information'})
+        if self.run_id is None:
+            # the runs of a multi-run file share theirs, see set_up_run
+            tables.append({'groupname': 'metadata',
+                           'tablename': 'sim_info',
+                           'description': desc.SimInfoRow,
+                           'tabletitle': 'Simulation Information'})
         tables.append({'groupname': 'metadata',
                        'tablename': 'sim_timeseries',
                        'description': desc.SimTimeseriesRow,
                        'tabletitle': 'Simulation Power Data'})
+        tables.append({'groupname': 'metadata',
+                       'tablename': 'events',
+                       'description': desc.EventRow,
+                       'tabletitle': 'Simulation Events'})
+        tables.append({'groupname': 'metadata',
+                       'tablename': 'perf',
+                       'description': desc.PerfRow,
+                       'tabletitle': 'Performance Counters'})
         tables.append({'groupname': 'th',
                        'tablename': 'th_params',
                        'description': desc.ThMetadataRow,
@@ -224,18 +691,10 @@ class Database(object):
                        'tablename': 'neutronics_params',
                        'description': desc.NeutronicsParamsRow,
                        'tabletitle': 'Neutronics Metadata'})
-        tables.append({'groupname': 'neutronics',
-                       'tablename': 'zetas',
-                       'description': desc.ZetasTimestepRow,
-                       'tabletitle': 'Neutron Precursor Concentrations'})
-        tables.append({'groupname': 'neutronics',
-                       'tablename': 'omegas',
-                       'description': desc.OmegasTimestepRow,
-                       'tabletitle': 'Decay Heat Fractions'})
         return tables
 
     def register_recorder(self, groupname, tablename, recorder,
-                          timeseries=False):
+                          timeseries=False, policy=None):
         """Register an entity that wants to represent itself in the Database
 
         :param groupname: name of the group to add
@@ -246,13 +705,20 @@ class Database(object):
         :type recorder: function object
         :param timeseries: should this be recorded each timestep?
         :type timeseries: bool
+        :param policy: the timesteps at which a timeseries is recorded, see
+          pyrk.db.policies, None for every timestep
+        :type policy: RecordingPolicy
         """
         self.open_db()
         tab = self.get_table(groupname, tablename)
         if timeseries is False:
-            self.add_row(tab, recorder())
-        else:
+            # a resumed simulation has recorded its parameters already
+            if tab._v_pathname not in self.reopened:
+                self.add_row(tab, recorder())
+        elif policy is None:
             self.recorders.append((tab, recorder))
+        else:
+            self.recorders.append((tab, recorder, policy))
 
     def get_tablepath(self, groupname, tablename):
         """Compiles the string for a table within a group
@@ -264,7 +730,18 @@ class Database(object):
         :returns: the path to the table in the group
         :rtype: str
         """
-        return '/' + groupname + '/' + tablename
+        return self.get_grouppath(groupname) + '/' + tablename
+
+    def get_grouppath(self, groupname):
+        """Compiles the string for a group, under the group of the run in a
+        multi-run file
+
+        :param groupname: name of the group
+        :type groupname: str
+        :returns: the path to the group
+        :rtype: str
+        """
+        return self.root.rstrip('/') + '/' + groupname
 
     def get_table(self, groupname, tablename):
         """Returns the table handle for a table within a group
@@ -278,6 +755,10 @@ class Database(object):
         """
         self.open_db()
         p = self.get_tablepath(groupname, tablename)
+        # the table is read in full, with its buffered rows
+        self.flush_table(p)
+        if self.background:
+            self.wait_writer()
         try:
             return self.tablehandles[p]
         except KeyError:
@@ -19,22 +19,6 @@ class NeutronicsTimeseriesRow(tb.IsDescription):
     rho = tb.Float64Col()
 
 
-class ZetasTimestepRow(tb.IsDescription):
-    """ A row descriptor for precursor concentrations at each timestep
-    """
-    t_idx = tb.Int32Col()
-    zeta_idx = tb.Float64Col()
-    zeta = tb.Float64Col()
-
-
-class OmegasTimestepRow(tb.IsDescription):
-    """ A row descriptor for decay heat powers at each timestep
-    """
-    t_idx = tb.Int32Col()
-    omega_idx = tb.Float64Col()
-    omega = tb.Float64Col()
-
-
 class ThTimeseriesRow(tb.IsDescription):
     """ A row descriptor for temperatures at each timestep
     """
@@ -91,4 +75,42 @@ class SimTimeseriesRow(tb.IsDescription):
     Power Info
     """
     t_idx = tb.Int64Col()
+    time = tb.Float64Col()
+    power = tb.Float64Col()
+
+
+class PerfRow(tb.IsDescription):
+    """A row descriptor for the performance counters of a simulation, the
+    number of calls (or steps) and their cumulative wall time
+    """
+    name = tb.StringCol(64)
+    count = tb.Int64Col()
+    time = tb.Float64Col()
+
+
+class EventRow(tb.IsDescription):
+    """A row descriptor for the occurrences of simulation events
+    """
+    name = tb.StringCol(32)
+    time = tb.Float64Col()
+    t_idx = tb.Int64Col()
     power = tb.Float64Col()
+    terminal = tb.BoolCol()
+
+
+class RunSummaryRow(tb.IsDescription):
+    """A row descriptor for the scalar outputs of a run of a multi-run
+    database, with the index of its row in the shared sim_info table
+    """
+    run_id = tb.StringCol(64)
+    sim_info_idx = tb.Int64Col()
+    simhash = tb.StringCol(32)
+    timestamp = tb.Float64Col()
+    tf = tb.Float64Col()
+    timesteps = tb.Int64Col()
+    final_power = tb.Float64Col()
+    peak_power = tb.Float64Col()
+    t_peak_power = tb.Float64Col()
+    peak_fuel_temp = tb.Float64Col()
+    t_peak_fuel_temp = tb.Float64Col()
+    peak_fuel_component = tb.StringCol(16)
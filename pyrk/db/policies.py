@@ -0,0 +1,159 @@
+# Licensed under a 3-clause BSD style license - see LICENSE
+"""
+Recording policies, which decide at which timesteps the timeseries recorders
+of a Database record their rows, so that long, mostly flat transients are not
+recorded at every timestep.
+"""
+import time
+import numpy as np
+from pyrk.inp import validation
+
+
+class RecordingPolicy(object):
+
+    """This policy records every timestep, it is the base of the others. The
+    recorders registered with the same policy object are recorded at the
+    same timesteps, e.g. the rows of the columnar arrays and of their t_idx
+    array. Whatever the policy, SimInfo.record_final records the last
+    timestep of the simulation.
+    """
+
+    def __init__(self, watch=None):
+        """Creates a policy
+
+        :param watch: a function returning the values that decide whether a
+          timestep is recorded, None for the row of the recorder
+        :type watch: function object
+        """
+        self.watch = watch
+        self.step = None
+        self.due = False
+
+    @property
+    def skipped(self):
+        """Whether the latest timestep was not recorded"""
+        return self.step is not None and not self.due
+
+    def select(self, step, t, recorder):
+        """Returns the row of the recorder at this timestep, or None if the
+        timestep is not recorded. The decision is taken once per timestep,
+        for all the recorders of the policy.
+
+        :param step: the timestep recorded
+        :type step: int
+        :param t: the time [s] of the timestep, None if it is unknown
+        :type t: float
+        :param recorder: a function pointer that returns a table row
+        :type recorder: function object
+        """
+        if step != self.step:
+            self.step = step
+            self.due = self.decide(step, t, self.watch or recorder)
+        if self.due:
+            return recorder()
+        return None
+
+    def decide(self, step, t, values):
+        """Whether the timestep is recorded
+
+        :param step: the timestep recorded
+        :type step: int
+        :param t: the time [s] of the timestep, None if it is unknown
+        :type t: float
+        :param values: a function returning the values watched
+        :type values: function object
+        """
+        return True
+
+
+class EveryN(RecordingPolicy):
+
+    """This policy records every n-th timestep, from the first"""
+
+    def __init__(self, n, watch=None):
+        """Creates a policy recording every n-th timestep
+
+        :param n: the number of timesteps between the rows
+        :type n: int
+        """
+        super(EveryN, self).__init__(watch=watch)
+        self.n = validation.validate_g("n", n, 0)
+
+    def decide(self, step, t, values):
+        return step % self.n == 0
+
+
+class Cadence(RecordingPolicy):
+
+    """This policy records a timestep once an interval of simulated time,
+    or of wall time, has passed since the last one it recorded
+    """
+
+    def __init__(self, interval, wall=False, watch=None):
+        """Creates a policy recording at a fixed cadence
+
+        :param interval: the interval between the rows, in seconds
+        :type interval: float
+        :param wall: is the interval of wall time, rather than simulated?
+        :type wall: bool
+        """
+        super(Cadence, self).__init__(watch=watch)
+        self.interval = validation.validate_g("interval", interval, 0.0)
+        self.wall = wall
+        self.last = None
+
+    def decide(self, step, t, values):
+        if self.wall:
+            t = time.perf_counter()
+        elif t is None:
+            msg = "A Cadence of simulated time needs the time of the rows, "
+            msg += "the database has no clock."
+            raise ValueError(msg)
+        # the times are sums of timesteps, equal up to rounding
+        if self.last is None or t - self.last >= self.interval * (1 - 1e-9):
+            self.last = t
+            return True
+        return False
+
+
+class Deadband(RecordingPolicy):
+
+    """This policy records a timestep when one of the values watched has
+    changed by more than a tolerance since the last timestep it recorded
+    """
+
+    def __init__(self, tolerance, columns=None, relative=False, watch=None):
+        """Creates a policy recording the changes beyond a deadband
+
+        :param tolerance: the change beyond which a timestep is recorded
+        :type tolerance: float
+        :param columns: the columns of the rows watched, needed for table
+          rows, None for every value of the row
+        :type columns: list of str
+        :param relative: is the tolerance relative to the last values
+          recorded, rather than absolute?
+        :type relative: bool
+        """
+        super(Deadband, self).__init__(watch=watch)
+        self.tolerance = validation.validate_ge("tolerance", tolerance, 0.0)
+        self.columns = columns
+        self.relative = relative
+        self.last = None
+
+    def decide(self, step, t, values):
+        values = values()
+        if isinstance(values, dict):
+            if self.columns is None:
+                msg = "A Deadband of table rows needs the columns it "
+                msg += "watches, among " + str(sorted(values)) + "."
+                raise ValueError(msg)
+            values = [values[c] for c in self.columns]
+        values = np.array(values, dtype=float, ndmin=1)
+        if self.last is not None:
+            tol = self.tolerance
+            if self.relative:
+                tol = tol * np.abs(self.last)
+            if not np.any(np.abs(values - self.last) > tol):
+                return False
+        self.last = values
+        return True
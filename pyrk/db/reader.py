@@ -0,0 +1,253 @@
+# Licensed under a 3-clause BSD style license - see LICENSE
+"""
+This module reads the output database of a PyRK simulation with indexed,
+in-kernel queries, so that a quantity over a window of timesteps is read
+from the chunks that hold it, rather than by a scan of the whole table.
+"""
+import bisect
+import numpy as np
+import tables as tb
+
+
+class Reader(object):
+
+    """The Reader class queries the timeseries of a PyRK database, in either
+    layout of the thermal hydraulics timeseries (see Database), and the
+    summaries of the runs of a multi-run database. Windows of timesteps are
+    given as [start, stop), like slices.
+    """
+
+    series_tables = {'time': 'metadata/sim_timeseries',
+                     'power': 'metadata/sim_timeseries',
+                     'rho_tot': 'neutronics/neutronics_params',
+                     'rho_ext': 'neutronics/neutronics_params'}
+    """series_tables (dict): the table holding each scalar quantity"""
+
+    indexed = {'metadata/sim_timeseries': ['t_idx'],
+               'neutronics/neutronics_params': ['t_idx'],
+               'th/th_timeseries': ['t_idx', 'component']}
+    """indexed (dict): the columns indexed in the tables of each run"""
+
+    def __init__(self, filepath='pyrk.h5', index=False, run_id=None):
+        """Opens a PyRK database, read-only. If index is set, the file is
+        opened for writing instead, and the indexes of the timeseries tables
+        are created, once, unless the file can not be written to.
+
+        :param filepath: the location of the h5 file. e.g. 'pyrk.h5'
+        :type filepath: str
+        :param index: should missing indexes be created?
+        :type index: bool
+        :param run_id: the run read from a multi-run database, see runs
+        :type run_id: str
+        """
+        self.filepath = filepath
+        self.run_id = run_id
+        self.root = '/' if run_id is None else '/runs/' + run_id + '/'
+        mode = 'r'
+        if index:
+            try:
+                self.h5file = tb.open_file(filepath, mode='a')
+                mode = 'a'
+            except (IOError, OSError):
+                pass
+        if mode == 'r':
+            self.h5file = tb.open_file(filepath, mode='r')
+        else:
+            self.create_indexes()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Closes the database"""
+        self.h5file.close()
+
+    def node(self, path):
+        """Returns a node of the run read, e.g. 'th/temp'
+
+        :param path: the path to the node, within the run
+        :type path: str
+        """
+        return self.h5file.get_node(self.root + path)
+
+    def runs(self):
+        """The ids of the runs of a multi-run database
+
+        :rtype: list of str
+        """
+        if '/runs' not in self.h5file:
+            return []
+        return sorted(g._v_name for g in self.h5file.root.runs)
+
+    def summary(self, condition=None, condvars=None):
+        """Returns the summaries of the runs of a multi-run database, e.g.
+        summary('peak_power > 1.5') for the runs whose power peaked above
+        one and a half times the nominal power.
+
+        :param condition: the condition on the columns of the summary table,
+          None for every run
+        :type condition: str
+        :param condvars: the variables of the condition
+        :type condvars: dict
+        :rtype: np.ndarray
+        """
+        table = self.h5file.root.summary
+        if condition is None:
+            return table.read()
+        return table.read_where(condition, condvars=condvars)
+
+    def create_indexes(self):
+        """Creates the indexes of the timeseries tables that lack them, in
+        every run"""
+        roots = ['/']
+        if '/runs' in self.h5file:
+            roots = ['/runs/' + r + '/' for r in self.runs()]
+        for path, cols in [(r + p, cols) for r in roots
+                           for p, cols in self.indexed.items()]:
+            if path not in self.h5file:
+                continue
+            table = self.h5file.get_node(path)
+            for col in cols:
+                column = getattr(table.cols, col)
+                if not column.is_indexed:
+                    column.create_index()
+
+    def columnar(self):
+        """Whether the thermal hydraulics timeseries are in the columnar
+        layout"""
+        return self.root + 'th/temp' in self.h5file
+
+    def components(self):
+        """The names of the components, in the order of the solution vector
+
+        :rtype: list of str
+        """
+        if self.columnar():
+            return list(self.node('th/temp').attrs.columns)
+        return [c.decode() for c in self.node('th/th_params').col('component')]
+
+    def where(self, start, stop, extra=''):
+        """The condition selecting the timesteps [start, stop), for
+        read_where, and its variables
+
+        :param start: the first timestep
+        :type start: int
+        :param stop: the timestep after the last, None for the end
+        :type stop: int
+        :param extra: another condition, and-ed with the timesteps
+        :type extra: str
+        """
+        cond = '(t_idx >= start)'
+        condvars = {'start': start}
+        if stop is not None:
+            cond += ' & (t_idx < stop)'
+            condvars['stop'] = stop
+        if extra:
+            cond += ' & (' + extra + ')'
+        return cond, condvars
+
+    def series(self, quantity, start=0, stop=None):
+        """Returns a scalar quantity over the timesteps [start, stop)
+
+        :param quantity: 'time', 'power', 'rho_tot' or 'rho_ext'
+        :type quantity: str
+        :param start: the first timestep
+        :type start: int
+        :param stop: the timestep after the last, None for the end
+        :type stop: int
+        :return: the timesteps and the values at each of them
+        :rtype: tuple of np.ndarray
+        """
+        if quantity not in self.series_tables:
+            msg = "The quantity " + quantity + " is not among "
+            msg += str(sorted(self.series_tables)) + "."
+            raise KeyError(msg)
+        table = self.node(self.series_tables[quantity])
+        cond, condvars = self.where(start, stop)
+        rows = table.read_where(cond, condvars=condvars)
+        return rows['t_idx'], rows[quantity]
+
+    def component(self, name, quantity='temp', start=0, stop=None):
+        """Returns the temperature or density of one component over the
+        timesteps [start, stop)
+
+        :param name: the name of the component
+        :type name: str
+        :param quantity: 'temp' or 'density'
+        :type quantity: str
+        :param start: the first timestep
+        :type start: int
+        :param stop: the timestep after the last, None for the end
+        :type stop: int
+        :return: the timesteps and the values at each of them
+        :rtype: tuple of np.ndarray
+        """
+        if self.columnar():
+            t_idx, values = self.matrix(quantity, start, stop,
+                                        components=[name])
+            return t_idx, values[:, 0]
+        table = self.node('th/th_timeseries')
+        cond, condvars = self.where(start, stop, 'component == name')
+        condvars['name'] = name.encode()
+        rows = table.read_where(cond, condvars=condvars)
+        return rows['t_idx'], rows[quantity]
+
+    def matrix(self, quantity='temp', start=0, stop=None, components=None):
+        """Returns a (timesteps x columns) matrix of the temperatures or
+        densities of the components, or of the zetas or omegas of each
+        group, over the timesteps [start, stop)
+
+        :param quantity: 'temp', 'density', 'zetas' or 'omegas'
+        :type quantity: str
+        :param start: the first timestep
+        :type start: int
+        :param stop: the timestep after the last, None for the end
+        :type stop: int
+        :param components: the names of the components, all by default
+        :type components: list of str
+        :return: the timesteps and the matrix
+        :rtype: tuple of np.ndarray
+        """
+        if quantity in ['zetas', 'omegas']:
+            return self.array_rows('neutronics', quantity, start, stop)
+        names = self.components()
+        cols = [names.index(c) for c in (components or names)]
+        if self.columnar():
+            t_idx, values = self.array_rows('th', quantity, start, stop)
+            return t_idx, values[:, cols]
+        table = self.node('th/th_timeseries')
+        cond, condvars = self.where(start, stop)
+        rows = table.read_where(cond, condvars=condvars)
+        t_idx = np.unique(rows['t_idx'])
+        values = np.full((len(t_idx), len(names)), np.nan)
+        comp_idx = dict((n.encode(), i) for i, n in enumerate(names))
+        col = np.array([comp_idx[c] for c in rows['component']], dtype=int)
+        values[np.searchsorted(t_idx, rows['t_idx']), col] = rows[quantity]
+        return t_idx, values[:, cols]
+
+    def array_rows(self, groupname, arrayname, start=0, stop=None):
+        """Returns the rows of an extendable array over the timesteps
+        [start, stop). Its t_idx array, in increasing order, is bisected, so
+        that only the chunks holding the window are read.
+
+        :param groupname: the group of the array
+        :type groupname: str
+        :param arrayname: the name of the array
+        :type arrayname: str
+        :param start: the first timestep
+        :type start: int
+        :param stop: the timestep after the last, None for the end
+        :type stop: int
+        :return: the timesteps and the rows
+        :rtype: tuple of np.ndarray
+        """
+        group = self.node(groupname)
+        t_idx = group.t_idx
+        first = bisect.bisect_left(t_idx, start)
+        last = len(t_idx) if stop is None else bisect.bisect_left(t_idx,
+                                                                  stop)
+        array = getattr(group, arrayname)
+        return t_idx[first:last], array[first:last]
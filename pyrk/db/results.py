@@ -0,0 +1,264 @@
+# Licensed under a 3-clause BSD style license - see LICENSE
+"""
+This module reads the results of a PyRK simulation lazily from its output
+database: each quantity is a column read from the file only for the rows
+indexed, or chunk by chunk, so that the analysis of long simulations never
+holds their whole history in memory.
+"""
+import bisect
+import numpy as np
+from pyrk.db.reader import Reader
+
+
+class Column(object):
+
+    """A column of the results, one row per recorded timestep, read lazily.
+    Indexing reads only the rows indexed, e.g. power[-100:] or
+    temps[::1000], chunks iterates over the column, and np.asarray reads it
+    whole.
+    """
+
+    def __init__(self, read, nrows, ncols=None):
+        """Creates a column
+
+        :param read: a function returning the rows [start, stop), every
+          step-th, given start, stop and step
+        :type read: function object
+        :param nrows: the number of rows
+        :type nrows: int
+        :param ncols: the number of columns of each row, None for scalars
+        :type ncols: int
+        """
+        self._read = read
+        self.nrows = nrows
+        self.ncols = ncols
+
+    @property
+    def shape(self):
+        """The shape of the column, were it read whole"""
+        if self.ncols is None:
+            return (self.nrows,)
+        return (self.nrows, self.ncols)
+
+    def __len__(self):
+        return self.nrows
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.nrows)
+            if step > 0:
+                return self._read(start, max(start, stop), step)
+            rows = range(start, stop, step)
+            if len(rows) == 0:
+                return self._read(0, 0, 1)
+            return self._read(rows[-1], rows[0] + 1, -step)[::-1]
+        key = int(key)
+        if key < 0:
+            key += self.nrows
+        if not 0 <= key < self.nrows:
+            msg = "Row " + str(key) + " is out of the " + str(self.nrows)
+            msg += " rows of the column."
+            raise IndexError(msg)
+        return self._read(key, key + 1, 1)[0]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self[:], dtype=dtype)
+
+    def chunks(self, size=65536):
+        """Iterates over the rows of the column, size rows at a time
+
+        :param size: the number of rows of each chunk
+        :type size: int
+        """
+        for start in range(0, self.nrows, size):
+            yield self._read(start, min(start + size, self.nrows), 1)
+
+    def thin(self, max_points):
+        """Returns at most max_points rows, evenly strided from the first and
+        ending with the last, e.g. to plot the column to the end of the
+        simulation
+
+        :param max_points: the largest number of rows returned, at least 2
+        :type max_points: int
+        """
+        stride = self.stride(max_points)
+        rows = self[::stride]
+        if (self.nrows - 1) % stride:
+            rows = np.concatenate([rows, self[self.nrows - 1:]])
+        return rows
+
+    def stride(self, max_points):
+        """The stride of thin, before the last row is added
+
+        :param max_points: the largest number of rows returned, at least 2
+        :type max_points: int
+        """
+        return max(1, -(-(self.nrows - 1) // max(1, max_points - 1)))
+
+
+class Results(object):
+
+    """The Results class holds the results of a PyRK simulation, read lazily
+    from its output database, in either layout and from a run of a
+    multi-run database. The timeseries of each group of the database have
+    their own timesteps, which a recording policy may thin (see
+    pyrk.db.policies):
+
+    - t_idx, time and power, from metadata/sim_timeseries
+    - neutronics_t_idx, rho and rho_ext, and the zetas and omegas of each
+      group, from the neutronics group
+    - th_t_idx, and the temps and densities of each component, in the
+      order of components, from the th group
+    """
+
+    def __init__(self, filepath='pyrk.h5', run_id=None):
+        """Opens the results of a simulation
+
+        :param filepath: the location of the h5 file. e.g. 'pyrk.h5'
+        :type filepath: str
+        :param run_id: the run of a multi-run database, see Database
+        :type run_id: str
+        """
+        self.filepath = filepath
+        self.run_id = run_id
+        self.reader = Reader(filepath, index=False, run_id=run_id)
+        self.components = self.reader.components()
+        sim = self.reader.node('metadata/sim_timeseries')
+        self.t_idx = self.field(sim, 't_idx')
+        self.time = self.field(sim, 'time')
+        self.power = self.field(sim, 'power')
+        params = self.reader.node('neutronics/neutronics_params')
+        self.neutronics_t_idx = self.field(params, 't_idx')
+        self.rho = self.field(params, 'rho_tot')
+        self.rho_ext = self.field(params, 'rho_ext')
+        self.zetas = self.array('neutronics/zetas')
+        self.omegas = self.array('neutronics/omegas')
+        if self.reader.columnar():
+            self.th_t_idx = self.array('th/t_idx')
+            self.temps = self.array('th/temp')
+            self.densities = self.array('th/density')
+        else:
+            self.th_t_idx = self.component_field('t_idx', 0)
+            self.temps = self.component_field('temp')
+            self.densities = self.component_field('density')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Closes the database"""
+        self.reader.close()
+
+    def field(self, table, name):
+        """Returns a lazy column of a field of a table
+
+        :param table: handle to the table
+        :type table: pytables Table object
+        :param name: the name of the field
+        :type name: str
+        """
+        return Column(lambda start, stop, step:
+                      table.read(start, stop, step, field=name),
+                      table.nrows)
+
+    def array(self, path):
+        """Returns a lazy column of the rows of an extendable array, None if
+        the database has none, e.g. no omegas without decay heat groups
+
+        :param path: the path to the array, e.g. 'th/temp'
+        :type path: str
+        """
+        if self.reader.root + path not in self.reader.h5file:
+            return None
+        earray = self.reader.node(path)
+        return Column(lambda start, stop, step: earray[start:stop:step],
+                      earray.nrows,
+                      earray.shape[1] if len(earray.shape) > 1 else None)
+
+    def component_field(self, name, col=None):
+        """Returns a lazy column of a field of the th/th_timeseries table,
+        whose rows hold each component in turn, for one component or as a
+        (timesteps x components) matrix. None without components.
+
+        :param name: the name of the field, e.g. 'temp'
+        :type name: str
+        :param col: the index of the component, None for all of them
+        :type col: int
+        """
+        n = len(self.components)
+        if n == 0:
+            return None
+        table = self.reader.node('th/th_timeseries')
+
+        def read(start, stop, step):
+            cols = range(n) if col is None else [col]
+            rows = [table.read(start * n + c, max(start * n + c, stop * n),
+                               step * n, field=name) for c in cols]
+            if col is not None:
+                return rows[0]
+            return np.stack(rows, axis=-1)
+        return Column(read, table.nrows // n, None if col is not None else n)
+
+    def temp(self, name):
+        """Returns the lazy column of the temperature of a component [K]
+
+        :param name: the name of the component
+        :type name: str
+        """
+        return self.component(name, 'temp')
+
+    def density(self, name):
+        """Returns the lazy column of the density of a component [kg/m^3]
+
+        :param name: the name of the component
+        :type name: str
+        """
+        return self.component(name, 'density')
+
+    def component(self, name, quantity):
+        """Returns the lazy column of a quantity of a component
+
+        :param name: the name of the component
+        :type name: str
+        :param quantity: 'temp' or 'density'
+        :type quantity: str
+        """
+        if name not in self.components:
+            msg = "The component " + name + " is not among "
+            msg += str(self.components) + "."
+            raise KeyError(msg)
+        col = self.components.index(name)
+        if not self.reader.columnar():
+            return self.component_field(quantity, col)
+        matrix = self.temps if quantity == 'temp' else self.densities
+        return Column(lambda start, stop, step:
+                      matrix[start:stop:step][:, col], len(matrix))
+
+    def time_at(self, t_idx, size=65536):
+        """Returns the times [s] of timesteps, e.g. those of th_t_idx, from
+        the recorded timesteps of the metadata, interpolated between them if
+        a recording policy skipped some. The metadata are read size rows at
+        a time.
+
+        :param t_idx: the timesteps, in increasing order
+        :type t_idx: np.ndarray
+        :param size: the number of rows of each chunk read
+        :type size: int
+        """
+        t_idx = np.asarray(t_idx)
+        times = np.full(t_idx.shape, np.nan)
+        if len(t_idx) == 0 or len(self.t_idx) == 0:
+            return times
+        first = max(0, bisect.bisect_right(self.t_idx, t_idx[0]) - 1)
+        last = min(len(self.t_idx), bisect.bisect_left(self.t_idx,
+                                                       t_idx[-1]) + 1)
+        for start in range(first, last, size):
+            # the chunks overlap by a row, to interpolate between them
+            known_t = self.t_idx[start:min(start + size + 1, last)]
+            known = self.time[start:min(start + size + 1, last)]
+            sel = (t_idx >= known_t[0]) & (t_idx <= known_t[-1])
+            times[sel] = np.interp(t_idx[sel], known_t, known)
+        return times
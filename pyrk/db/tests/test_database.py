@@ -98,6 +98,8 @@ class TestDatabase:
             assert t['tablename'] in ['th_params', 'th_timeseries',
                                       'sim_info',
                                       'sim_timeseries',
+                                      'events',
+                                      'perf',
                                       'neutronics_timeseries',
                                       'neutronics_params',
                                       'zetas',
@@ -109,3 +111,85 @@ class TestDatabase:
             assert g['groupname'] in ['th',
                                       'metadata',
                                       'neutronics']
+
+    def test_buffered_rows(self):
+        db = d.Database(filepath='buffered.h5', mode='w', buffer_rows=3,
+                        flush_interval=None)
+        tab = db.get_table('metadata', 'sim_timeseries')
+        db.recorders.append((tab, lambda: {'t_idx': 1, 'power': 2.0}))
+        db.record_all()
+        db.record_all()
+        assert tab.nrows == 0
+        db.record_all()
+        assert tab.nrows == 3
+        db.record_all()
+        assert len(db.get_table('metadata', 'sim_timeseries').read()) == 4
+        db.record_all()
+        db.close_db()
+        import tables as tb
+        with tb.open_file('buffered.h5', mode='r') as h5file:
+            rows = h5file.root.metadata.sim_timeseries.read()
+        db.delete_db()
+        assert len(rows) == 5
+        assert all(rows['power'] == 2.0)
+
+    def test_background_writer(self):
+        db = d.Database(filepath='background.h5', mode='w', buffer_rows=4,
+                        flush_interval=None, background=True, queue_chunks=2)
+        tab = db.get_table('metadata', 'sim_timeseries')
+        count = iter(range(100))
+        db.recorders.append((tab, lambda: {'t_idx': next(count)}))
+        for i in range(50):
+            db.record_all()
+        assert db.writer.is_alive()
+        assert len(db.get_table('metadata', 'sim_timeseries').read()) == 50
+        for i in range(50):
+            db.record_all()
+        db.close_db()
+        assert db.writer is None
+        import tables as tb
+        with tb.open_file('background.h5', mode='r') as h5file:
+            t_idx = h5file.root.metadata.sim_timeseries.col('t_idx')
+        db.delete_db()
+        assert list(t_idx) == list(range(100))
+
+    def test_multi_run(self):
+        import tables as tb
+        a = d.Database(filepath='runs.h5', mode='w', run_id='a')
+        assert a.get_tablepath('th', 'th_params') == '/runs/a/th/th_params'
+        assert a.add_shared_row('sim_info', {'inputblob': 'x = 1'},
+                                'inputblob') == 0
+        a.add_row(a.get_shared_table('summary'),
+                  {'run_id': 'a', 'sim_info_idx': 0, 'peak_power': 2.0})
+        a.close_db()
+        b = d.Database(filepath='runs.h5', mode='a', run_id='b')
+        # the runs share the row of the same input
+        assert b.add_shared_row('sim_info', {'inputblob': 'x = 1'},
+                                'inputblob') == 0
+        assert b.add_shared_row('sim_info', {'inputblob': 'x = 2'},
+                                'inputblob') == 1
+        b.add_row(b.get_shared_table('summary'),
+                  {'run_id': 'b', 'sim_info_idx': 1, 'peak_power': 3.0})
+        b.close_db()
+        with pytest.raises(ValueError):
+            d.Database(filepath='runs.h5', mode='a', run_id='a')
+        with pytest.raises(KeyError):
+            self.a.get_shared_table('summary')
+        c = d.Database(filepath='run_c.h5', mode='w', run_id='c')
+        c.add_shared_row('sim_info', {'inputblob': 'x = 2'}, 'inputblob')
+        c.add_row(c.get_shared_table('summary'),
+                  {'run_id': 'c', 'sim_info_idx': 0, 'peak_power': 4.0})
+        c.close_db()
+        assert d.merge_runs('run_c.h5', 'runs.h5') == ['c']
+        with pytest.raises(ValueError):
+            d.merge_runs('run_c.h5', 'runs.h5')
+        c.delete_db()
+        with tb.open_file('runs.h5', mode='r') as h5file:
+            assert sorted(h5file.root.runs._v_children) == ['a', 'b', 'c']
+            assert '/runs/c/th/th_timeseries' in h5file
+            assert '/metadata' not in h5file
+            assert h5file.root.sim_info.nrows == 2
+            summary = h5file.root.summary.read()
+        a.delete_db()
+        assert list(summary['run_id']) == [b'a', b'b', b'c']
+        assert list(summary['sim_info_idx']) == [0, 1, 1]
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from pyrk.db import policies
+
+
+def record(policy, steps, times=None, recorder=lambda: 1.0):
+    """The steps at which the policy records"""
+    times = times if times is not None else [None] * len(steps)
+    return [s for s, t in zip(steps, times)
+            if policy.select(s, t, recorder) is not None]
+
+
+def test_every_n():
+    policy = policies.EveryN(3)
+    assert record(policy, range(10)) == [0, 3, 6, 9]
+    assert not policy.skipped
+    record(policy, [10])
+    assert policy.skipped
+    with pytest.raises(ValueError):
+        policies.EveryN(0)
+
+
+def test_cadence():
+    policy = policies.Cadence(0.3)
+    steps = range(11)
+    assert record(policy, steps, [0.1 * s for s in steps]) == [0, 3, 6, 9]
+    with pytest.raises(ValueError):
+        policies.Cadence(0.3).select(0, None, lambda: 1.0)
+    wall = policies.Cadence(3600.0, wall=True)
+    assert record(wall, range(5)) == [0]
+
+
+def test_deadband():
+    values = [1.0, 1.05, 1.2, 1.25, 1.0, 1.0]
+    policy = policies.Deadband(0.1, watch=lambda: values[policy.step])
+    assert record(policy, range(6)) == [0, 2, 4]
+    relative = policies.Deadband(0.5, relative=True)
+    rows = [np.array([1.0, 10.0]), np.array([1.4, 14.0]),
+            np.array([1.6, 10.0])]
+    assert [s for s in range(3)
+            if relative.select(s, None, lambda: rows[s]) is not None] == \
+        [0, 2]
+    table = policies.Deadband(0.1)
+    with pytest.raises(ValueError):
+        table.select(0, None, lambda: {'t_idx': 0, 'power': 1.0})
+
+
+def test_shared_decision():
+    # the recorders of a policy are recorded at the same steps
+    policy = policies.Deadband(0.1, columns=['power'])
+    power = [1.0, 1.0, 2.0]
+    rows = []
+    for s in range(3):
+        for name in ['a', 'b']:
+            row = policy.select(s, None, lambda: {'power': power[s],
+                                                  'name': name})
+            if row is not None:
+                rows.append((s, row['name']))
+    assert rows == [(0, 'a'), (0, 'b'), (2, 'a'), (2, 'b')]
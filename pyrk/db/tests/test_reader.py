@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from pyrk.db import database as d
+from pyrk.db.reader import Reader
+
+
+def fill(db):
+    """Records 3 components over 20 timesteps, temp = 100 * comp + t_idx"""
+    names = ['fuel', 'cool', 'refl']
+    for name in names:
+        db.add_row(db.get_table('th', 'th_params'), {'component': name})
+    if db.layout == 'columnar':
+        db.add_earray('th', 't_idx', None, 'TH Timesteps')
+        db.add_earray('th', 'temp', names, 'TH Temperatures')
+    for t in range(20):
+        temps = 100.0 * np.arange(3) + t
+        db.buffer_row(db.get_table('metadata', 'sim_timeseries'),
+                      {'t_idx': t, 'time': 0.1 * t, 'power': 1.0 + t})
+        if db.layout == 'columnar':
+            db.buffer_row(db.get_table('th', 't_idx'), t)
+            db.buffer_row(db.get_table('th', 'temp'), temps)
+        else:
+            for name, temp in zip(names, temps):
+                db.buffer_row(db.get_table('th', 'th_timeseries'),
+                              {'t_idx': t, 'component': name, 'temp': temp})
+    db.close_db()
+
+
+@pytest.fixture(params=['table', 'columnar'])
+def reader(request):
+    db = d.Database(filepath='reader.h5', mode='w', layout=request.param)
+    fill(db)
+    r = Reader('reader.h5', index=True)
+    yield r
+    r.close()
+    db.delete_db()
+
+
+def test_indexes(reader):
+    assert reader.h5file.root.metadata.sim_timeseries.cols.t_idx.is_indexed
+    assert reader.h5file.root.th.th_timeseries.cols.component.is_indexed
+
+
+def test_read_only():
+    db = d.Database(filepath='reader.h5', mode='w')
+    fill(db)
+    # by default, the file is only read, and no index is created
+    with Reader('reader.h5') as r:
+        assert r.h5file.mode == 'r'
+        table = r.h5file.root.metadata.sim_timeseries
+        assert not table.cols.t_idx.is_indexed
+        t_idx, power = r.series('power', 5, 8)
+        assert list(power) == [6.0, 7.0, 8.0]
+    db.delete_db()
+
+
+def test_series(reader):
+    t_idx, power = reader.series('power', 5, 8)
+    assert list(t_idx) == [5, 6, 7]
+    assert list(power) == [6.0, 7.0, 8.0]
+    with pytest.raises(KeyError):
+        reader.series('zetas')
+
+
+def test_component(reader):
+    assert reader.components() == ['fuel', 'cool', 'refl']
+    t_idx, temp = reader.component('cool', start=18)
+    assert list(t_idx) == [18, 19]
+    assert list(temp) == [118.0, 119.0]
+
+
+def test_matrix(reader):
+    t_idx, temps = reader.matrix('temp', 2, 4, components=['refl', 'fuel'])
+    assert list(t_idx) == [2, 3]
+    assert np.array_equal(temps, [[202.0, 2.0], [203.0, 3.0]])
+
+
+def test_runs():
+    for run_id in ['a', 'b']:
+        db = d.Database(filepath='runs_reader.h5', mode='a', run_id=run_id)
+        db.add_row(db.get_shared_table('summary'),
+                   {'run_id': run_id,
+                    'peak_power': 2.0 if run_id == 'a' else 3.0})
+        fill(db)
+    with Reader('runs_reader.h5', index=True, run_id='b') as r:
+        assert r.runs() == ['a', 'b']
+        assert r.h5file.root.runs.b.th.th_timeseries.cols.t_idx.is_indexed
+        assert list(r.summary('peak_power > 2.5')['run_id']) == [b'b']
+        assert len(r.summary()) == 2
+        t_idx, temp = r.component('cool', start=18)
+        assert list(temp) == [118.0, 119.0]
+    db.delete_db()
@@ -0,0 +1,128 @@
+import os
+
+import numpy as np
+import pytest
+
+from pyrk import driver
+from pyrk.utilities import plotter
+
+infile = '''from pyrk.th_component import THComponent
+from pyrk.materials.material import Material
+from pyrk.density_model import DensityModel
+from pyrk.reactivity_insertion import StepReactivityInsertion
+from pyrk.db.policies import EveryN
+from pyrk.timer import Timer
+from pyrk.utilities.ur import units
+
+ti = Timer(t0=0 * units.seconds, tf=2 * units.seconds,
+           dt=0.1 * units.seconds)
+fission_iso = "u235"
+spectrum = "thermal"
+n_pg = 6
+n_dg = 11
+kappa = 0.0
+feedback = True
+solver = 'multirate'
+recording = RECORDING
+mat = Material(k=10 * units.watt / units.meter / units.kelvin,
+               cp=10 * units.joule / units.kg / units.kelvin,
+               dm=DensityModel(a=100 * units.kg / units.meter**3,
+                               model='constant'))
+fuel = THComponent(name='fuel', mat=mat, vol=1 * units.meter**3,
+                   T0=700 * units.kelvin, timer=ti, heatgen=True,
+                   power_tot=1000 * units.watt,
+                   alpha_temp=-5 * units.pcm / units.kelvin)
+cool = THComponent(name='cool', mat=mat, vol=1 * units.meter**3,
+                   T0=650 * units.kelvin, timer=ti)
+fuel.add_conduction('cool', area=1 * units.meter**2, L=1 * units.meter)
+cool.add_conduction('fuel', area=1 * units.meter**2, L=1 * units.meter)
+components = [fuel, cool]
+rho_ext = StepReactivityInsertion(timer=ti, t_step=0.2 * units.seconds,
+                                  rho_final=100 * units.pcm)
+'''
+
+
+def run(tmpdir, name, layout, recording='None'):
+    path = str(tmpdir.join(name + '.py'))
+    with open(path, 'w') as f:
+        f.write(infile.replace('RECORDING', recording))
+    return driver.run(driver.load_infile(path), str(tmpdir.join(name + '.h5')),
+                      layout=layout, show_progress=False)
+
+
+@pytest.fixture(params=['table', 'columnar'])
+def results(request, tmpdir):
+    res = run(tmpdir, 'results_' + request.param, request.param)
+    yield res
+    res.close()
+
+
+def test_columns(results):
+    assert results.components == ['fuel', 'cool']
+    power = np.asarray(results.power)
+    assert power.shape == (21,)
+    assert np.array_equal(results.power[::3], power[::3])
+    assert np.array_equal(results.power[::-2], power[::-2])
+    assert results.power[-1] == power[-1]
+    with pytest.raises(IndexError):
+        results.power[21]
+    assert np.array_equal(np.concatenate(list(results.power.chunks(7))),
+                          power)
+    assert len(results.power.thin(6)) <= 6
+    # the thinned rows end with the last timestep
+    assert np.array_equal(results.power.thin(6)[[0, -1]], power[[0, -1]])
+    assert np.array_equal(results.th_t_idx.thin(4), [0, 7, 14, 20])
+    assert results.zetas.shape == (21, 6)
+    assert results.omegas.shape == (21, 11)
+    temps = np.asarray(results.temps)
+    assert temps.shape == (21, 2)
+    assert np.array_equal(results.temp('cool')[5:9], temps[5:9, 1])
+    assert np.all(np.asarray(results.densities) == 100.0)
+    assert np.array_equal(results.th_t_idx[:], np.arange(21))
+    with pytest.raises(KeyError):
+        results.temp('refl')
+
+
+def test_results_end_at_tf(results):
+    # the results returned by the run hold its final state, at tf
+    assert np.isclose(results.time[-1], 2.0)
+    for t_idx in [results.th_t_idx, results.neutronics_t_idx]:
+        assert t_idx[-1] == 20
+        assert np.isclose(results.time_at(t_idx[-1:])[0], 2.0)
+
+
+def test_plots_end_at_tf(tmpdir, monkeypatch):
+    plotted = {}
+
+    def plot_lines(name, x, ys, labels, ylabel, plotdir='images'):
+        plotted[name] = x
+
+    monkeypatch.setattr(plotter, 'plot_lines', plot_lines)
+    with run(tmpdir, 'plotted', 'columnar',
+             "{'th': EveryN(3), 'neutronics': EveryN(6)}") as res:
+        plotter.plot_results(res, str(tmpdir.join('images')), max_points=4)
+    # every series is plotted to the end of the simulation
+    for name in ['power', 'reactivity', 'zetas', 'omegas', 'temps',
+                 'fuel Temp[K]']:
+        assert np.isclose(plotted[name][-1], 2.0)
+    assert all(np.isclose(x[-1], 2.0) for x in plotted['pow_and_rho'])
+
+
+def test_layouts_agree(tmpdir):
+    with run(tmpdir, 'agree_table', 'table') as table, \
+            run(tmpdir, 'agree_columnar', 'columnar') as columnar:
+        assert np.allclose(table.temps[:], columnar.temps[:])
+        assert np.allclose(table.rho[:], columnar.rho[:])
+
+
+def test_thinned_recording(tmpdir):
+    with run(tmpdir, 'thinned', 'columnar',
+             "{'th': EveryN(4), 'neutronics': EveryN(5)}") as res:
+        th_t_idx = res.th_t_idx[:]
+        assert list(th_t_idx) == [0, 4, 8, 12, 16, 20]
+        assert np.allclose(res.time_at(th_t_idx), 0.1 * th_t_idx)
+        assert len(res.rho) == 5
+        plotdir = str(tmpdir.join('images'))
+        plotter.plot_results(res, plotdir, max_points=3)
+        assert os.path.isfile(os.path.join(plotdir, 'temps.pdf'))
+        assert os.path.isfile(os.path.join(plotdir, 'omegas.pdf'))
@@ -48,6 +48,40 @@ class DensityModel(object):
         """
         return self.implemented[self.model](temp)
 
+    def drho_dtemp(self, temp=0 * units.kelvin):
+        """
+        Returns the derivative of the density with respect to the temperature.
+
+        :param temp: the temperature
+        :type temp: float.
+        """
+        if self.model == 'linear':
+            return self.b
+        return 0 * self.b
+
+    def rho_float(self, temp):
+        """
+        Returns the density, in kg/m^3, for a temperature given as a float in
+        kelvin. This is the unit-free counterpart of rho, for the integration
+        hot loop. Subclasses may override it with an implementation on floats.
+
+        :param temp: the temperature, in kelvin
+        :type temp: float.
+        """
+        return self.rho(temp * units.kelvin).to('kg/m**3').magnitude
+
+    def drho_dtemp_float(self, temp):
+        """
+        Returns the derivative of the density, in kg/m^3/K, for a temperature
+        given as a float in kelvin. This is the unit-free counterpart of
+        drho_dtemp.
+
+        :param temp: the temperature, in kelvin
+        :type temp: float.
+        """
+        return self.drho_dtemp(temp * units.kelvin).to(
+            'kg/m**3/kelvin').magnitude
+
     def constant(self, temp=0 * units.kelvin):
         """
         Returns a constant density, a.
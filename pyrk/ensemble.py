@@ -0,0 +1,280 @@
+# Licensed under a 3-clause BSD style license - see LICENSE
+"""
+Batched integration of an ensemble of simulations, e.g. the samples of a
+sensitivity study, with one vectorized right hand side.
+"""
+import importlib
+import random
+import numpy as np
+from scipy import sparse
+from scipy.integrate import BDF, Radau
+from pyrk import driver
+from pyrk.db import database
+from pyrk.inp import validation
+
+
+class EnsembleNetwork(object):
+
+    """This class stacks the THNetworks of an ensemble of simulations. The
+    networks must share their topology (components, heat transfer terms and
+    advection), only their coefficients may differ, so that dtemperature/dt
+    of every component of every sample is computed at once. Temperatures are
+    held as (n_samples, n_components) arrays.
+    """
+
+    def __init__(self, networks):
+        """Stacks the networks of an ensemble
+
+        :param networks: the compiled networks, one per sample
+        :type networks: list of THNetwork objects
+        """
+        first = networks[0]
+        for net in networks[1:]:
+            if not (net.n == first.n and
+                    np.array_equal(net.src, first.src) and
+                    np.array_equal(net.env, first.env) and
+                    np.array_equal(net.adv_idx, first.adv_idx) and
+                    np.array_equal(net.active, first.active)):
+                msg = "The heat transfer networks of an ensemble must have "
+                msg += "the same components and heat transfer terms."
+                raise ValueError(msg)
+        self.n = first.n
+        self.active = first.active
+        self.src = first.src
+        self.env = first.env
+        self.adv_idx = first.adv_idx
+        for name in ['cp', 'alpha', 'rho_a', 'rho_b', 'gen_power',
+                     'gen_omegas', 'coef', 'adv_coef', 'adv_tin']:
+            setattr(self, name,
+                    np.array([getattr(net, name) for net in networks],
+                             dtype=float))
+        self.densities = [(s, i, dm) for s, net in enumerate(networks)
+                          for i, dm in net.densities]
+        # sum the heat transfer terms into their components
+        self._src_op = sparse.csr_matrix(
+            (np.ones(len(self.src)), (self.src, np.arange(len(self.src)))),
+            shape=(self.n, len(self.src)))
+        self._adv_op = sparse.csr_matrix(
+            (np.ones(len(self.adv_idx)),
+             (self.adv_idx, np.arange(len(self.adv_idx)))),
+            shape=(self.n, len(self.adv_idx)))
+
+    def rho(self, temps):
+        """The densities of all components of all samples
+
+        :param temps: component temperatures, in kelvin
+        :type temps: np.ndarray
+        """
+        rho = self.rho_a + self.rho_b * temps
+        for s, i, dm in self.densities:
+            rho[s, i] = dm.rho_float(temps[s, i])
+        return rho
+
+    def heat(self, temps, power, omegas):
+        """The net volumetric heat gain of all components of all samples
+
+        :param temps: component temperatures, in kelvin
+        :type temps: np.ndarray
+        :param power: nuclear power density of each sample
+        :type power: np.ndarray
+        :param omegas: decay heat nuclear data of each sample
+        :type omegas: np.ndarray
+        """
+        q = (self._src_op @ (self.coef * temps[:, self.env]).T).T
+        # advection is off for components at 0K, for computation stability
+        t_adv = temps[:, self.adv_idx]
+        q_adv = self.adv_coef * (t_adv - self.adv_tin) * (t_adv != 0.0)
+        q -= (self._adv_op @ q_adv.T).T
+        q += self.gen_power * power[:, None] + \
+            self.gen_omegas * np.sum(omegas, axis=1)[:, None]
+        return q
+
+    def dtempdt(self, temps, power, omegas):
+        """compute dtemperature/dt of all components of all samples, 0 for
+        supercomponents
+
+        :param temps: component temperatures, in kelvin
+        :type temps: np.ndarray
+        :param power: nuclear power density of each sample
+        :type power: np.ndarray
+        :param omegas: decay heat nuclear data of each sample
+        :type omegas: np.ndarray
+        :return: dtemperature/dt, in kelvin/s
+        :rtype: np.ndarray
+        """
+        f = np.zeros_like(temps)
+        a = self.active
+        q = self.heat(temps, power, omegas)
+        f[:, a] = q[:, a] / (self.rho(temps)[:, a] * self.cp[:, a])
+        return f
+
+
+class Ensemble(object):
+
+    """This class integrates an ensemble of simulations, which differ only in
+    their parameters (material properties, heat transfer coefficients,
+    feedback coefficients, reactivity insertions...), as one
+    (n_samples, n_entries) state with one vectorized right hand side.
+    """
+
+    def __init__(self, sims):
+        """Creates an ensemble from its samples
+
+        :param sims: the simulations, one per sample
+        :type sims: list of SimInfo objects
+        """
+        if len(sims) == 0:
+            raise ValueError("An ensemble needs at least one simulation.")
+        first = sims[0]
+        if first.timer.history is not None:
+            msg = "An ensemble holds the solution of every timestep, its "
+            msg += "timer must not hold only a history of the latest ones."
+            raise ValueError(msg)
+        for si in sims[1:]:
+            if not (si.n_entries() == first.n_entries() and
+                    si.n_pg == first.n_pg and si.n_dg == first.n_dg and
+                    si.iso == first.iso and si.e == first.e and
+                    si.feedback == first.feedback and
+                    np.array_equal(si.timer.series.magnitude,
+                                   first.timer.series.magnitude) and
+                    si.timer.t_idx_feedback == first.timer.t_idx_feedback):
+                msg = "The simulations of an ensemble must share their "
+                msg += "timesteps, neutronics data and solution vector."
+                raise ValueError(msg)
+        self.sims = sims
+        self.timer = first.timer
+        self.ne = first.ne
+        self.feedback = first.feedback
+        self.n_n = 1 + first.n_pg + first.n_dg
+        self.network = EnsembleNetwork([si.th.network for si in sims])
+        self.y = np.zeros(shape=(self.timer.timesteps(), len(sims),
+                                 first.n_entries()), dtype=float)
+        self.rho = np.zeros(shape=(self.timer.timesteps(), len(sims)),
+                            dtype=float)
+        self.ts = 0
+
+    @classmethod
+    def from_infile(cls, infile_path, n_samples, seed=0, db=None):
+        """Creates an ensemble by importing an input file once per sample.
+        The random module is seeded with seed + sample index before each
+        import, so the samples are reproducible.
+
+        :param infile_path: path to the input file
+        :type infile_path: string
+        :param n_samples: the number of samples
+        :type n_samples: int
+        :param seed: the seed of the first sample
+        :type seed: int
+        :param db: the database holding the metadata of every sample, None
+          for one default Database shared by the samples
+        :type db: Database
+        """
+        validation.validate_g("n_samples", n_samples, 0)
+        if db is None:
+            db = database.Database()
+        infile = driver.load_infile(infile_path)
+        sims = []
+        for i in range(n_samples):
+            random.seed(seed + i)
+            np.random.seed(seed + i)
+            infile = importlib.reload(infile)
+            sims.append(driver.sim_from_infile(infile, db,
+                                               infile_path=infile_path))
+        return cls(sims)
+
+    def n_samples(self):
+        """The number of samples in the ensemble"""
+        return len(self.sims)
+
+    def rho_ext(self, t_idx):
+        """Returns the external reactivity of each sample at timestep t_idx,
+        in delta_k
+
+        :param t_idx: the timestep
+        :type t_idx: int
+        """
+        return np.array([si.ne.rho_ext_dk(t_idx) for si in self.sims],
+                        dtype=float)
+
+    def rho_feedback(self, t_idx, temps):
+        """Returns the temperature feedback reactivity of each sample at
+        timestep t_idx, driven by the component temperatures temps
+
+        :param t_idx: the timestep at which the reactivity is calculated
+        :type t_idx: int
+        :param temps: the component temperatures of each sample, in kelvin
+        :type temps: np.ndarray
+        """
+        t_fb = self.timer.t_idx_feedback
+        if not self.feedback or min(t_idx, self.ts) <= t_fb:
+            return np.zeros(shape=(self.n_samples(),), dtype=float)
+        t_ref = self.y[t_fb][:, self.n_n:]
+        return np.sum(self.network.alpha * (temps - t_ref), axis=1)
+
+    def f(self, t, y):
+        """Returns the derivative of the flattened state of the ensemble
+
+        :param t: the time [s]
+        :type t: float
+        :param y: the flattened (n_samples, n_entries) state
+        :type y: np.ndarray
+        """
+        n_n = self.n_n
+        end_pg = 1 + self.ne._npg
+        y = y.reshape(self.n_samples(), -1)
+        t_idx = self.timer.t_idx_float(t)
+        rho = self.rho_ext(t_idx) + self.rho_feedback(t_idx, y[:, n_n:])
+        f = np.empty_like(y)
+        f[:, :n_n] = self.ne.dndt(rho, y[:, :n_n])
+        f[:, n_n:] = self.network.dtempdt(y[:, n_n:], y[:, 0],
+                                          y[:, end_pg:n_n])
+        return f.ravel()
+
+    def solve(self, solver='BDF', rtol=1e-6, atol=1e-8):
+        """Integrates the ensemble with a stiff implicit integrator, which
+        takes its own internal steps, and interpolates the solution at each
+        timestep. The samples are independent, so the Jacobian is block
+        diagonal, and is estimated by finite differences of the vectorized
+        right hand side, one evaluation per entry of a single sample.
+
+        The solution of each sample is also copied into its SimInfo, which
+        holds the temperatures of its components, and its neutronics
+        reactivity.
+
+        :param solver: 'BDF' or 'Radau'
+        :type solver: string
+        :param rtol: relative tolerance of the integrator
+        :type rtol: float
+        :param atol: absolute tolerance of the integrator
+        :type atol: float
+        :return: the solution, of shape (timesteps, n_samples, n_entries)
+        :rtype: np.ndarray
+        """
+        integrators = {'BDF': BDF, 'Radau': Radau}
+        validation.validate_supported("solver", solver, list(integrators))
+        n_n = self.n_n
+        m = self.y.shape[2]
+        self.ts = 0
+        self.y[0] = np.array([driver.y0(si) for si in self.sims])
+        self.rho[0] = self.rho_ext(0)
+        tf = self.timer.series.magnitude[-1]
+        sparsity = sparse.kron(sparse.identity(self.n_samples()),
+                               np.ones(shape=(m, m)), format='csc')
+        sol = integrators[solver](self.f, self.timer.series.magnitude[0],
+                                  self.y[0].ravel(), tf, rtol=rtol, atol=atol,
+                                  jac_sparsity=sparsity)
+        while self.ts < self.timer.timesteps() - 1:
+            self.ts += 1
+            t = self.timer.series.magnitude[self.ts]
+            while sol.t < t:
+                msg = sol.step()
+                if sol.status == 'failed':
+                    raise RuntimeError(msg)
+            self.y[self.ts] = sol.dense_output()(t).reshape(
+                self.n_samples(), m)
+            self.rho[self.ts] = self.rho_ext(self.ts) + \
+                self.rho_feedback(self.ts, self.y[self.ts][:, n_n:])
+        for s, si in enumerate(self.sims):
+            si.y[:] = self.y[:, s]
+            si.ne._rho[:] = self.rho[:, s]
+        return self.y
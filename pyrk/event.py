@@ -0,0 +1,151 @@
+from pyrk.utilities.ur import units
+from pyrk.inp import validation
+
+
+class Event(object):
+    """This is the base event class from whence all others are derived.
+
+    An event occurs when its event function, g, crosses zero. The time of
+    the crossing is located by root finding on the interpolated solution,
+    recorded in the database and, if the event is terminal, the simulation
+    stops at the end of that timestep.
+    """
+
+    def __init__(self, name, terminal=False, direction=0):
+        """Creates an event to be detected during the simulation.
+
+        :param name: the name of the event, as recorded in the database
+        :type name: str
+        :param terminal: should the simulation stop when the event occurs?
+        :type terminal: bool
+        :param direction: the crossings that count as the event. Positive
+          for g rising through zero, negative for g falling through zero and
+          zero for both.
+        :type direction: int
+        """
+        self.name = name
+        self.terminal = terminal
+        self.direction = direction
+        self.times = []
+
+    def g(self, t, y, rho, si):
+        """The event function, the event occurs when it crosses zero
+
+        :param t: the time [s]
+        :type t: float
+        :param y: the full solution vector at time t
+        :type y: np.ndarray
+        :param rho: the total reactivity at time t, in delta_k
+        :type rho: float
+        :param si: the simulation info object
+        :type si: SimInfo
+        """
+        msg = "The event function g is not implemented for " + self.name
+        raise NotImplementedError(msg)
+
+    def crossed(self, g_old, g_new):
+        """Returns whether the event function crossed zero, in the direction
+        of this event, between two successive values.
+
+        :param g_old: the value of the event function at the earlier time
+        :type g_old: float
+        :param g_new: the value of the event function at the later time
+        :type g_new: float
+        """
+        up = g_old < 0 <= g_new
+        down = g_old > 0 >= g_new
+        if self.direction > 0:
+            return up
+        elif self.direction < 0:
+            return down
+        return up or down
+
+
+class PowerPeak(Event):
+    """The power peaks when its derivative falls through zero. Peaks are only
+    detected while the power is above min_power, so that noise around an
+    equilibrium is not mistaken for a peak.
+    """
+
+    def __init__(self, name='power_peak', terminal=False, min_power=0.0):
+        """Creates a power peak event
+
+        :param name: the name of the event, as recorded in the database
+        :type name: str
+        :param terminal: should the simulation stop at the peak?
+        :type terminal: bool
+        :param min_power: the normalized power above which peaks are detected
+        :type min_power: float
+        """
+        self.min_power = min_power
+        Event.__init__(self, name=name, terminal=terminal, direction=-1)
+
+    def g(self, t, y, rho, si):
+        if y[0] <= self.min_power:
+            return 1.0
+        n_n = 1 + si.n_pg + si.n_dg
+        if si.prompt_jump:
+            # the prompt jump power is linear in the precursors
+            dzetas = si.ne.dndt_prompt_jump(rho, y[:n_n])[1:1 + si.n_pg]
+            return si.ne.prompt_jump_power(rho, dzetas)
+        return si.ne.dndt(rho, y[:n_n])[0]
+
+
+class TemperatureThreshold(Event):
+    """A THComponent temperature crosses a limit, rising by default."""
+
+    def __init__(self, component, limit, name=None, terminal=False,
+                 direction=1):
+        """Creates a temperature threshold event
+
+        :param component: the name of the THComponent
+        :type component: str
+        :param limit: the temperature limit
+        :type limit: float, units of kelvin
+        :param name: the name of the event, by default component_limit
+        :type name: str
+        :param terminal: should the simulation stop at the crossing?
+        :type terminal: bool
+        :param direction: rising (positive), falling (negative) or both (0)
+        :type direction: int
+        """
+        self.component = component
+        self.limit = validation.validate_ge("limit", limit,
+                                            0.0 * units.kelvin)
+        self._limit = float(limit.to('kelvin').magnitude)
+        if name is None:
+            name = component + '_limit'
+        Event.__init__(self, name=name, terminal=terminal,
+                       direction=direction)
+
+    def g(self, t, y, rho, si):
+        n_n = 1 + si.n_pg + si.n_dg
+        names = [comp.name for comp in si.components]
+        if self.component not in names:
+            msg = "The temperature threshold " + self.name + " refers to "
+            msg += "the component " + self.component + ", which is not "
+            msg += "among the simulation components."
+            raise KeyError(msg)
+        return y[n_n + names.index(self.component)] - self._limit
+
+
+class ReactivitySignChange(Event):
+    """The total reactivity changes sign."""
+
+    def __init__(self, name='reactivity_sign_change', terminal=False,
+                 direction=0):
+        """Creates a reactivity sign change event
+
+        :param name: the name of the event, as recorded in the database
+        :type name: str
+        :param terminal: should the simulation stop at the sign change?
+        :type terminal: bool
+        :param direction: becoming positive (positive), becoming negative
+          (negative) or both (0)
+        :type direction: int
+        """
+        Event.__init__(self, name=name, terminal=terminal,
+                       direction=direction)
+
+    def g(self, t, y, rho, si):
+        return rho
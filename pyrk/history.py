@@ -0,0 +1,151 @@
+# Licensed under a 3-clause BSD style license - see LICENSE
+"""
+Constant-memory histories of the solution: ring buffers holding only the
+latest timesteps, and a few pinned ones, in place of arrays as long as the
+simulation. Everything older is streamed to the database by its recorders.
+"""
+import numpy as np
+from pyrk.utilities.ur import units
+
+
+class History(object):
+
+    """This class holds the values of a quantity at the latest capacity
+    timesteps, and at pinned timesteps (e.g. the reference of the temperature
+    feedback), indexed by timestep like a full length array. Indexing a
+    timestep beyond the latest one held advances the window to it, as a
+    write to a full length array would fill that row, and the rows that
+    leave the window can no longer be read.
+    """
+
+    def __init__(self, capacity, shape=(), pinned=(), unit=None,
+                 _data=None, _col=None):
+        """Creates a history, zeroed.
+
+        :param capacity: the number of latest timesteps held
+        :type capacity: int
+        :param shape: the shape of the value at each timestep, () for floats
+        :type shape: tuple
+        :param pinned: the timesteps that are held for the whole simulation
+        :type pinned: iterable of int
+        :param unit: the units of the values, None for floats
+        :type unit: str
+        """
+        self.capacity = int(capacity)
+        self.pinned = dict((int(p), self.capacity + i)
+                           for i, p in enumerate(sorted(set(pinned))))
+        self.unit = unit
+        if _data is None:
+            _data = (np.zeros(shape=(self.capacity + len(self.pinned),) +
+                              tuple(shape), dtype=float), [0])
+        # the buffer and the latest timestep are shared by views
+        self._data, self._latest = _data
+        self._col = _col
+
+    @property
+    def magnitude(self):
+        """A unitless view of this history, sharing its buffer"""
+        return History(self.capacity, pinned=self.pinned,
+                       _data=(self._data, self._latest), _col=self._col)
+
+    def column(self, col, unit=None):
+        """A view of one column of the values of this history, sharing its
+        buffer, e.g. the temperature of one component in the history of the
+        solution vector
+
+        :param col: the index of the column
+        :type col: int
+        :param unit: the units of the column, None for floats
+        :type unit: str
+        """
+        return History(self.capacity, pinned=self.pinned, unit=unit,
+                       _data=(self._data, self._latest), _col=col)
+
+    @property
+    def shape(self):
+        """The shape of the value at each timestep"""
+        if self._col is not None:
+            return self._data.shape[2:]
+        return self._data.shape[1:]
+
+    def _index(self, t_idx):
+        """The index of the buffer holding the value at timestep t_idx"""
+        if self._col is None:
+            return self.slot(t_idx)
+        return (self.slot(t_idx), self._col)
+
+    def latest(self):
+        """The latest timestep held"""
+        return self._latest[0]
+
+    def first(self):
+        """The first timestep of the window of latest timesteps"""
+        return max(0, self._latest[0] - self.capacity + 1)
+
+    def slot(self, t_idx):
+        """Returns the row of the buffer holding timestep t_idx, advancing the
+        window to it if it lies beyond the latest timestep held.
+
+        :param t_idx: the timestep
+        :type t_idx: int
+        """
+        t_idx = int(t_idx)
+        if t_idx > self._latest[0]:
+            self.advance(t_idx)
+        if t_idx in self.pinned:
+            return self.pinned[t_idx]
+        if t_idx < self.first() or t_idx < 0:
+            msg = "Timestep " + str(t_idx) + " is no longer held in memory, "
+            msg += "only timesteps " + str(self.first()) + " to "
+            msg += str(self._latest[0]) + " are. Earlier timesteps are "
+            msg += "streamed to the database."
+            raise IndexError(msg)
+        return t_idx % self.capacity
+
+    def advance(self, t_idx):
+        """Advances the window to end at timestep t_idx, zeroing the rows of
+        the timesteps that enter it.
+
+        :param t_idx: the new latest timestep
+        :type t_idx: int
+        """
+        start = max(self._latest[0] + 1, t_idx - self.capacity + 1)
+        for idx in range(start, t_idx + 1):
+            self._data[self.pinned.get(idx, idx % self.capacity)] = 0.0
+        self._latest[0] = t_idx
+
+    def window(self):
+        """Returns a copy of the values at the timesteps of the window, from
+        first() to latest()
+        """
+        return self[self.first():self._latest[0] + 1]
+
+    def __len__(self):
+        return self._latest[0] + 1
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self._latest[0] + 1)
+            rows = np.array([self._data[self._index(i)]
+                             for i in range(start, stop, step)],
+                            dtype=float).reshape((-1,) + self.shape)
+            return self._with_units(rows)
+        return self._with_units(self._data[self._index(key)])
+
+    def __setitem__(self, key, value):
+        if isinstance(value, units.Quantity):
+            value = value.to(self.unit).magnitude
+        if isinstance(key, slice):
+            start, stop, step = key.indices(max(self._latest[0] + 1,
+                                                key.stop or 0))
+            value = np.broadcast_to(value, (len(range(start, stop, step)),) +
+                                    self.shape)
+            for row, i in zip(value, range(start, stop, step)):
+                self._data[self._index(i)] = row
+        else:
+            self._data[self._index(key)] = value
+
+    def _with_units(self, value):
+        if self.unit is None:
+            return value
+        return units.Quantity(value, self.unit)
@@ -1,11 +1,15 @@
 # Licensed under a 3-clause BSD style license - see LICENSE
+import copy
 import numpy as np
+import tables as tb
 
 from pyrk.timer import Timer
 from pyrk import neutronics
 import pyrk.reactivity_insertion as ri
 from pyrk import th_system
 from pyrk.db import database
+from pyrk.inp import validation
+from pyrk.utilities.ur import units
 
 
 class SimInfo(object):
@@ -25,7 +29,16 @@ class SimInfo(object):
                  plotdir='images',
                  infile=None,
                  sim_id=None,
-                 db=None):
+                 db=None,
+                 solver='dopri5',
+                 rtol=1e-6,
+                 atol=1e-8,
+                 events=None,
+                 checkpoint=None,
+                 checkpoint_interval=100,
+                 steady_state=False,
+                 prompt_jump=False,
+                 recording=None):
         """This class holds information about a reactor kinetics simulation
 
         :param timer: the Timer object for the simulation
@@ -51,6 +64,39 @@ class SimInfo(object):
         :type feedback: bool
         :param plotdir: the directory where the plots will be placed
         :type plotdir: string
+        :param solver: the time integration scheme. 'dopri5' integrates the
+          neutronics and thermal hydraulics blocks separately, operator-split
+          at each timestep. 'BDF' and 'Radau' integrate the full, coupled
+          solution vector with a stiff implicit integrator. 'multirate' takes
+          a predicted and corrected linearly implicit thermal hydraulics step
+          per timestep, and subcycles the neutronics within it.
+        :type solver: string
+        :param rtol: relative tolerance of the coupled integrator, or of the
+          multirate neutronics substeps
+        :type rtol: float
+        :param atol: absolute tolerance of the coupled integrator, or of the
+          multirate neutronics substeps
+        :type atol: float
+        :param events: events to detect during the simulation
+        :type events: list of Event objects
+        :param checkpoint: the file where the state of the simulation is
+          periodically saved, None for no checkpoints
+        :type checkpoint: string
+        :param checkpoint_interval: number of timesteps between checkpoints
+        :type checkpoint_interval: int
+        :param steady_state: should the simulation start from the steady
+          state at nominal power, rather than from the component T0s?
+        :type steady_state: bool
+        :param prompt_jump: should the power follow the prompt jump (zero
+          prompt lifetime) approximation? Only the dopri5 solver supports it.
+        :type prompt_jump: bool
+        :param recording: the recording policies of the timeseries of each
+          group of the database ('metadata', 'neutronics' or 'th'), e.g.
+          {'th': Deadband(0.01)}, see pyrk.db.policies. The other groups are
+          recorded at every timestep. The policies without a watch function
+          watch the power for metadata, the neutronics block of the solution
+          for neutronics, and the temperatures for th.
+        :type recording: dict
         """
         self.timer = timer
         self.components = components if components else {}
@@ -62,11 +108,51 @@ class SimInfo(object):
         self.feedback = feedback
         self.ne = self.init_ne()
         self.kappa = kappa
-        self.th = th_system.THSystem(kappa=kappa, components=components)
-        self.y = np.zeros(shape=(timer.timesteps(), self.n_entries()),
-                          dtype=float)
+        self.th = th_system.THSystem(kappa=kappa, components=self.components)
+        self.th.compile()
+        self.y = timer.allocate(shape=(self.n_entries(),))
+        n_n = 1 + self.n_pg + self.n_dg
+        for i, c in enumerate(self.components):
+            c.share_history(self.y, n_n + i)
+        # the peaks of the fuel temperature are those of the heat generating
+        # components, or of every component if none generates heat
+        self.fuel = [i for i, c in enumerate(self.components) if c.heatgen]
+        if not self.fuel:
+            self.fuel = list(range(len(self.components)))
+        self.peaks = {'peak_power': -np.inf,
+                      't_peak_power': np.nan,
+                      'peak_fuel_temp': -np.inf,
+                      't_peak_fuel_temp': np.nan,
+                      'peak_fuel_component': ''}
+        self.sim_info_idx = -1
         self.plotdir = plotdir
         self.infile = infile
+        self.solver = validation.validate_supported("solver", solver,
+                                                    ['dopri5', 'BDF',
+                                                     'Radau', 'multirate'])
+        if prompt_jump and self.solver != 'dopri5':
+            msg = "The prompt jump approximation is only supported by the "
+            msg += "dopri5 solver, not " + self.solver + "."
+            raise ValueError(msg)
+        self.prompt_jump = prompt_jump
+        self.rtol = validation.validate_g("rtol", rtol, 0.0)
+        self.atol = validation.validate_g("atol", atol, 0.0)
+        self.events = []
+        for event in events if events else []:
+            self.add_event(event)
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = validation.validate_g(
+            "checkpoint_interval", checkpoint_interval, 0)
+        # the rows of the checkpoint rows file, see save_checkpoint
+        self.checkpoint_rows = 0
+        self.recording = dict(recording) if recording else {}
+        self.policies = {}
+        for groupname in self.recording:
+            validation.validate_supported("recording group", groupname,
+                                          ['metadata', 'neutronics', 'th'])
+        self.steady_state = steady_state
+        if steady_state:
+            self.solve_steady_state()
         if sim_id is not None:
             self.sim_id = sim_id
         else:
@@ -81,22 +167,131 @@ class SimInfo(object):
     def register_recorders(self):
         """Registers the function pointers that return database rows
         """
-        self.db.register_recorder('metadata', 'sim_info', self.metadata,
-                                  timeseries=False)
+        self.db.clock = self.recorded_step
+        if self.db.run_id is None:
+            self.db.register_recorder('metadata', 'sim_info', self.metadata,
+                                      timeseries=False)
+        else:
+            # the runs of a multi-run file share the row of their input file
+            self.sim_info_idx = self.db.add_shared_row('sim_info',
+                                                       self.metadata(),
+                                                       'inputblob')
         self.db.register_recorder('metadata', 'sim_timeseries', self.record,
-                                  timeseries=True)
+                                  timeseries=True,
+                                  policy=self.recording_policy('metadata'))
         self.db.register_recorder('neutronics', 'neutronics_params',
                                   self.ne.record,
-                                  timeseries=True)
+                                  timeseries=True,
+                                  policy=self.recording_policy('neutronics'))
 
         for c in self.components:
-            self.db.register_recorder('th', 'th_timeseries',
-                                      c.record,
-                                      timeseries=True)
+            if self.db.layout == 'table':
+                self.db.register_recorder('th', 'th_timeseries',
+                                          c.record,
+                                          timeseries=True,
+                                          policy=self.recording_policy('th'))
             self.db.register_recorder('th', 'th_params',
                                       c.metadata,
                                       timeseries=False)
-        # TODO: for all n_pg and n_dg, report zetas and omegas
+        if self.db.layout == 'columnar' and self.components:
+            self.register_th_arrays()
+        self.register_neutronics_arrays()
+
+    def register_th_arrays(self):
+        """Registers the recorders of the columnar layout of the thermal
+        hydraulics timeseries: the th/t_idx, th/temp and th/density arrays,
+        one row per timestep and one column per component. The constant
+        parameters of the components are only in th/th_params.
+        """
+        names = [c.name for c in self.components]
+        n_rows = self.timer.timesteps()
+        self.db.add_earray('th', 't_idx', None, 'TH Timesteps',
+                           atom=tb.Int64Atom(), expectedrows=n_rows)
+        self.db.add_earray('th', 'temp', names, 'TH Temperatures [K]',
+                           expectedrows=n_rows)
+        self.db.add_earray('th', 'density', names, 'TH Densities [kg/m^3]',
+                           expectedrows=n_rows)
+        policy = self.recording_policy('th')
+        self.db.register_recorder('th', 't_idx', self.record_t_idx,
+                                  timeseries=True, policy=policy)
+        self.db.register_recorder('th', 'temp', self.record_temps,
+                                  timeseries=True, policy=policy)
+        self.db.register_recorder('th', 'density', self.record_densities,
+                                  timeseries=True, policy=policy)
+
+    def register_neutronics_arrays(self):
+        """Registers the recorders of the neutronics/zetas and
+        neutronics/omegas arrays, the precursor concentrations and decay heat
+        fractions, one row per timestep (listed in neutronics/t_idx) and one
+        column per group. Each row is a slice of the solution vector.
+        """
+        n_rows = self.timer.timesteps()
+        policy = self.recording_policy('neutronics')
+        self.db.add_earray('neutronics', 't_idx', None,
+                           'Neutronics Timesteps', atom=tb.Int64Atom(),
+                           expectedrows=n_rows)
+        self.db.register_recorder('neutronics', 't_idx', self.record_t_idx,
+                                  timeseries=True, policy=policy)
+        if self.n_pg > 0:
+            self.db.add_earray('neutronics', 'zetas',
+                               ['zeta_' + str(i) for i in range(self.n_pg)],
+                               'Neutron Precursor Concentrations',
+                               expectedrows=n_rows)
+            self.db.register_recorder('neutronics', 'zetas',
+                                      self.record_zetas, timeseries=True,
+                                      policy=policy)
+        if self.n_dg > 0:
+            self.db.add_earray('neutronics', 'omegas',
+                               ['omega_' + str(i) for i in range(self.n_dg)],
+                               'Decay Heat Fractions', expectedrows=n_rows)
+            self.db.register_recorder('neutronics', 'omegas',
+                                      self.record_omegas, timeseries=True,
+                                      policy=policy)
+
+    def recording_policy(self, groupname):
+        """Returns the recording policy of the timeseries of a group, see the
+        recording parameter, None to record every timestep. A policy without
+        a watch function watches the solution values of the group.
+
+        :param groupname: 'metadata', 'neutronics' or 'th'
+        :type groupname: str
+        """
+        if groupname in self.policies:
+            return self.policies[groupname]
+        policy = self.recording.get(groupname)
+        if policy is not None:
+            # the policies given may be shared by groups, or by simulations,
+            # each group records with a copy of its own
+            policy = copy.copy(policy)
+            if policy.watch is None:
+                n_n = 1 + self.n_pg + self.n_dg
+                cols = {'metadata': slice(0, 1),
+                        'neutronics': slice(0, n_n),
+                        'th': slice(n_n, None)}[groupname]
+                policy.watch = \
+                    lambda: self.y[self.timer.current_timestep() - 1][cols]
+        self.policies[groupname] = policy
+        return policy
+
+    def recorded_step(self):
+        """The clock of the database: the timestep that the recorders record,
+        the one before the current, and its time [s]
+        """
+        t_idx = self.timer.current_timestep() - 1
+        return t_idx, self.timer.t(t_idx).magnitude
+
+    def record_final(self):
+        """Records the last timestep solved in the database, whatever the
+        recording policies. The recorders record the timestep before the
+        current one, see recorded_step, so the timer is moved past it while
+        they do.
+        """
+        ts = self.timer.current_timestep()
+        self.timer.ts = ts + 1
+        try:
+            self.db.record_final()
+        finally:
+            self.timer.ts = ts
 
     def init_rho_ext(self, rho_ext):
         """Initializes reactivity insertion object for the none case.
@@ -147,8 +342,302 @@ class SimInfo(object):
             raise ValueError(msg)
         else:
             self.components[th_component.name] = th_component
+            self.th.compile()
             return th_component
 
+    def solve_steady_state(self):
+        """Solves for the equilibrium of the simulation at nominal power:
+        the precursor and decay heat equilibrium of the neutronics, and the
+        temperatures that balance the heat transfer of every component. The
+        component T0s and the first row of y are set to it, so that the
+        simulation starts from consistent initial conditions.
+
+        :return: the steady state solution vector
+        :rtype: np.ndarray
+        """
+        n_n = 1 + self.n_pg + self.n_dg
+        y = np.zeros(shape=(self.n_entries(),), dtype=float)
+        y[:n_n] = self.ne.equilibrium(1.0)
+        temps = np.array([c.T0.to('kelvin').magnitude
+                          for c in self.components], dtype=float)
+        y[n_n:] = self.th.steady_state(temps, y[0], y[1 + self.n_pg:n_n])
+        for c, temp in zip(self.components, y[n_n:]):
+            c.T0 = temp * units.kelvin
+        self.y[0] = y
+        return y
+
+    def add_event(self, event):
+        """Registers an event to be detected during the simulation. Each
+        occurrence is recorded in the metadata/events table.
+
+        :param event: the event to detect
+        :type event: Event
+        """
+        if event.name in [e.name for e in self.events]:
+            msg = "An event named "
+            msg += event.name
+            msg += " already exists in the simulation."
+            raise ValueError(msg)
+        self.events.append(event)
+        return event
+
+    def record_event(self, event, t, y):
+        """Records an occurrence of an event in the metadata/events table
+
+        :param event: the event that occurred
+        :type event: Event
+        :param t: the time [s] at which the event occurred
+        :type t: float
+        :param y: the full solution vector at time t
+        :type y: np.ndarray
+        """
+        event.times.append(t)
+        rec = {'name': event.name,
+               'time': t,
+               't_idx': self.timer.t_idx_float(t),
+               'power': y[0],
+               'terminal': event.terminal}
+        self.db.add_row(self.db.get_table('metadata', 'events'), rec)
+        return rec
+
+    def record_perf(self, perf):
+        """Records the performance counters of the simulation in the
+        metadata/perf table
+
+        :param perf: the performance counters
+        :type perf: Perf
+        """
+        table = self.db.get_table('metadata', 'perf')
+        for rec in perf.rows():
+            self.db.add_row(table, rec)
+
+    def track_peaks(self, t_idx):
+        """Updates the peak power and the peak fuel temperature, and their
+        times, with the solution at timestep t_idx, for the summary of the
+        simulation. The drivers track each timestep as it is solved, so the
+        peaks need not be held in memory, nor read from the database.
+
+        :param t_idx: the timestep
+        :type t_idx: int
+        """
+        y = self.y[t_idx]
+        t = self.timer.t(t_idx).magnitude
+        if y[0] > self.peaks['peak_power']:
+            self.peaks['peak_power'] = y[0]
+            self.peaks['t_peak_power'] = t
+        if self.components:
+            temps = y[1 + self.n_pg + self.n_dg:][self.fuel]
+            i = int(np.argmax(temps))
+            if temps[i] > self.peaks['peak_fuel_temp']:
+                self.peaks['peak_fuel_temp'] = temps[i]
+                self.peaks['t_peak_fuel_temp'] = t
+                self.peaks['peak_fuel_component'] = \
+                    self.components[self.fuel[i]].name
+
+    def summary(self):
+        """A recorder function for the summary table of a multi-run database,
+        the scalar outputs of the simulation up to the current timestep
+        """
+        ts = self.timer.current_timestep()
+        rec = {'run_id': self.db.run_id,
+               'sim_info_idx': self.sim_info_idx,
+               'simhash': self.sim_id,
+               'timestamp': self.get_timestamp()[0],
+               'tf': self.timer.t(ts).magnitude,
+               'timesteps': ts + 1,
+               'final_power': self.y[ts][0]}
+        rec.update(self.peaks)
+        return rec
+
+    def record_summary(self):
+        """Records the summary of the simulation in the summary table, if its
+        database is a run of a multi-run file, see Database.
+        """
+        if self.db.run_id is None:
+            return None
+        rec = self.summary()
+        self.db.add_row(self.db.get_shared_table('summary'), rec)
+        return rec
+
+    def first_held(self):
+        """The first timestep of the solution held in memory: 0, unless the
+        timer only holds a history of the latest timesteps.
+        """
+        if self.timer.history is None:
+            return 0
+        return max(0, self.timer.current_timestep() - self.timer.history + 1)
+
+    def held_timesteps(self):
+        """The timesteps of the solution held in memory, up to the current
+        one. With a timer history, these are the latest timesteps and the one
+        at which feedback starts.
+
+        :rtype: list of int
+        """
+        first = self.first_held()
+        held = list(range(first, self.timer.current_timestep() + 1))
+        if self.timer.t_idx_feedback < first:
+            held.insert(0, self.timer.t_idx_feedback)
+        return held
+
+    def solution(self):
+        """The solution from the first timestep held in memory, see
+        first_held, to the current timestep
+
+        :rtype: np.ndarray
+        """
+        return self.y[self.first_held():self.timer.current_timestep() + 1]
+
+    def save_checkpoint(self):
+        """Saves the state of the simulation at the current timestep to the
+        checkpoint file, from which load_checkpoint can resume it. The file
+        is replaced atomically, so a crash while saving leaves the previous
+        checkpoint intact. The rows buffered by the database are flushed
+        first, so that it holds every timestep recorded up to the
+        checkpoint.
+
+        With a timer history, the checkpoint holds the timesteps in memory
+        only, see held_timesteps. The earlier ones are only found in the
+        database of the simulation that saved it. Without one, the timesteps
+        solved since the previous checkpoint are appended to the rows file,
+        the checkpoint file followed by '.rows', and the checkpoint only
+        holds their number, so that each checkpoint writes its own timesteps
+        only.
+        """
+        import os
+        ts = self.timer.current_timestep()
+        self.db.flush()
+        if self.db.background:
+            self.db.wait_writer()
+        ckpt = {'ts': ts,
+                'names': np.array([c.name for c in self.components]),
+                'events': self.db.get_table('metadata', 'events').read()}
+        ckpt.update(self.peaks)
+        if self.timer.history is None:
+            path = self.checkpoint + '.rows'
+            width = self.n_entries() + 2
+            with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+                # the rows after those of the previous checkpoint are left
+                # over from a crash, or from another simulation
+                start = min(self.checkpoint_rows,
+                            f.seek(0, os.SEEK_END) // (8 * width))
+                f.truncate(start * 8 * width)
+                f.seek(start * 8 * width)
+                np.column_stack([self.timer.series.magnitude[start:ts + 1],
+                                 self.y[start:ts + 1],
+                                 self.ne._rho[start:ts + 1]]).tofile(f)
+            ckpt['nrows'] = ts + 1
+        else:
+            held = self.held_timesteps()
+            first = self.first_held()
+
+            def rows(history):
+                held_rows = history[first:ts + 1]
+                if held[0] < first:
+                    # the pinned timestep at which feedback starts
+                    held_rows = np.concatenate([[history[held[0]]],
+                                                held_rows])
+                return held_rows
+            ckpt.update(held=np.array(held),
+                        series=self.timer.series.magnitude[held],
+                        y=rows(self.y),
+                        rho=rows(self.ne._rho))
+        tmp = self.checkpoint + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, **ckpt)
+        os.replace(tmp, self.checkpoint)
+        if self.timer.history is None:
+            self.checkpoint_rows = ts + 1
+        return ts
+
+    def load_checkpoint(self, filepath):
+        """Restores the state of the simulation from a checkpoint file, so
+        that it resumes from the timestep at which it was saved. If its
+        database resumes that of the simulation that saved it, see
+        Database, the rows recorded after the checkpoint are removed from it.
+        Otherwise, the solution history up to that timestep is recorded again
+        in the database.
+
+        The simulation need not be identical to the one that saved the
+        checkpoint, e.g. a different reactivity insertion can branch off a
+        shared prefix, but the components and the timesteps up to the
+        checkpoint must match.
+
+        :param filepath: the checkpoint file
+        :type filepath: string
+        :return: the timestep the simulation resumes from
+        :rtype: int
+        """
+        import os
+        with np.load(filepath) as ckpt:
+            ts = int(ckpt['ts'])
+            if 'nrows' in ckpt:
+                nrows = int(ckpt['nrows'])
+                width = self.n_entries() + 2
+                rows = np.fromfile(filepath + '.rows', dtype=float,
+                                   count=nrows * width)
+                if len(rows) != nrows * width:
+                    msg = "The rows file of the checkpoint " + filepath
+                    msg += " is shorter than the checkpoint, or its "
+                    msg += "solution vector does not match."
+                    raise ValueError(msg)
+                rows = rows.reshape(nrows, width)
+                held = list(range(nrows))
+                series, y, rho = rows[:, 0], rows[:, 1:-1], rows[:, -1]
+            else:
+                nrows = 0
+                held = [int(i) for i in ckpt['held']]
+                series, y, rho = ckpt['series'], ckpt['y'], ckpt['rho']
+            names = [c.name for c in self.components]
+            if list(ckpt['names']) != names:
+                msg = "The checkpoint " + filepath + " holds the components "
+                msg += str(list(ckpt['names'])) + " but the simulation has "
+                msg += str(names) + "."
+                raise ValueError(msg)
+            if (ts >= self.timer.timesteps() or
+                    y.shape[1] != self.n_entries() or
+                    not np.allclose(series,
+                                    self.timer.series.magnitude[held])):
+                msg = "The timesteps or solution vector of the checkpoint "
+                msg += filepath + " do not match those of the simulation."
+                raise ValueError(msg)
+            for i, t_idx in enumerate(held):
+                self.y[t_idx] = y[i]
+                self.ne._rho[t_idx] = rho[i]
+            for k in self.peaks:
+                if k in ckpt:
+                    self.peaks[k] = ckpt[k].item()
+            occurrences = ckpt['events']
+        if (self.checkpoint is not None and
+                os.path.abspath(filepath) == os.path.abspath(self.checkpoint)):
+            # the next checkpoints append to the rows file
+            self.checkpoint_rows = nrows
+        self.timer.ts = ts
+        if (self.db.resume and
+                self.db.get_table('metadata', 'sim_timeseries').nrows > 0):
+            # the database was flushed when the checkpoint was saved
+            self.db.truncate(ts)
+        else:
+            # replay the recorders, each records the timestep before the
+            # current
+            for t_idx in [i + 1 for i in held[:-1]
+                          if i >= self.first_held()]:
+                self.timer.ts = t_idx
+                for c in self.components:
+                    c.prev_t_idx = t_idx - 1
+                self.db.record_all()
+        for c in self.components:
+            c.prev_t_idx = ts
+        events = dict((e.name, e) for e in self.events)
+        tab = self.db.get_table('metadata', 'events')
+        for row in occurrences:
+            name = row['name'].decode()
+            if name in events:
+                events[name].times.append(float(row['time']))
+            self.db.add_row(tab, dict((k, row[k])
+                                      for k in occurrences.dtype.names))
+        return ts
+
     def get_git_revision_hash(self):
         import subprocess
         return subprocess.check_output(['git', 'rev-parse', 'HEAD'])
@@ -202,6 +691,33 @@ class SimInfo(object):
                'plotdir': self.plotdir}
         return rec
 
+    def record_t_idx(self):
+        """A recorder function for the th/t_idx and neutronics/t_idx arrays
+        """
+        return self.timer.current_timestep() - 1
+
+    def record_zetas(self):
+        """A recorder function for the neutronics/zetas array
+        """
+        return self.y[self.timer.current_timestep() - 1][1:1 + self.n_pg]
+
+    def record_omegas(self):
+        """A recorder function for the neutronics/omegas array
+        """
+        n_n = 1 + self.n_pg + self.n_dg
+        return self.y[self.timer.current_timestep() - 1][1 + self.n_pg:n_n]
+
+    def record_temps(self):
+        """A recorder function for the th/temp array
+        """
+        n_n = 1 + self.n_pg + self.n_dg
+        return self.y[self.timer.current_timestep() - 1][n_n:]
+
+    def record_densities(self):
+        """A recorder function for the th/density array
+        """
+        return self.th.network.rho(self.record_temps())
+
     def record(self):
         """A recorder function for the metadata/sim_timeseries table
 
@@ -210,5 +726,6 @@ class SimInfo(object):
         t_idx = self.timer.current_timestep() - 1
         power = self.y[t_idx][0]
         rec = {'t_idx': t_idx,
+               'time': self.timer.t(t_idx).magnitude,
                'power': power}
         return rec
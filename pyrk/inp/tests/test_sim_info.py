@@ -87,3 +87,60 @@ def test_sim_id():
     assert not first_id == next_id
     info.db.close_db()
     info.db.delete_db()
+
+
+def test_steady_state():
+    import numpy as np
+    from pyrk.materials.material import Material
+    from pyrk.density_model import DensityModel
+    ti = Timer(t0=0 * units.seconds, tf=1 * units.seconds,
+               dt=0.1 * units.seconds)
+    mat = Material(k=10 * units.watt / units.meter / units.kelvin,
+                   cp=10 * units.joule / units.kg / units.kelvin,
+                   dm=DensityModel(a=100 * units.kg / units.meter**3,
+                                   model='constant'))
+    fuel = th_component.THComponent(name='fuel', mat=mat,
+                                    vol=1 * units.meter**3,
+                                    T0=700 * units.kelvin, timer=ti,
+                                    heatgen=True, power_tot=10 * units.watt)
+    cool = th_component.THComponent(name='cool', mat=mat,
+                                    vol=1 * units.meter**3,
+                                    T0=700 * units.kelvin, timer=ti)
+    fuel.add_conduction('cool', area=1 * units.meter**2, L=1 * units.meter)
+    cool.add_conduction('fuel', area=1 * units.meter**2, L=1 * units.meter)
+    cool.add_advection('cool', m_flow=1 * units.kg / units.second,
+                       t_in=600 * units.kelvin,
+                       cp=10 * units.joule / units.kg / units.kelvin)
+    info = si.SimInfo(timer=ti, components=[fuel, cool], n_decay=11,
+                      kappa=0.1, db=database.Database(mode='w'),
+                      steady_state=True)
+    assert info.db.get_table('neutronics', 'omegas').shape == (0, 11)
+    info.db.close_db()
+    info.db.delete_db()
+    y = info.y[0]
+    assert np.allclose(info.ne.dndt(0.0, y[:18]), 0.0)
+    assert np.allclose(info.th.network.dtempdt(y[18:], y[0], y[7:18]), 0.0)
+    assert fuel.T0.magnitude == y[18]
+    assert fuel.temp(0) == fuel.T0
+
+
+def test_shared_temperatures():
+    import numpy as np
+    for history in [None, 3]:
+        ti = Timer(t0=0 * units.seconds, tf=1 * units.seconds,
+                   dt=0.1 * units.seconds, history=history)
+        fuel = th_component.THComponent(name='fuel', T0=700 * units.kelvin,
+                                        timer=ti)
+        cool = th_component.THComponent(name='cool', T0=650 * units.kelvin,
+                                        timer=ti)
+        info = si.SimInfo(timer=ti, components=[fuel, cool], n_decay=0,
+                          db=database.Database(mode='w'))
+        info.db.close_db()
+        info.db.delete_db()
+        # the temperatures are views of the last columns of y
+        assert fuel.temp(0) == 700 * units.kelvin
+        info.y[5][-2:] = [710.0, 655.0]
+        assert fuel.temp(5) == 710 * units.kelvin
+        assert cool.temp(5) == 655 * units.kelvin
+        cool.update_temp(6, 660 * units.kelvin)
+        assert np.array_equal(info.y[6][-2:], [0.0, 660.0])
@@ -120,6 +120,11 @@ class SodiumDensity(DensityModel):
         self.f = 275.32 * units.kg / pow(units.meter, 3)
         self.g = 511.58 * units.kg / pow(units.meter, 3)
         self.h = 0.5
+        # unit-free copies, for rho_float and drho_dtemp_float
+        self._rho_c = self.rho_c.to('kg/m**3').magnitude
+        self._T_c = self.T_c.to('kelvin').magnitude
+        self._f = self.f.to('kg/m**3').magnitude
+        self._g = self.g.to('kg/m**3').magnitude
 
     def hornung(self, temp=0.0 * units.kelvin):
         """In the hornung model, K. Hornung [Hornung, 1985] used the available
@@ -136,3 +141,32 @@ class SodiumDensity(DensityModel):
 
     def rho(self, temp=0.0 * units.kelvin):
         return self.hornung(temp)
+
+    def drho_dtemp(self, temp=0.0 * units.kelvin):
+        """The derivative of the hornung model with respect to temperature.
+
+        :param temp: the temperature of the sodium
+        :type temp: Quantity (units of kelvin)
+        """
+        to_ret = -(self.f + self.g * self.h *
+                   pow((1 - temp / self.T_c), self.h - 1)) / self.T_c
+        return to_ret.to('kg/m**3/kelvin')
+
+    def rho_float(self, temp):
+        """The hornung model, for a temperature given as a float in kelvin
+
+        :param temp: the temperature of the sodium, in kelvin
+        :type temp: float
+        """
+        x = 1 - temp / self._T_c
+        return self._rho_c + self._f * x + self._g * pow(x, self.h)
+
+    def drho_dtemp_float(self, temp):
+        """The derivative of the hornung model with respect to temperature,
+        for a temperature given as a float in kelvin
+
+        :param temp: the temperature of the sodium, in kelvin
+        :type temp: float
+        """
+        x = 1 - temp / self._T_c
+        return -(self._f + self._g * self.h * pow(x, self.h - 1)) / self._T_c
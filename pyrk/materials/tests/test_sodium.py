@@ -19,3 +19,10 @@ def test_constructor():
     assert tester.k == k_Na
     assert tester.cp == cp_Na
     assert isinstance(tester, LiquidMaterial)
+
+
+def test_drho_dtemp():
+    dT = 0.001 * units.kelvin
+    dm = tester.dm
+    fd = (dm.rho(T0 + dT) - dm.rho(T0 - dT)) / (2 * dT)
+    assert abs((dm.drho_dtemp(T0) - fd).magnitude) < 1e-6
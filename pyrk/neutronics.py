@@ -1,5 +1,6 @@
 # Licensed under a 3-clause BSD-style license
 import numpy as np
+from scipy.linalg import expm
 from pyrk.inp import validation as v
 
 from pyrk.data import precursors as pr
@@ -65,21 +66,62 @@ class Neutronics(object):
         self._timer = timer
         """_timer: the time instance object"""
 
-        self._rho = np.zeros(self._timer.timesteps())
-        """_rho (ndarray): An array of reactivity values for each timestep."""
+        self._rho = self._timer.allocate()
+        """_rho (ndarray or History): An array of reactivity values for each
+        timestep."""
 
         self._rho_ext = self.init_rho_ext(rho_ext).reactivity
         """_rho_ext (ReactivityInsertion): Reactivity function from the
         reactivity insertion model"""
 
+        self._rho_ext_dk = {}
+        """_rho_ext_dk (dict): The external reactivity, in delta_k, by
+        timestep, evaluated when first needed. If the timer has a history,
+        only its latest timesteps are held, see rho_ext_dk."""
+
+        self._betas = np.array(self._pd.betas()[:self._npg], dtype=float)
+        self._beta = self._pd.beta()
+        self._lams = np.array(self._pd.lambdas()[:self._npg], dtype=float)
+        self._Lambda = self._pd.Lambda()
+        self._kappas = np.array(self._dd.kappas()[:self._ndg], dtype=float)
+        self._dlams = np.array(self._dd.lambdas()[:self._ndg], dtype=float)
+        """Precursor and decay heat data, as float arrays, for dndt"""
+
         self.feedback = feedback
         """feedback (bool): False if no reactivity feedbacks, true otherwise"""
 
+        self._propagators = {}
+        """_propagators (dict): exact propagators of the neutronics block,
+        by reactivity level and timestep size"""
+
+        self._substep_propagators = {}
+        """_substep_propagators (dict): augmented exponentials of the
+        substeps of propagate_substeps, by reactivity, ramp and substep
+        size"""
+
     def init_rho_ext(self, rho_ext):
         if rho_ext is None:
             rho_ext = ReactivityInsertion(self._timer)
         return rho_ext
 
+    def rho_ext_dk(self, t_idx):
+        """Returns the external reactivity at timestep t_idx, in delta_k, for
+        the integration hot loop. It is evaluated once per timestep, and, if
+        the timer has a history, held only as long as the latest timesteps.
+
+        :param t_idx: the timestep
+        :type t_idx: int
+        """
+        rho = self._rho_ext_dk.get(t_idx)
+        if rho is None:
+            rho = float(self._rho_ext(t_idx=t_idx).to('delta_k').magnitude)
+            history = self._timer.history
+            if history is not None and len(self._rho_ext_dk) >= history:
+                # drop the earliest evaluated
+                del self._rho_ext_dk[next(iter(self._rho_ext_dk))]
+            self._rho_ext_dk[t_idx] = rho
+        return rho
+
     def dpdt(self, t_idx, components, power, zetas):
         """Calculates the power term. The first in the neutronics block.
 
@@ -136,8 +178,237 @@ class Neutronics(object):
         lam = self._dd.lambdas()[k]
         return kappa * p - lam * omega
 
+    def dndt(self, rho, y_n):
+        r"""Returns the derivative of the whole neutronics block (power, zetas
+        and omegas) at once. This is the unit-free counterpart of dpdt,
+        dzetadt and dwdt, for the integration hot loop.
+
+        The neutronics blocks of an ensemble of simulations may be passed at
+        once, as the rows of y_n, with one reactivity per row.
+
+        :param rho: the total reactivity, in $\Delta k$
+        :type rho: float, or np.ndarray for an ensemble
+        :param y_n: the neutronics block of the solution vector
+        :type y_n: np.ndarray
+        :return: the derivative of the neutronics block
+        :rtype: np.ndarray
+        """
+        end_pg = 1 + self._npg
+        power = y_n[..., 0]
+        f = np.empty_like(y_n, dtype=float)
+        f[..., 0] = power * (rho - self._beta) / self._Lambda + \
+            np.dot(y_n[..., 1:end_pg], self._lams)
+        f[..., 1:end_pg] = np.multiply.outer(power, self._betas) / \
+            self._Lambda - self._lams * y_n[..., 1:end_pg]
+        f[..., end_pg:] = np.multiply.outer(power, self._kappas) - \
+            self._dlams * y_n[..., end_pg:]
+        return f
+
+    def prompt_jump_power(self, rho, zetas):
+        r"""Returns the power of the prompt jump (zero prompt lifetime)
+        approximation, in which the power follows the precursors and the
+        reactivity instantaneously. The approximation only holds well below
+        prompt critical.
+
+        :param rho: the total reactivity, in $\Delta k$
+        :type rho: float
+        :param zetas: the delayed neutron precursor populations
+        :type zetas: np.ndarray
+        :return: the normalized reactor power
+        :rtype: float
+        """
+        if rho >= self._beta:
+            msg = "The prompt jump approximation does not hold at or above "
+            msg += "prompt critical, rho = " + str(rho) + " delta_k while "
+            msg += "beta = " + str(self._beta) + "."
+            raise ValueError(msg)
+        return self._Lambda * np.dot(zetas, self._lams) / (self._beta - rho)
+
+    def dndt_prompt_jump(self, rho, y_n):
+        r"""Returns the derivative of the neutronics block in the prompt jump
+        approximation. The power is algebraic, so its derivative is zero and
+        its entry in y_n is ignored: the precursors and decay heat are driven
+        by the prompt jump power, without the fast prompt neutron mode that
+        makes dndt stiff.
+
+        :param rho: the total reactivity, in $\Delta k$
+        :type rho: float
+        :param y_n: the neutronics block of the solution vector
+        :type y_n: np.ndarray
+        :return: the derivative of the neutronics block
+        :rtype: np.ndarray
+        """
+        end_pg = 1 + self._npg
+        power = self.prompt_jump_power(rho, y_n[1:end_pg])
+        f = np.empty_like(y_n, dtype=float)
+        f[0] = 0.0
+        f[1:end_pg] = self._betas * power / self._Lambda - \
+            self._lams * y_n[1:end_pg]
+        f[end_pg:] = self._kappas * power - self._dlams * y_n[end_pg:]
+        return f
+
+    def equilibrium(self, power):
+        """Returns the neutronics block at equilibrium (zero reactivity) for
+        a constant power: the precursor and decay heat populations are those
+        at which production balances decay.
+
+        :param power: the normalized reactor power
+        :type power: float
+        :return: the neutronics block of the solution vector
+        :rtype: np.ndarray
+        """
+        end_pg = 1 + self._npg
+        y_n = np.empty(shape=(end_pg + self._ndg,), dtype=float)
+        y_n[0] = power
+        y_n[1:end_pg] = self._betas * power / (self._Lambda * self._lams)
+        y_n[end_pg:] = self._kappas * power / self._dlams
+        return y_n
+
+    def jacobian(self, rho, power, alphas=None):
+        r"""Returns the partial derivatives of the neutronics block (dpdt,
+        dzetadt and dwdt) with respect to the neutronics block and to the
+        component temperatures.
+
+        :param rho: the total reactivity, in $\Delta k$
+        :type rho: float
+        :param power: the current reactor power
+        :type power: float.
+        :param alphas: temperature coefficients of reactivity of the
+          components, in $\Delta k/K$, or None when feedback is off
+        :type alphas: np.ndarray
+        :return: the derivatives with respect to the neutronics block and to
+          the component temperatures
+        :rtype: tuple of np.ndarray
+        """
+        end_pg = 1 + self._npg
+        n_n = end_pg + self._ndg
+        dn = np.zeros(shape=(n_n, n_n), dtype=float)
+        dn[0, 0] = (rho - self._beta) / self._Lambda
+        dn[0, 1:end_pg] = self._lams
+        dn[1:end_pg, 0] = self._betas / self._Lambda
+        dn[end_pg:, 0] = self._kappas
+        diag = np.arange(1, n_n)
+        dn[diag, diag] = -np.concatenate((self._lams, self._dlams))
+        if alphas is None:
+            dtemp = np.zeros(shape=(n_n, 0), dtype=float)
+        else:
+            dtemp = np.zeros(shape=(n_n, len(alphas)), dtype=float)
+            dtemp[0, :] = power * np.asarray(alphas) / self._Lambda
+        return dn, dtemp
+
+    def propagator(self, rho, dt):
+        r"""Returns the exact propagator of the neutronics block over a
+        timestep, at a constant reactivity: the matrix exponential of the
+        (linear, without feedback) point kinetics matrix. Propagators are
+        cached by reactivity level, so that step and impulse insertions only
+        compute a handful of them.
+
+        :param rho: the total reactivity, in $\Delta k$
+        :type rho: float
+        :param dt: the size of the timestep, in seconds
+        :type dt: float
+        :return: the matrix mapping the neutronics block from the start to
+          the end of the timestep
+        :rtype: np.ndarray
+        """
+        # timestep sizes of a uniform timer only differ by rounding
+        key = (rho, round(dt, 12))
+        if key not in self._propagators:
+            # a ramp reaches a new level every timestep, keep the cache small
+            if len(self._propagators) >= 256:
+                self._propagators.clear()
+            dn, dtemp = self.jacobian(rho, 0.0)
+            self._propagators[key] = expm(dn * dt)
+        return self._propagators[key]
+
+    def propagate(self, t_idx, dt, y_n):
+        """Advances the neutronics block, without feedback, to time step
+        t_idx, over which the external reactivity is constant.
+
+        :param t_idx: the time step at the end of the propagation
+        :type t_idx: int, index
+        :param dt: the size of the timestep, in seconds
+        :type dt: float
+        :param y_n: the neutronics block at the previous time step
+        :type y_n: np.ndarray
+        :return: the neutronics block at time step t_idx
+        :rtype: np.ndarray
+        """
+        rho = self.total_reactivity(t_idx)
+        return np.dot(self.propagator(rho, dt), y_n)
+
+    def propagate_substeps(self, rhos, dt, y_n, ramps=None):
+        r"""Advances the neutronics block over a timestep divided into equal
+        substeps, over each of which the reactivity ramps linearly about its
+        value at the midpoint. Each substep is propagated by the exponential
+        of the fourth order Magnus expansion of the point kinetics matrix,
+        which is exact at a constant reactivity. The exponentials are cached
+        by reactivity level, ramp and substep size, like those of
+        propagator.
+
+        :param rhos: the total reactivity at the midpoint of each substep, in
+          $\Delta k$
+        :type rhos: np.ndarray
+        :param dt: the size of the whole timestep, in seconds
+        :type dt: float
+        :param y_n: the neutronics block at the start of the timestep
+        :type y_n: np.ndarray
+        :param ramps: the change of the reactivity over each substep, in
+          $\Delta k$, None if it is constant over each
+        :type ramps: np.ndarray
+        :return: the neutronics block at the end of the timestep, and its
+          time average over the timestep
+        :rtype: tuple of np.ndarray
+        """
+        n_n = len(y_n)
+        h = dt / len(rhos)
+        if ramps is None:
+            ramps = np.zeros(shape=(len(rhos),), dtype=float)
+        # the exponential of [[A, 0], [I, 0]] holds the propagator of A and
+        # its integral over the substep, which the average power needs
+        base = np.zeros(shape=(2 * n_n, 2 * n_n), dtype=float)
+        dn = self.jacobian(0.0, 0.0)[0]
+        base[:n_n, :n_n] = dn * h
+        base[n_n:, :n_n] = np.identity(n_n) * h
+        # only dpower/dt depends on the reactivity, so the commutator of the
+        # augmented matrix with its ramp is a row and a column
+        comm = np.zeros(shape=(2 * n_n, 2 * n_n), dtype=float)
+        comm[:n_n, 0] = dn[:, 0]
+        comm[0, :n_n] -= dn[0, :]
+        comm[n_n, 0] = 1.0
+        comm *= h * h / (12.0 * self._Lambda)
+        y = y_n
+        total = np.zeros(shape=(n_n,), dtype=float)
+        for rho, ramp in zip(rhos, ramps):
+            key = (rho, ramp, round(h, 12))
+            if key not in self._substep_propagators:
+                if len(self._substep_propagators) >= 256:
+                    self._substep_propagators.clear()
+                aug = base - comm * ramp
+                aug[0, 0] += rho * h / self._Lambda
+                self._substep_propagators[key] = expm(aug)
+            prop = self._substep_propagators[key]
+            total += np.dot(prop[n_n:, :n_n], y)
+            y = np.dot(prop[:n_n, :n_n], y)
+        return y, total / dt
+
+    def total_reactivity(self, t_idx, rho_feedback=0.0):
+        r"""Returns the total reactivity, in $\Delta k$, at time step t_idx,
+        from the external reactivity and a given feedback reactivity. This is
+        the unit-free counterpart of reactivity, for the integration hot
+        loop.
+
+        :param t_idx: time step that reactivity is calculated
+        :type t_idx: int, index
+        :param rho_feedback: the temperature feedback reactivity
+        :type rho_feedback: float, $\Delta k$
+        """
+        to_ret = self.rho_ext_dk(t_idx) + rho_feedback
+        self._rho[t_idx] = to_ret
+        return to_ret
+
     def reactivity(self, t_idx, components):
-        """Returns the reactivity, in $\Delta k$, at time t
+        r"""Returns the reactivity, in $\Delta k$, at time t
         :param t_idx: time step that reactivity is calculated
         :type t_idx: int, index
         :param t_idx_feedback: time step that temperature feedback starts
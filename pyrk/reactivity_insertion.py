@@ -150,8 +150,11 @@ class RampReactivityInsertion(ReactivityInsertion):
         if x < self.timer.t_idx(self.t_start):
             return self.rho_init
         elif x <= self.timer.t_idx(self.t_end):
-            return self.rho_init + \
-                self.slope() * (x - self.timer.t_idx(self.t_start))
+            # interpolate in time, the timesteps need not be uniform
+            t_start = self.timer.t(self.timer.t_idx(self.t_start))
+            t_end = self.timer.t(self.timer.t_idx(self.t_end))
+            frac = float((self.timer.t(x) - t_start) / (t_end - t_start))
+            return self.rho_init + (self.rho_rise - self.rho_init) * frac
         else:
             return self.rho_final
 
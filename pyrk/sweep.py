@@ -0,0 +1,215 @@
+# Licensed under a 3-clause BSD style license - see LICENSE
+"""
+Monte Carlo sensitivity sweeps. The samples of an input file, which draws its
+uncertain parameters from the random module, are simulated in a pool of
+worker processes and their results are gathered into a single hdf5 file. The
+full databases of the samples may also be gathered, as the runs of a
+multi-run database, see Database.
+"""
+import argparse
+import importlib
+import os
+import random
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import tables as tb
+from pyrk import driver
+from pyrk.db import database
+from pyrk.inp import validation
+
+
+def load_sample(infile_path, seed):
+    """Imports the input file with the random module and numpy.random seeded,
+    so that the sample it draws is reproducible.
+
+    :param infile_path: path to the input file
+    :type infile_path: string
+    :param seed: the seed of the sample
+    :type seed: int
+    """
+    name = driver.name_from_path(infile_path)
+    random.seed(seed)
+    np.random.seed(seed)
+    if name in sys.modules:
+        return importlib.reload(sys.modules[name])
+    return importlib.import_module(name)
+
+
+def run_id(seed):
+    """The id of the run of a sample in a multi-run database
+
+    :param seed: the seed of the sample
+    :type seed: int
+    """
+    return 'sample_' + str(seed)
+
+
+def run_sample(infile_path, seed, keep_db=False):
+    """Simulates one sample of the input file, without plots. The simulation
+    database is written to a temporary directory, which is removed once the
+    results are returned, unless it is kept.
+
+    :param infile_path: path to the input file
+    :type infile_path: string
+    :param seed: the seed of the sample
+    :type seed: int
+    :param keep_db: should the database be kept, as the run of a multi-run
+      file, for merge_runs? The caller removes its directory.
+    :type keep_db: bool
+    :return: the seed, the uncertain parameters of the sample, the power,
+      the reactivity and the component temperatures at each timestep, and
+      the path to the kept database. A simulation stopped early by a
+      terminal event, or whose timer only holds a history of the latest
+      timesteps, is padded with nan.
+    :rtype: dict
+    """
+    infile = load_sample(infile_path, seed)
+    tmpdir = tempfile.mkdtemp(prefix='pyrk_sweep_')
+    dbpath = os.path.join(tmpdir, 'pyrk.h5')
+    try:
+        db = database.Database(filepath=dbpath,
+                               run_id=run_id(seed) if keep_db else None)
+        si = driver.sim_from_infile(infile, db, infile_path=infile_path)
+        sol = driver.solve(si=si, y=si.y, infile=infile, show_progress=False)
+        db.close_db()
+    except BaseException:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        raise
+    if not keep_db:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    n_n = 1 + si.n_pg + si.n_dg
+    # with a timer history, only the latest timesteps are held
+    held = slice(si.first_held(), si.first_held() + len(sol))
+    y = np.full((si.timer.timesteps(), si.n_entries()), np.nan)
+    y[held] = sol
+    rho = np.full((si.timer.timesteps(),), np.nan)
+    rho[held] = si.ne._rho[held]
+    return {'seed': seed,
+            'uncertainty_param': np.asarray(
+                getattr(infile, 'uncertainty_param', []), dtype=float),
+            'time': si.timer.series.magnitude,
+            'components': [comp.name for comp in si.components],
+            'power': y[:, 0],
+            'rho': rho,
+            'temperatures': y[:, n_n:],
+            'db': dbpath if keep_db else None}
+
+
+def _run_sample(args):
+    return run_sample(*args)
+
+
+def sweep(infile_path, n_samples, seed=0, workers=None,
+          outfile='pyrk_sweep.h5', runs_db=None):
+    """Simulates n_samples samples of the input file in a pool of worker
+    processes. Sample i is drawn with the seed seed + i, whichever worker
+    runs it, so the sweep is reproducible for any number of workers.
+
+    Each worker writes the database of its samples to files of its own, and
+    with runs_db, this process merges them, as they complete, into runs_db,
+    as the runs 'sample_<seed>', so that it has a single writer.
+
+    :param infile_path: path to the input file
+    :type infile_path: string
+    :param n_samples: the number of samples
+    :type n_samples: int
+    :param seed: the seed of the first sample
+    :type seed: int
+    :param workers: the number of worker processes, by default one per core
+    :type workers: int
+    :param outfile: the hdf5 file gathering the results, None not to write it
+    :type outfile: str
+    :param runs_db: the multi-run database gathering the databases of the
+      samples, replaced if it exists, None not to write it
+    :type runs_db: str
+    :return: the results of each sample, stacked along the first axis
+    :rtype: dict
+    """
+    validation.validate_g("n_samples", n_samples, 0)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    validation.validate_g("workers", workers, 0)
+    infile_path = os.path.abspath(infile_path)
+    keep_db = runs_db is not None
+    if keep_db and os.path.exists(runs_db):
+        os.remove(runs_db)
+    tasks = [(infile_path, seed + i, keep_db) for i in range(n_samples)]
+    # a few chunks per worker keeps them busy until the end of the sweep
+    chunksize = max(1, n_samples // (4 * workers))
+    samples = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for s in pool.map(_run_sample, tasks, chunksize=chunksize):
+            if keep_db:
+                try:
+                    database.merge_runs(s['db'], runs_db)
+                finally:
+                    shutil.rmtree(os.path.dirname(s['db']),
+                                  ignore_errors=True)
+            samples.append(s)
+    results = {'time': samples[0]['time'],
+               'components': samples[0]['components']}
+    for key in ['seed', 'uncertainty_param', 'power', 'rho', 'temperatures']:
+        results[key] = np.array([s[key] for s in samples])
+    if outfile is not None:
+        write_results(results, outfile)
+    return results
+
+
+def write_results(results, outfile):
+    """Writes the gathered results of a sweep to an hdf5 file, with one array
+    per quantity, the samples along the first axis.
+
+    :param results: the results of the sweep
+    :type results: dict
+    :param outfile: the location of the h5 file
+    :type outfile: str
+    """
+    with tb.open_file(outfile, mode='w', title='PyRKSweep') as h5file:
+        h5file.create_array('/', 'seed', results['seed'], 'Sample Seeds')
+        h5file.create_array('/', 'uncertainty_param',
+                            results['uncertainty_param'],
+                            'Uncertain Parameters')
+        h5file.create_array('/', 'time', results['time'], 'Time [s]')
+        h5file.create_array('/', 'components',
+                            np.array(results['components'], dtype='S32'),
+                            'Component Names')
+        h5file.create_array('/', 'power', results['power'],
+                            'Normalized Power')
+        h5file.create_array('/', 'rho', results['rho'],
+                            'Total Reactivity [delta_k]')
+        h5file.create_array('/', 'temperatures', results['temperatures'],
+                            'Component Temperatures [K]')
+
+
+"""Run it as a script"""
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description='PyRK sensitivity sweep')
+    ap.add_argument('--infile',
+                    help='the name of the input file',
+                    default='input')
+    ap.add_argument('--samples',
+                    help='the number of samples',
+                    type=int,
+                    default=100)
+    ap.add_argument('--seed',
+                    help='the seed of the first sample',
+                    type=int,
+                    default=0)
+    ap.add_argument('--workers',
+                    help='the number of worker processes, one per core by '
+                         'default',
+                    type=int,
+                    default=None)
+    ap.add_argument('--outfile',
+                    help='the name of the sweep results file',
+                    default='pyrk_sweep.h5')
+    ap.add_argument('--runs_db',
+                    help='the name of the multi-run database gathering the '
+                         'database of each sample',
+                    default=None)
+    args = ap.parse_args()
+    sweep(args.infile, args.samples, seed=args.seed, workers=args.workers,
+          outfile=args.outfile, runs_db=args.runs_db)
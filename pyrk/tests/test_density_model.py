@@ -45,3 +45,8 @@ def test_flibe():
     assert dm_flibe.rho() == a_flibe
     assert (dm_flibe.rho(1 * units.kelvin) == a_flibe +
             b_flibe * 1.0 * units.kelvin)
+
+
+def test_drho_dtemp():
+    assert dm_constant.drho_dtemp(1 * units.kelvin) == 0 * beta
+    assert dm_linear.drho_dtemp(1 * units.kelvin) == beta
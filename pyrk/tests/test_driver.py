@@ -1,3 +1,6 @@
+import os
+import numpy as np
+import pytest
 from pyrk import driver
 
 
@@ -14,3 +17,387 @@ def test_name_from_path_has_p():
     assert driver.name_from_path("testp.py") == "testp"
     assert driver.name_from_path("~/testp.py") == "testp"
     assert driver.name_from_path("~/testp") == "testp"
+
+
+def coupled_sim(solver, windows=None, events=None, checkpoint=None,
+                rho_final=None, prompt_jump=False, history=None,
+                layout='table', recording=None, feedback=False, rtol=1e-6,
+                atol=1e-8, db=None):
+    from pyrk.inp import sim_info
+    from pyrk.db import database
+    from pyrk.th_component import THComponent
+    from pyrk.materials.material import Material
+    from pyrk.density_model import DensityModel
+    from pyrk.timer import Timer
+    from pyrk.reactivity_insertion import StepReactivityInsertion
+    from pyrk.utilities.ur import units
+    ti = Timer(t0=0 * units.seconds, tf=1 * units.seconds,
+               dt=0.1 * units.seconds, windows=windows, history=history)
+    rho_ext = None
+    if rho_final is not None:
+        rho_ext = StepReactivityInsertion(timer=ti, t_step=0.2 * units.seconds,
+                                          rho_final=rho_final)
+    mat = Material(k=10 * units.watt / units.meter / units.kelvin,
+                   cp=10 * units.joule / units.kg / units.kelvin,
+                   dm=DensityModel(a=100 * units.kg / units.meter**3,
+                                   model='constant'))
+    fuel = THComponent(name='fuel', mat=mat, vol=1 * units.meter**3,
+                       T0=700 * units.kelvin, timer=ti, heatgen=True,
+                       power_tot=10 * units.watt,
+                       alpha_temp=-10 * units.pcm / units.kelvin)
+    cool = THComponent(name='cool', mat=mat, vol=1 * units.meter**3,
+                       T0=650 * units.kelvin, timer=ti)
+    fuel.add_conduction('cool', area=1 * units.meter**2, L=1 * units.meter)
+    cool.add_conduction('fuel', area=1 * units.meter**2, L=1 * units.meter)
+    return sim_info.SimInfo(timer=ti, components=[fuel, cool], n_decay=0,
+                            db=db or database.Database(mode='w',
+                                                       layout=layout),
+                            solver=solver,
+                            events=events, checkpoint=checkpoint,
+                            checkpoint_interval=3, rho_ext=rho_ext,
+                            prompt_jump=prompt_jump, recording=recording,
+                            feedback=feedback, rtol=rtol, atol=atol)
+
+
+def test_f_coupled_shape():
+    si = coupled_sim('BDF')
+    f = driver.f_coupled(0.0, driver.y0(si), si)
+    assert f.shape == (si.n_entries(),)
+    si.db.close_db()
+    si.db.delete_db()
+
+
+def test_solve_coupled():
+    obs = {}
+    for solver in ['BDF', 'Radau']:
+        si = coupled_sim(solver)
+        obs[solver] = driver.solve(si, si.y, None)
+        si.db.close_db()
+        si.db.delete_db()
+        # no reactivity insertion, the power stays at equilibrium
+        assert np.allclose(obs[solver][:, 0], 1.0)
+    assert np.allclose(obs['BDF'], obs['Radau'], rtol=1e-4)
+
+
+def test_solve_coupled_windows():
+    from pyrk.utilities.ur import units
+    si = coupled_sim('BDF')
+    exp = driver.solve(si, si.y, None)
+    si.db.close_db()
+    si.db.delete_db()
+    si = coupled_sim('BDF', windows=[(0.2 * units.seconds,
+                                      0.3 * units.seconds,
+                                      0.01 * units.seconds)])
+    obs = driver.solve(si, si.y, None)
+    si.db.close_db()
+    si.db.delete_db()
+    assert len(obs) == len(exp) + 9
+    assert np.allclose(obs[-1], exp[-1], rtol=1e-5)
+
+
+def test_terminal_event():
+    from pyrk.event import TemperatureThreshold
+    from pyrk.utilities.ur import units
+    limit = TemperatureThreshold('fuel', 699.8 * units.kelvin, direction=-1,
+                                 terminal=True)
+    si = coupled_sim('BDF', events=[limit])
+    obs = driver.solve(si, si.y, None)
+    rows = si.db.get_table('metadata', 'events').read()
+    t_idx = si.db.get_table('metadata', 'sim_timeseries').col('t_idx')
+    si.db.close_db()
+    si.db.delete_db()
+
+    # the fuel cools by conduction, with a time constant of 50 s
+    def temp(t):
+        return 700 + 0.01 * (0.5 * t - 49.5 * (1 - np.exp(-0.02 * t)) / 0.02)
+    assert len(limit.times) == 1
+    assert np.isclose(temp(limit.times[0]), 699.8, rtol=0, atol=1e-3)
+    # the simulation stops at the end of the timestep of the event
+    assert len(obs) == 6
+    assert len(rows) == 1
+    assert rows[0]['name'] == b'fuel_limit'
+    assert rows[0]['terminal']
+    # and the timestep of the event is the last one recorded
+    assert list(t_idx) == list(range(6))
+
+
+def test_record_last_timestep():
+    from types import SimpleNamespace
+    from pyrk.db.policies import EveryN
+    from pyrk.utilities.ur import units
+    for solver in ['dopri5', 'BDF', 'Radau', 'multirate']:
+        for recording in [None, {'metadata': EveryN(7), 'th': EveryN(7)}]:
+            si = coupled_sim(solver, rho_final=50 * units.pcm,
+                             recording=recording)
+            sol = driver.solve(si, si.y, SimpleNamespace(nsteps=1000),
+                               show_progress=False)
+            rows = si.db.get_table('metadata', 'sim_timeseries').read()
+            th_t_idx = si.db.get_table('th', 'th_timeseries').col('t_idx')
+            si.db.close_db()
+            si.db.delete_db()
+            # the last timestep solved is recorded, whatever the policy
+            assert rows['t_idx'][-1] == len(sol) - 1 == 10
+            assert np.isclose(rows['time'][-1], 1.0)
+            assert rows['power'][-1] == sol[-1, 0]
+            assert th_t_idx[-1] == 10
+            if recording is not None:
+                assert list(rows['t_idx']) == [0, 7, 10]
+
+
+def test_restart(tmpdir):
+    ckpt = str(tmpdir.join('ckpt.npz'))
+    si = coupled_sim('BDF', checkpoint=ckpt)
+    exp = driver.solve(si, si.y, None).copy()
+    si.db.close_db()
+    si.db.delete_db()
+    # the last checkpoint is at timestep 9, of 10
+    si = coupled_sim('BDF')
+    assert si.load_checkpoint(ckpt) == 9
+    assert len(si.db.get_table('metadata', 'sim_timeseries').read()) == 9
+    assert np.array_equal(si.y[:10], exp[:10])
+    # the timesteps up to the checkpoint are in its rows file
+    width = si.n_entries() + 2
+    assert os.path.getsize(ckpt + '.rows') == 10 * width * 8
+    obs = driver.solve(si, si.y, None)
+    si.db.close_db()
+    si.db.delete_db()
+    assert np.allclose(obs, exp, rtol=1e-5)
+
+
+def test_restart_resumes_database(tmpdir):
+    from pyrk.db import database
+    ckpt = str(tmpdir.join('ckpt.npz'))
+    outfile = str(tmpdir.join('restart.h5'))
+    for history in [None, 4]:
+        si = coupled_sim('BDF', checkpoint=ckpt, history=history,
+                         db=database.Database(outfile))
+        driver.solve(si, si.y, None, show_progress=False)
+        exp = si.db.get_table('metadata', 'sim_timeseries').read()
+        si.db.close_db()
+        # the checkpoint at timestep 9 resumes the database of the run
+        si = coupled_sim('BDF', checkpoint=ckpt, history=history,
+                         db=database.Database(outfile, resume=True))
+        assert si.load_checkpoint(ckpt) == 9
+        t_idx = si.db.get_table('metadata', 'sim_timeseries').col('t_idx')
+        assert list(t_idx) == list(range(9))
+        driver.solve(si, si.y, None, show_progress=False)
+        obs = si.db.get_table('metadata', 'sim_timeseries').read()
+        n_params = si.db.get_table('th', 'th_params').nrows
+        perf_names = si.db.get_table('metadata', 'perf').col('name')
+        si.db.close_db()
+        assert np.array_equal(obs['t_idx'], exp['t_idx'])
+        assert np.allclose(obs['power'], exp['power'], rtol=1e-6)
+        # the parameters, and the counters of the resumed run, only once
+        assert n_params == 2
+        assert len(perf_names) == len(set(perf_names))
+        os.remove(outfile)
+
+
+def test_history(tmpdir):
+    from types import SimpleNamespace
+    from pyrk.utilities.ur import units
+    for solver in ['dopri5', 'BDF', 'multirate']:
+        obs = {}
+        power = {}
+        for history in [None, 4]:
+            si = coupled_sim(solver, rho_final=50 * units.pcm,
+                             history=history,
+                             checkpoint=str(tmpdir.join('ckpt.npz')))
+            obs[history] = driver.solve(si, si.y, SimpleNamespace(nsteps=1000),
+                                        show_progress=False)
+            power[history] = si.db.get_table('metadata',
+                                             'sim_timeseries').col('power')
+            si.db.close_db()
+            si.db.delete_db()
+        # only the latest timesteps are held, the rest is in the database
+        assert len(obs[4]) == 4
+        assert np.array_equal(obs[4], obs[None][-4:])
+        assert np.array_equal(power[4], power[None])
+    # the checkpoint at timestep 9 holds timesteps 6 to 9
+    si = coupled_sim('multirate', rho_final=50 * units.pcm, history=4)
+    assert si.load_checkpoint(str(tmpdir.join('ckpt.npz'))) == 9
+    assert len(si.db.get_table('metadata', 'sim_timeseries').read()) == 3
+    exp = obs[None]
+    obs = driver.solve(si, si.y, None, show_progress=False)
+    si.db.close_db()
+    si.db.delete_db()
+    assert np.allclose(obs, exp[-4:], rtol=1e-6)
+
+
+def test_columnar_layout():
+    from types import SimpleNamespace
+    for layout in ['table', 'columnar']:
+        si = coupled_sim('multirate', layout=layout)
+        driver.solve(si, si.y, SimpleNamespace(nsteps=1000),
+                     show_progress=False)
+        if layout == 'table':
+            rows = si.db.get_table('th', 'th_timeseries').read()
+        else:
+            temp = si.db.get_table('th', 'temp')
+            t_idx = si.db.get_table('th', 't_idx').read()
+            assert list(temp.attrs.columns) == ['fuel', 'cool']
+            assert np.array_equal(t_idx, np.arange(11))
+            assert np.array_equal(temp[:, 0],
+                                  rows['temp'][rows['component'] == b'fuel'])
+            assert np.array_equal(si.db.get_table('th', 'density')[:, 1],
+                                  rows['density'][rows['component'] ==
+                                                  b'cool'])
+        si.db.close_db()
+        si.db.delete_db()
+
+
+def test_zetas_omegas():
+    from pyrk.utilities.ur import units
+    si = coupled_sim('BDF', rho_final=50 * units.pcm)
+    sol = driver.solve(si, si.y, None, show_progress=False)
+    zetas = si.db.get_table('neutronics', 'zetas')
+    t_idx = si.db.get_table('neutronics', 't_idx').read()
+    assert zetas.shape == (11, 6)
+    assert zetas.attrs.columns[0] == 'zeta_0'
+    assert np.array_equal(zetas[:, 2], sol[t_idx, 3])
+    si.db.close_db()
+    si.db.delete_db()
+
+
+def test_jac_coupled():
+    si = coupled_sim('BDF')
+    si.timer.advance_one_timestep()
+    y = driver.y0(si) * 1.01
+    t = si.timer.current_time().magnitude
+    jac = driver.jac_coupled(t, y, si).toarray()
+    for j in range(len(y)):
+        eps = 1e-6 * max(abs(y[j]), 1.0)
+        yp = y.copy()
+        yp[j] += eps
+        ym = y.copy()
+        ym[j] -= eps
+        fd = (driver.f_coupled(t, yp, si) - driver.f_coupled(t, ym, si))
+        assert np.allclose(jac[:, j], fd / (2 * eps), rtol=1e-5, atol=1e-6)
+    si.db.close_db()
+    si.db.delete_db()
+
+
+def test_prompt_jump():
+    from types import SimpleNamespace
+    from pyrk.utilities.ur import units
+    infile = SimpleNamespace(nsteps=1000)
+    obs = {}
+    for prompt_jump in [False, True]:
+        si = coupled_sim('dopri5', rho_final=50 * units.pcm,
+                         prompt_jump=prompt_jump)
+        obs[prompt_jump] = driver.solve(si, si.y, infile).copy()
+        si.db.close_db()
+        si.db.delete_db()
+    # accuracy check against the full point kinetics, for a 0.06$ step
+    assert obs[True][-1, 0] > 1.05
+    assert np.allclose(obs[True][:, 0], obs[False][:, 0], rtol=1e-4)
+    assert np.allclose(obs[True][:, -2:], obs[False][:, -2:], rtol=1e-6)
+
+
+def test_solve_multirate():
+    from types import SimpleNamespace
+    from pyrk.utilities.ur import units
+    obs = {}
+    counts = {}
+    for feedback in [False, True]:
+        for solver, rtol, atol in [('BDF', 1e-10, 1e-12),
+                                   ('multirate', 1e-6, 1e-8)]:
+            si = coupled_sim(solver, rho_final=50 * units.pcm,
+                             feedback=feedback, rtol=rtol, atol=atol)
+            obs[solver, feedback] = driver.solve(
+                si, si.y, SimpleNamespace(nsteps=1000),
+                show_progress=False).copy()
+            rows = si.db.get_table('metadata', 'perf').read()
+            counts[solver, feedback] = dict(zip(rows['name'], rows['count']))
+            si.db.close_db()
+            si.db.delete_db()
+        # the external reactivity switches halfway through the timesteps, as
+        # in the coupled integrators
+        assert np.allclose(obs['multirate', feedback][:, 0],
+                           obs['BDF', feedback][:, 0], rtol=1e-5)
+        assert np.allclose(obs['multirate', feedback][:, -2:],
+                           obs['BDF', feedback][:, -2:], rtol=1e-7)
+        count = counts['multirate', feedback]
+        # a thermal step predicted and corrected per timestep, of two stages
+        assert count[b'steps_accepted'] == 10
+        assert count[b'subcycle_n'] == 10
+        assert count[b'dtempdt'] == 4 * 10
+        # the neutronics of both passes take at least 1, 1 and 2 substeps
+        assert count[b'substeps'] >= 4 * 10
+        # the step insertion halfway through a timestep needs refinement
+        assert count[b'substep_refinements'] >= 1
+    # the fuel cools, its negative temperature coefficient raises the power
+    assert obs['multirate', True][-1, 0] > obs['multirate', False][-1, 0] + 1e-3
+
+
+def test_perf():
+    from types import SimpleNamespace
+    from pyrk.utilities.ur import units
+    si = coupled_sim('dopri5', rho_final=50 * units.pcm)
+    driver.solve(si, si.y, SimpleNamespace(nsteps=1000), show_progress=False)
+    rows = si.db.get_table('metadata', 'perf').read()
+    counts = dict(zip(rows['name'], rows['count']))
+    si.db.close_db()
+    si.db.delete_db()
+    assert counts[b'solve'] == 1
+    assert counts[b'record_all'] == 10
+    # without feedback, the neutronics block is propagated, not integrated
+    assert b'f_n' not in counts
+    assert counts[b'f_th'] > 0
+    assert counts[b'th_steps_accepted'] >= 10
+    assert b'th_steps_rejected' in counts
+
+
+def test_recording_policies():
+    from pyrk.db.policies import EveryN, Deadband
+    from pyrk.utilities.ur import units
+    si = coupled_sim('multirate', layout='columnar', rho_final=50 * units.pcm,
+                     recording={'th': EveryN(4),
+                                'metadata': Deadband(0.05)})
+    sol = driver.solve(si, si.y, None, show_progress=False)
+    # the final timestep recorded is written, whatever the policy
+    t_idx = si.db.get_table('th', 't_idx').read()
+    assert list(t_idx) == [0, 4, 8, 10]
+    assert np.array_equal(si.db.get_table('th', 'temp')[:, 0],
+                          sol[t_idx, -2])
+    rows = si.db.get_table('metadata', 'sim_timeseries').read()
+    assert rows['t_idx'][0] == 0 and rows['t_idx'][-1] == 10
+    assert np.all(np.abs(np.diff(rows['power'][:-1])) > 0.05)
+    # the other groups are recorded at every timestep
+    assert len(si.db.get_table('neutronics', 't_idx').read()) == 11
+    si.db.close_db()
+    si.db.delete_db()
+
+
+def test_shared_recording_policy():
+    from pyrk.db.policies import Deadband
+    policy = Deadband(1.0)
+    sims = []
+    for i in range(2):
+        si = coupled_sim('multirate', layout='columnar',
+                         recording={'th': policy, 'neutronics': policy})
+        # each group watches its own columns, with a copy of the policy
+        assert si.recording_policy('th') is not policy
+        assert si.recording_policy('th') is si.recording_policy('th')
+        si.timer.advance_one_timestep()
+        si.y[0] = np.arange(si.n_entries())
+        n_n = 1 + si.n_pg + si.n_dg
+        assert np.array_equal(si.recording_policy('th').watch(),
+                              np.arange(n_n, si.n_entries()))
+        assert np.array_equal(si.recording_policy('neutronics').watch(),
+                              np.arange(n_n))
+        si.db.close_db()
+        sims.append(si)
+    assert policy.watch is None
+    # and the policies of each simulation watch its own solution
+    sims[1].y[0] = -1.0
+    assert np.all(sims[0].recording_policy('th').watch() >= n_n)
+    sims[0].db.delete_db()
+
+
+def test_restart_needs_checkpoint(tmpdir):
+    outfile = str(tmpdir.join('restart.h5'))
+    with pytest.raises(ValueError):
+        driver.run(None, outfile, restart=True)
+    # the outfile is left untouched
+    assert not tmpdir.join('restart.h5').exists()
@@ -0,0 +1,102 @@
+import numpy as np
+from pyrk import driver
+from pyrk.ensemble import Ensemble
+from pyrk.inp import sim_info
+from pyrk.db import database
+from pyrk.th_component import THComponent
+from pyrk.materials.material import Material
+from pyrk.density_model import DensityModel
+from pyrk.reactivity_insertion import StepReactivityInsertion
+from pyrk.timer import Timer
+from pyrk.utilities.ur import units
+
+
+def sample(k, alpha, db):
+    ti = Timer(t0=0 * units.seconds, tf=1 * units.seconds,
+               dt=0.1 * units.seconds)
+    mat = Material(k=k * units.watt / units.meter / units.kelvin,
+                   cp=10 * units.joule / units.kg / units.kelvin,
+                   dm=DensityModel(a=100 * units.kg / units.meter**3,
+                                   model='constant'))
+    fuel = THComponent(name='fuel', mat=mat, vol=1 * units.meter**3,
+                       T0=700 * units.kelvin, timer=ti, heatgen=True,
+                       power_tot=1000 * units.watt,
+                       alpha_temp=alpha * units.pcm / units.kelvin)
+    cool = THComponent(name='cool', mat=mat, vol=1 * units.meter**3,
+                       T0=650 * units.kelvin, timer=ti)
+    fuel.add_conduction('cool', area=1 * units.meter**2, L=1 * units.meter)
+    cool.add_conduction('fuel', area=1 * units.meter**2, L=1 * units.meter)
+    rho_ext = StepReactivityInsertion(timer=ti, t_step=0.2 * units.seconds,
+                                      rho_final=100 * units.pcm)
+    return sim_info.SimInfo(timer=ti, components=[fuel, cool], n_decay=0,
+                            feedback=True, rho_ext=rho_ext, db=db,
+                            solver='BDF')
+
+
+def test_ensemble():
+    params = [(10.0, -5.0), (20.0, -10.0), (5.0, 0.0)]
+    db = database.Database(mode='w')
+    ens = Ensemble([sample(k, alpha, db) for k, alpha in params])
+    obs = ens.solve()
+    assert obs.shape == (11, 3, 9)
+    for s, (k, alpha) in enumerate(params):
+        si = sample(k, alpha, db)
+        exp = driver.solve(si, si.y, None)
+        assert np.allclose(obs[:, s], exp, rtol=1e-4)
+        assert np.allclose(ens.sims[s].ne._rho, si.ne._rho, atol=1e-7)
+        assert np.allclose(ens.sims[s].components[0].T.magnitude, exp[:, 7],
+                           rtol=1e-4)
+    db.close_db()
+    db.delete_db()
+
+
+infile = '''import random
+from pyrk.th_component import THComponent
+from pyrk.materials.material import Material
+from pyrk.density_model import DensityModel
+from pyrk.reactivity_insertion import StepReactivityInsertion
+from pyrk.timer import Timer
+from pyrk.utilities.ur import units
+
+ti = Timer(t0=0 * units.seconds, tf=1 * units.seconds,
+           dt=0.1 * units.seconds)
+fission_iso = "u235"
+spectrum = "thermal"
+n_pg = 6
+n_dg = 0
+kappa = 0.0
+feedback = True
+solver = 'BDF'
+mat = Material(k=random.uniform(5.0, 20.0) * units.watt / units.meter /
+               units.kelvin,
+               cp=10 * units.joule / units.kg / units.kelvin,
+               dm=DensityModel(a=100 * units.kg / units.meter**3,
+                               model='constant'))
+fuel = THComponent(name='fuel', mat=mat, vol=1 * units.meter**3,
+                   T0=700 * units.kelvin, timer=ti, heatgen=True,
+                   power_tot=1000 * units.watt,
+                   alpha_temp=-5 * units.pcm / units.kelvin)
+cool = THComponent(name='cool', mat=mat, vol=1 * units.meter**3,
+                   T0=650 * units.kelvin, timer=ti)
+fuel.add_conduction('cool', area=1 * units.meter**2, L=1 * units.meter)
+cool.add_conduction('fuel', area=1 * units.meter**2, L=1 * units.meter)
+components = [fuel, cool]
+rho_ext = StepReactivityInsertion(timer=ti, t_step=0.2 * units.seconds,
+                                  rho_final=100 * units.pcm)
+'''
+
+
+def test_from_infile(tmpdir):
+    path = str(tmpdir.join('ensemble_input.py'))
+    with open(path, 'w') as f:
+        f.write(infile)
+    ens = Ensemble.from_infile(path, 3, seed=2)
+    # the samples share one default database, which none of them truncates
+    db = ens.sims[0].db
+    assert all(si.db is db for si in ens.sims)
+    assert db.h5file.isopen
+    assert db.get_table('metadata', 'sim_info').nrows == 3
+    assert len(set(si.components[0].k.magnitude for si in ens.sims)) == 3
+    assert ens.solve().shape == (11, 3, 9)
+    db.close_db()
+    db.delete_db()
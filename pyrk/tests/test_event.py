@@ -0,0 +1,28 @@
+import pytest
+from pyrk import event
+from pyrk.utilities.ur import units
+
+
+def test_crossed():
+    rising = event.Event('rising', direction=1)
+    falling = event.Event('falling', direction=-1)
+    both = event.Event('both')
+    assert rising.crossed(-1.0, 1.0)
+    assert not rising.crossed(1.0, -1.0)
+    assert falling.crossed(1.0, -1.0)
+    assert not falling.crossed(-1.0, 1.0)
+    assert both.crossed(-1.0, 1.0)
+    assert both.crossed(1.0, 0.0)
+    assert not both.crossed(1.0, 2.0)
+
+
+def test_default_g():
+    with pytest.raises(NotImplementedError):
+        event.Event('base').g(0.0, None, 0.0, None)
+
+
+def test_temperature_threshold_name():
+    e = event.TemperatureThreshold('fuel', 1000 * units.kelvin)
+    assert e.name == 'fuel_limit'
+    assert e.direction == 1
+    assert not e.terminal
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from pyrk.history import History
+from pyrk.utilities.ur import units
+
+
+def test_window():
+    h = History(3, shape=(2,), pinned=[1])
+    for t_idx in range(6):
+        h[t_idx][:] = t_idx
+    assert h.latest() == 5
+    assert h.first() == 3
+    assert np.array_equal(h.window(), [[3, 3], [4, 4], [5, 5]])
+    # the pinned timestep is held after it leaves the window
+    assert np.array_equal(h[1], [1, 1])
+    with pytest.raises(IndexError):
+        h[2]
+
+
+def test_advance_zeroes():
+    h = History(3)
+    h[0] = 1.0
+    h[1] = 2.0
+    assert h[4] == 0.0
+    assert h.latest() == 4
+
+
+def test_units():
+    h = History(3, unit='kelvin')
+    h[0] = 700 * units.kelvin
+    assert h[0] == 700 * units.kelvin
+    h.magnitude[1] = 650
+    assert h[1] == 650 * units.kelvin
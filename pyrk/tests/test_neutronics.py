@@ -1,4 +1,5 @@
 import pytest
+import numpy as np
 from pyrk import neutronics
 
 
@@ -22,4 +23,63 @@ def test_malformed_constructor():
     assert excinfo.type is ValueError
     with pytest.raises(ValueError) as excinfo:
         neutronics.Neutronics(n_decay=99)
-    assert excinfo.type is ValueError
\ No newline at end of file
+    assert excinfo.type is ValueError
+
+
+def test_dndt():
+    ne = neutronics.Neutronics()
+    y_n = np.linspace(1.0, 2.0, 1 + ne._npg + ne._ndg)
+    obs = ne.dndt(ne.total_reactivity(0), y_n)
+    zetas = y_n[1:1 + ne._npg]
+    omegas = y_n[1 + ne._npg:]
+    exp = [ne.dpdt(0, [], y_n[0], zetas)]
+    exp += [ne.dzetadt(0, y_n[0], z, j) for j, z in enumerate(zetas)]
+    exp += [ne.dwdt(y_n[0], w, k) for k, w in enumerate(omegas)]
+    assert np.allclose(obs, np.array(exp, dtype=float))
+
+
+def test_propagator():
+    from scipy.integrate import solve_ivp
+    ne = neutronics.Neutronics()
+    y0 = ne.equilibrium(1.0)
+    rho = 0.002
+    sol = solve_ivp(lambda t, y: ne.dndt(rho, y), (0.0, 0.5), y0,
+                    method='Radau', rtol=1e-10, atol=1e-12)
+    obs = np.dot(ne.propagator(rho, 0.5), y0)
+    assert np.allclose(obs, sol.y[:, -1], rtol=1e-6)
+    # the propagator is cached per reactivity level
+    assert ne.propagator(rho, 0.5) is ne.propagator(rho, 0.5)
+    assert np.allclose(ne.propagator(0.0, 0.5).dot(y0), y0)
+
+
+def test_prompt_jump():
+    ne = neutronics.Neutronics()
+    y0 = ne.equilibrium(2.0)
+    zetas = y0[1:1 + ne._npg]
+    assert np.isclose(ne.prompt_jump_power(0.0, zetas), 2.0)
+    assert np.allclose(ne.dndt_prompt_jump(0.0, y0), 0.0)
+    assert ne.prompt_jump_power(0.5 * ne._beta, zetas) > 2.0
+    with pytest.raises(ValueError):
+        ne.prompt_jump_power(ne._beta, zetas)
+
+
+def test_rho_ext_dk():
+    from pyrk.reactivity_insertion import StepReactivityInsertion
+    from pyrk.timer import Timer
+    from pyrk.utilities.ur import units
+    for history in [None, 4]:
+        ti = Timer(t0=0 * units.seconds, tf=10 * units.seconds,
+                   dt=0.1 * units.seconds, history=history)
+        rho_ext = StepReactivityInsertion(timer=ti, t_step=5 * units.seconds,
+                                          rho_final=100 * units.pcm)
+        ne = neutronics.Neutronics(timer=ti, rho_ext=rho_ext)
+        # evaluated when first needed, not for every timestep up front
+        assert ne._rho_ext_dk == {}
+        for t_idx in range(ti.timesteps()):
+            exp = rho_ext.reactivity(t_idx=t_idx).to('delta_k').magnitude
+            assert ne.rho_ext_dk(t_idx) == exp
+        if history is None:
+            assert len(ne._rho_ext_dk) == ti.timesteps()
+        else:
+            assert sorted(ne._rho_ext_dk) == [97, 98, 99, 100]
+        assert ne.rho_ext_dk(0) == 0.0
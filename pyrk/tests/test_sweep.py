@@ -0,0 +1,92 @@
+import numpy as np
+import tables as tb
+from pyrk import sweep
+
+infile = '''import random
+import numpy as np
+from pyrk.th_component import THComponent
+from pyrk.materials.material import Material
+from pyrk.density_model import DensityModel
+from pyrk.reactivity_insertion import StepReactivityInsertion
+from pyrk.timer import Timer
+from pyrk.utilities.ur import units
+
+ti = Timer(t0=0 * units.seconds, tf=1 * units.seconds,
+           dt=0.1 * units.seconds)
+fission_iso = "u235"
+spectrum = "thermal"
+n_pg = 6
+n_dg = 0
+kappa = 0.0
+feedback = True
+nsteps = 1000
+k = random.uniform(5.0, 20.0)
+alpha = random.gauss(-5.0, 1.0)
+uncertainty_param = np.array([k, alpha])
+mat = Material(k=k * units.watt / units.meter / units.kelvin,
+               cp=10 * units.joule / units.kg / units.kelvin,
+               dm=DensityModel(a=100 * units.kg / units.meter**3,
+                               model='constant'))
+fuel = THComponent(name='fuel', mat=mat, vol=1 * units.meter**3,
+                   T0=700 * units.kelvin, timer=ti, heatgen=True,
+                   power_tot=1000 * units.watt,
+                   alpha_temp=alpha * units.pcm / units.kelvin)
+cool = THComponent(name='cool', mat=mat, vol=1 * units.meter**3,
+                   T0=650 * units.kelvin, timer=ti)
+fuel.add_conduction('cool', area=1 * units.meter**2, L=1 * units.meter)
+cool.add_conduction('fuel', area=1 * units.meter**2, L=1 * units.meter)
+components = [fuel, cool]
+rho_ext = StepReactivityInsertion(timer=ti, t_step=0.2 * units.seconds,
+                                  rho_final=100 * units.pcm)
+'''
+
+
+def test_sweep(tmpdir):
+    path = str(tmpdir.join('sweep_input.py'))
+    with open(path, 'w') as f:
+        f.write(infile)
+    outfile = str(tmpdir.join('sweep.h5'))
+    obs = sweep.sweep(path, 4, seed=3, workers=2, outfile=outfile)
+    assert np.array_equal(obs['seed'], [3, 4, 5, 6])
+    assert obs['uncertainty_param'].shape == (4, 2)
+    assert obs['power'].shape == (4, 11)
+    assert obs['temperatures'].shape == (4, 11, 2)
+    assert obs['components'] == ['fuel', 'cool']
+    # the samples differ, and do not depend on the worker that ran them
+    assert len(np.unique(obs['uncertainty_param'][:, 0])) == 4
+    exp = sweep.run_sample(path, 5)
+    assert np.array_equal(obs['uncertainty_param'][2],
+                          exp['uncertainty_param'])
+    assert np.allclose(obs['power'][2], exp['power'])
+    with tb.open_file(outfile, mode='r') as h5file:
+        assert np.allclose(h5file.root.temperatures.read(),
+                           obs['temperatures'])
+        assert h5file.root.uncertainty_param.shape == (4, 2)
+
+
+def test_sweep_runs(tmpdir):
+    path = str(tmpdir.join('sweep_input.py'))
+    with open(path, 'w') as f:
+        f.write(infile)
+    runs_db = str(tmpdir.join('runs.h5'))
+    obs = sweep.sweep(path, 3, seed=1, workers=2, outfile=None,
+                      runs_db=runs_db)
+    with tb.open_file(runs_db, mode='r') as h5file:
+        assert sorted(h5file.root.runs._v_children) == ['sample_1',
+                                                        'sample_2',
+                                                        'sample_3']
+        # the samples share one input file
+        assert h5file.root.sim_info.nrows == 1
+        summary = h5file.root.summary.read()
+        power = h5file.root.runs.sample_2.metadata.sim_timeseries.col(
+            'power')
+    assert sorted(summary['run_id']) == [b'sample_1', b'sample_2',
+                                         b'sample_3']
+    for row in summary:
+        i = int(row['run_id'][len('sample_'):]) - 1
+        assert np.isclose(row['peak_power'], np.max(obs['power'][i]))
+        assert np.isclose(row['peak_fuel_temp'],
+                          np.max(obs['temperatures'][i][:, 0]))
+        assert row['peak_fuel_component'] == b'fuel'
+        assert row['timesteps'] == 11
+    assert np.allclose(power, obs['power'][1])
@@ -1,8 +1,10 @@
 import numpy as np
+import pytest
 from pyrk import th_system
 from  pyrk import th_component
 from pyrk.utilities.ur import units
 from pyrk.materials.material import Material
+from pyrk.density_model import DensityModel
 
 
 def test_dtempfueldt_returns_numbers():
@@ -31,3 +33,88 @@ def test_conduction_slab():
     th = th_system.THSystem(0, components)
     assert(th.conduction_slab(components[0], components[1], 0,
                               1 * units.meter, 1 * units.meter**2) > 0)
+
+
+def test_jacobian():
+    dm = DensityModel(a=1 * units.kg / units.meter**3, model='constant')
+    mat = Material(k=1 * units.watt / units.meter / units.kelvin,
+                   cp=1 * units.joule / units.kg / units.kelvin, dm=dm)
+    components = [th_component.THComponent(name='a', mat=mat,
+                                           T0=800 * units.kelvin),
+                  th_component.THComponent(name='b', mat=mat,
+                                           T0=700 * units.kelvin)]
+    components[0].add_conduction('b', area=2 * units.meter**2,
+                                 L=1 * units.meter)
+    net = th_system.THSystem(0, components).compile()
+    dpower, domegas, dtemp = net.jacobian(np.array([800.0, 700.0]), 1.0,
+                                          np.array([0, 0]))
+    assert dpower.shape == (2,)
+    assert domegas.shape == (2, 2)
+    assert np.array_equal(dtemp.toarray(), [[-2.0, 2.0], [0.0, 0.0]])
+
+
+def network_components():
+    from pyrk.materials.liquid_material import LiquidMaterial
+    dm = DensityModel(a=10 * units.kg / units.meter**3,
+                      b=0.5 * units.kg / units.meter**3 / units.kelvin,
+                      model='linear')
+    mat = Material(k=1 * units.watt / units.meter / units.kelvin,
+                   cp=2 * units.joule / units.kg / units.kelvin, dm=dm)
+    liq = LiquidMaterial(k=1 * units.watt / units.meter / units.kelvin,
+                         cp=3 * units.joule / units.kg / units.kelvin, dm=dm)
+    fuel = th_component.THComponent(name='fuel', mat=mat,
+                                    vol=1 * units.meter**3,
+                                    T0=900 * units.kelvin, heatgen=True,
+                                    power_tot=100 * units.watt)
+    mod = th_component.THComponent(name='mod', mat=mat,
+                                   vol=2 * units.meter**3,
+                                   T0=850 * units.kelvin)
+    cool = th_component.THComponent(name='cool', mat=liq,
+                                    vol=1 * units.meter**3,
+                                    T0=800 * units.kelvin)
+    fuel.add_conduction('mod', area=2 * units.meter**2, L=1 * units.meter)
+    mod.add_conduction('fuel', area=2 * units.meter**2, L=1 * units.meter)
+    mod.add_convection('cool', h=5 * units.watt / units.meter**2 /
+                       units.kelvin, area=1 * units.meter**2)
+    cool.add_convection('mod', h=5 * units.watt / units.meter**2 /
+                        units.kelvin, area=1 * units.meter**2)
+    cool.add_advection('cool', m_flow=1 * units.kg / units.second,
+                       t_in=700 * units.kelvin,
+                       cp=3 * units.joule / units.kg / units.kelvin)
+    return [fuel, mod, cool]
+
+
+def test_compiled_network():
+    components = network_components()
+    th = th_system.THSystem(0.1, components)
+    net = th.compile()
+    temps = np.array([900.0, 850.0, 800.0])
+    omegas = np.array([1.0, 2.0])
+    exp = [th.dtempdt(c, 1.5, omegas, 0).magnitude for c in components]
+    assert np.allclose(net.dtempdt(temps, 1.5, omegas), exp)
+    assert th.network is net
+
+
+def test_steady_state():
+    components = network_components()
+    th = th_system.THSystem(0.1, components)
+    omegas = np.array([1.0, 2.0])
+    temps = th.steady_state(np.array([900.0, 850.0, 800.0]), 1.5, omegas)
+    assert np.allclose(th.network.dtempdt(temps, 1.5, omegas), 0.0)
+    # the heat balance is linear, the initial guess does not matter
+    other = th.steady_state(np.array([500.0, 600.0, 700.0]), 1.5, omegas)
+    assert np.allclose(temps, other)
+
+
+def test_compile_convection():
+    components = network_components()
+    # convection needs a liquid component, to take its properties
+    components[2].mat = components[0].mat
+    with pytest.raises(TypeError):
+        th_system.THSystem(0.1, components).compile()
+    # and its heat must flow from the hotter component to the colder
+    components = network_components()
+    components[1].add_convection('cool', h=-5 * units.watt / units.meter**2 /
+                                 units.kelvin, area=1 * units.meter**2)
+    with pytest.raises(AssertionError):
+        th_system.THSystem(0.1, components).compile()
@@ -1,4 +1,5 @@
 import six
+import pytest
 
 from pyrk.utilities.ur import units
 from pyrk import timer
@@ -119,3 +120,28 @@ def test_idx_from_t_and_back():
         idx = trouble.idx_from_t(time=time, t0=t0, dt=dt)
         other_idx = trouble.idx_from_t(time=trouble.t(idx), t0=t0, dt=dt)
         assert idx == other_idx
+
+
+def test_t_idx_float():
+    for i in range(0, 50):
+        time = i * 0.005 * units.seconds
+        assert trouble.t_idx_float(time.magnitude) == trouble.t_idx(time)
+
+
+def test_windows():
+    ti = timer.Timer(t0=zero, tf=ten, dt=one,
+                     windows=[(one, 2.0 * units.seconds, ptone)])
+    assert ti.timesteps() == 20
+    assert ti.t(1) == one
+    assert ti.t(11) == 2.0 * units.seconds
+    assert ti.t(ti.timesteps() - 1) == ten
+    assert ti.t_idx(1.5 * units.seconds) == 6
+    assert ti.t_idx_float(1.52) == 6
+    assert np.all(np.diff(ti.series.magnitude) > 0)
+
+
+def test_overlapping_windows():
+    with pytest.raises(ValueError):
+        timer.Timer(t0=zero, tf=ten, dt=one,
+                    windows=[(one, 3.0 * units.seconds, ptone),
+                             (2.0 * units.seconds, 4.0 * units.seconds, ptone)])
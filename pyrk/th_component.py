@@ -1,8 +1,8 @@
 import six
-import numpy as np
 from pyrk.inp import validation
 from pyrk.utilities.ur import units
 from pyrk.timer import Timer
+from pyrk.history import History
 import math
 from pyrk.materials.material import Material
 from pyrk.convective_model import ConvectiveModel
@@ -63,8 +63,7 @@ class THComponent(object):
         self.cp = mat.cp
         self.dm = mat.dm
         self.timer = timer
-        self.T = units.Quantity(np.zeros(shape=(timer.timesteps(),),
-                                         dtype=float), 'kelvin')
+        self.T = timer.allocate(unit='kelvin')
         self.T[0] = T0
         self.T0 = T0
         self.alpha_temp = alpha_temp.to('delta_k/kelvin')
@@ -150,6 +149,25 @@ class THComponent(object):
         self.prev_t_idx = timestep
         return self.T[timestep]
 
+    def share_history(self, y, col):
+        """Makes the temperature history of this component a view of column
+        col of the solution history y, so that the temperatures are held
+        once, and are updated with the solution vector. The temperature at
+        the first timestep is kept.
+
+        :param y: the history of the solution vector
+        :type y: np.ndarray or History
+        :param col: the column of this component in the solution vector
+        :type col: int
+        """
+        T0 = self.T.magnitude[0]
+        if isinstance(y, History):
+            self.T = y.column(col, unit='kelvin')
+        else:
+            self.T = units.Quantity(y[:, col], 'kelvin')
+        self.T.magnitude[0] = T0
+        return self.T
+
     def dtemp(self, timestep):
         """calculate temperature difference between the given timestep and the
         timestep where feedback is turned on
@@ -338,8 +356,7 @@ class THSuperComponent(THComponent):
                              ri=0 * units.meter,
                              ro=0 * units.meter)
         self.sub_comp = sub_comp if sub_comp else []
-        self.T = units.Quantity(np.zeros(shape=(timer.timesteps(),),
-                                         dtype=float), 'kelvin')
+        self.T = timer.allocate(unit='kelvin')
         self.T[0] = T0
         self.conv = {}
         self.add_conduction_in_mesh()
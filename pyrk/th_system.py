@@ -1,6 +1,9 @@
 import six
+import numpy as np
+from scipy import sparse
 from pyrk.th_component import THSuperComponent
 from pyrk.utilities.ur import units
+from pyrk.utilities.perf import perf
 from pyrk.materials.liquid_material import LiquidMaterial
 
 
@@ -18,6 +21,7 @@ class THSystem(object):
     def __init__(self, kappa, components):
         self.kappa = kappa
         self.components = components
+        self.network = None
 
     def comp_from_name(self, name):
         """Returns the component with the matching name
@@ -125,6 +129,155 @@ class THSystem(object):
                 to_ret -= Qadv / cap / component.vol.magnitude
             return to_ret * units.kelvin / units.seconds
 
+    def steady_state(self, temps, power, omegas):
+        '''solve for the temperatures at which the heat transfer of every
+        component is balanced, from the compiled heat transfer network
+
+        :param temps: initial guess of the component temperatures, in kelvin
+        :type temps: np.ndarray
+        :param power: nuclear power density
+        :type power: float
+        :param omegas: decay heat nuclear data
+        :type omegas: np.ndarray
+        :return: the steady state component temperatures, in kelvin
+        :rtype: np.ndarray
+        '''
+        if self.network is None:
+            self.compile()
+        return self.network.steady_state(temps, power, omegas)
+
+    def compile(self):
+        '''lower the heat transfer terms of the components into the flat
+        arrays of a THNetwork, once, so that dtemperature/dt of all components
+        can be computed without walking the component dictionaries.
+
+        :return: the compiled network, also held in self.network
+        :rtype: THNetwork
+        '''
+        components = list(self.components)
+        n = len(components)
+        idx = dict((comp.name, i) for i, comp in enumerate(components))
+        net = THNetwork(n)
+        src = []
+        env = []
+        coef = []
+        adv_idx = []
+        adv_coef = []
+        adv_tin = []
+        for i, component in enumerate(components):
+            net.add_density(i, component.dm)
+            net.alpha[i] = component.alpha_temp.to('delta_k/kelvin').magnitude
+            if isinstance(component, THSuperComponent):
+                continue
+            net.active[i] = True
+            net.cp[i] = component.cp.to('joule/kg/kelvin').magnitude
+            vol = component.vol.to('meter**3').magnitude
+            if component.heatgen:
+                net.gen_power[i] = component.power_tot.to('watt').magnitude * \
+                    (1 - self.kappa) / vol
+                net.gen_omegas[i] = 1.0 / vol
+            for name, dq in six.iteritems(self.dheat_dtemp(component, 0)):
+                src.append(i)
+                env.append(idx[name])
+                coef.append(dq)
+            for name, d in six.iteritems(component.adv):
+                adv_idx.append(i)
+                adv_coef.append(2.0 * (d['m_flow'] * d['cp']).to(
+                    'watt/kelvin').magnitude / vol)
+                adv_tin.append(d['t_in'].to('kelvin').magnitude)
+        net.src = np.array(src, dtype=int)
+        net.env = np.array(env, dtype=int)
+        net.coef = np.array(coef, dtype=float)
+        net.adv_idx = np.array(adv_idx, dtype=int)
+        net.adv_coef = np.array(adv_coef, dtype=float)
+        net.adv_tin = np.array(adv_tin, dtype=float)
+        self.network = net
+        return net
+
+    def dheat_dtemp(self, component, t_idx):
+        '''compute the partial derivatives of the net volumetric heat gain of a
+        component (the numerator of dtempdt) by conduction and convection, with
+        respect to the temperatures of the components it exchanges heat with.
+        Each of these heat transfer terms is linear in the temperatures.
+
+        :param component: the component
+        :type component: THComponent
+        :param t_idx: the timestep that the derivatives are calculated for
+        :type t_idx: int
+        :return: derivatives, keyed by component name
+        :rtype: dict of floats
+        '''
+        to_ret = {}
+
+        def add(name, val):
+            to_ret[name] = to_ret.get(name, 0.0) + val
+
+        name = component.name
+        vol = component.vol.magnitude
+        k = component.k.magnitude
+        if component.sph and component.ri.magnitude == 0.0:
+            dr = (component.ro - component.ri).magnitude
+            add(name, -k / dr**2)
+        for interface, d in six.iteritems(component.convBC):
+            env = self.comp_from_name(interface)
+            h = d["h"].h(env.rho(t_idx), env.mat.mu).to(
+                'watt/meter**2/kelvin').magnitude
+            r_b = component.ro.magnitude
+            dr = component.ri.magnitude - component.ro.magnitude
+            denom = 1 / dr - h / k
+            R = d["R"].to('meter').magnitude
+            add(name, -k / (r_b * dr**2) * (r_b - R / (dr * denom)))
+            add(interface, -k / (r_b * dr**2) * R * h / k / denom)
+        for interface, d in six.iteritems(component.cond):
+            env = self.comp_from_name(interface)
+            if component.sph:
+                dr = (component.ro - component.ri).magnitude
+                r_b = component.ro.magnitude
+                add(name, -k / dr**2)
+                add(interface, k / r_b * env.ro.magnitude / dr**2)
+            else:
+                kAL = (component.k * d["area"] / d["L"]).to(
+                    'watt/kelvin').magnitude
+                add(name, -kAL)
+                add(interface, kAL)
+        for interface, d in six.iteritems(component.conv):
+            env = self.comp_from_name(interface)
+            if isinstance(env, THSuperComponent):
+                h = d['h'].h(component.rho(t_idx),
+                             component.mat.mu).to(
+                                 'watt/meter**2/kelvin').magnitude
+                hA = h * d['area'].to('meter**2').magnitude
+                for envname, d_env in six.iteritems(env.conv):
+                    k_env = d_env["k"].to('watt/meter/kelvin').magnitude
+                    dr = d_env["dr"].to('meter').magnitude
+                denom = 1 / dr - h / k_env
+                dq = hA / dr / denom / vol
+                add(name, -hA * (1 + h / k_env / denom) / vol)
+                add(env.sub_comp[-2].name, dq)
+            else:
+                if isinstance(component.mat, LiquidMaterial):
+                    h = d['h'].h(component.rho(t_idx), component.mat.mu)
+                else:
+                    if isinstance(env.mat, LiquidMaterial):
+                        h = d['h'].h(env.rho(t_idx), env.mat.mu)
+                    else:
+                        msg = 'neither of the components are liquid:'
+                        msg += env.name
+                        msg += ' and '
+                        msg += component.name
+                        raise TypeError(msg)
+                hA = (h * d['area']).to('watt/kelvin').magnitude
+                dq = hA / vol
+                add(name, -dq)
+                add(interface, dq)
+            # the convective heat flows from the hotter component to the
+            # colder, whatever their temperatures
+            assert dq >= 0, \
+                'convection from %s to %s, of coefficient %f W/m^3/K, ' \
+                'from low temperature to high is not physical' \
+                % (component.name, interface, dq)
+        return to_ret
+
     def BC_center(self, component, t_idx):
         '''Volumetric conductive heat flux Qconduction from the center of a
         sphere to the first boundary
@@ -300,3 +453,253 @@ class THSystem(object):
         used for the th/th_params table
         """
         return self.comp_from_name(component).metadata()
+
+
+class THNetwork(object):
+
+    """This class holds a THSystem lowered into flat arrays, one entry per
+    component or per heat transfer term, so that dtemperature/dt of all
+    components is computed with a handful of vectorized operations.
+
+    Conduction and convection between components are linear in their
+    temperatures, and are held as (src, env, coef) triplets: the net heat gain
+    of component src changes by coef per kelvin of component env. The heat
+    transfer coefficients are evaluated once, when the network is compiled.
+
+    All parameters are held as floats in SI units (and temperatures in
+    kelvin), so that the network may be evaluated without unit handling.
+    """
+
+    def __init__(self, n):
+        """Initializes an empty network of n components
+
+        :param n: the number of components
+        :type n: int
+        """
+        self.n = n
+        self.active = np.zeros(shape=(n,), dtype=bool)
+        self.cp = np.zeros(shape=(n,), dtype=float)
+        self.alpha = np.zeros(shape=(n,), dtype=float)
+        self.rho_a = np.zeros(shape=(n,), dtype=float)
+        self.rho_b = np.zeros(shape=(n,), dtype=float)
+        self.densities = []
+        self.gen_power = np.zeros(shape=(n,), dtype=float)
+        self.gen_omegas = np.zeros(shape=(n,), dtype=float)
+        self.src = np.zeros(shape=(0,), dtype=int)
+        self.env = np.zeros(shape=(0,), dtype=int)
+        self.coef = np.zeros(shape=(0,), dtype=float)
+        self.adv_idx = np.zeros(shape=(0,), dtype=int)
+        self.adv_coef = np.zeros(shape=(0,), dtype=float)
+        self.adv_tin = np.zeros(shape=(0,), dtype=float)
+
+    def add_density(self, i, dm):
+        """Registers the density model of component i. Linear and constant
+        models are held as coefficients, others are called individually.
+
+        :param i: the component index
+        :type i: int
+        :param dm: the density model of the component
+        :type dm: DensityModel
+        """
+        model = getattr(dm, 'model', None)
+        if model in ('linear', 'constant'):
+            self.rho_a[i] = dm.a.to('kg/m**3').magnitude
+            if model == 'linear':
+                self.rho_b[i] = dm.b.to('kg/m**3/kelvin').magnitude
+        else:
+            self.densities.append((i, dm))
+
+    def rho(self, temps):
+        """The densities of all components
+
+        :param temps: component temperatures, in kelvin
+        :type temps: np.ndarray
+        """
+        rho = self.rho_a + self.rho_b * temps
+        for i, dm in self.densities:
+            rho[i] = dm.rho_float(temps[i])
+        return rho
+
+    def drho_dtemp(self, temps):
+        """The derivatives of the densities of all components with respect to
+        their temperatures
+
+        :param temps: component temperatures, in kelvin
+        :type temps: np.ndarray
+        """
+        drho = self.rho_b.copy()
+        for i, dm in self.densities:
+            drho[i] = dm.drho_dtemp_float(temps[i])
+        return drho
+
+    def heat(self, temps, power, omegas):
+        """The net volumetric heat gain of all components, the numerator of
+        dtempdt
+
+        :param temps: component temperatures, in kelvin
+        :type temps: np.ndarray
+        :param power: nuclear power density
+        :type power: float
+        :param omegas: decay heat nuclear data
+        :type omegas: np.ndarray
+        """
+        q = np.bincount(self.src, weights=self.coef * temps[self.env],
+                        minlength=self.n)
+        # advection is off for components at 0K, for computation stability
+        t_adv = temps[self.adv_idx]
+        q_adv = self.adv_coef * (t_adv - self.adv_tin) * (t_adv != 0.0)
+        q -= np.bincount(self.adv_idx, weights=q_adv, minlength=self.n)
+        q += self.gen_power * power + self.gen_omegas * np.sum(omegas)
+        return q
+
+    @perf.timed('dtempdt')
+    def dtempdt(self, temps, power, omegas):
+        """compute dtemperature/dt of all components, 0 for supercomponents
+
+        :param temps: component temperatures, in kelvin
+        :type temps: np.ndarray
+        :param power: nuclear power density
+        :type power: float
+        :param omegas: decay heat nuclear data
+        :type omegas: np.ndarray
+        :return: dtemperature/dt, in kelvin/s
+        :rtype: np.ndarray
+        """
+        f = np.zeros(shape=(self.n,), dtype=float)
+        a = self.active
+        q = self.heat(temps, power, omegas)
+        f[a] = q[a] / (self.rho(temps)[a] * self.cp[a])
+        return f
+
+    def jacobian(self, temps, power, omegas):
+        """compute the partial derivatives of dtemperature/dt of all
+        components
+
+        :param temps: component temperatures, in kelvin
+        :type temps: np.ndarray
+        :param power: nuclear power density
+        :type power: float
+        :param omegas: decay heat nuclear data
+        :type omegas: np.ndarray
+        :return: the derivatives with respect to the power, to the omegas and
+          to the component temperatures
+        :rtype: np.ndarray, np.ndarray, scipy.sparse.csc_matrix
+        """
+        a = self.active
+        rho = self.rho(temps)
+        inv_cap = np.zeros(shape=(self.n,), dtype=float)
+        inv_cap[a] = 1.0 / (rho[a] * self.cp[a])
+        dpower = self.gen_power * inv_cap
+        domegas = np.outer(self.gen_omegas * inv_cap, np.ones(len(omegas)))
+        # the heat capacity depends on the temperature through the density
+        diag = np.zeros(shape=(self.n,), dtype=float)
+        diag[a] = -self.heat(temps, power, omegas)[a] * inv_cap[a] * \
+            self.drho_dtemp(temps)[a] / rho[a]
+        dtemp = sparse.diags(inv_cap) @ self.dheat_dtemp(temps) + \
+            sparse.diags(diag)
+        return dpower, domegas, dtemp.tocsc()
+
+    def dheat_dtemp(self, temps):
+        """compute the partial derivatives of the net volumetric heat gain of
+        all components with respect to the component temperatures
+
+        :param temps: component temperatures, in kelvin
+        :type temps: np.ndarray
+        :return: the derivatives, in W/m^3/K
+        :rtype: scipy.sparse.csc_matrix
+        """
+        t_adv = temps[self.adv_idx]
+        rows = np.concatenate((self.src, self.adv_idx))
+        cols = np.concatenate((self.env, self.adv_idx))
+        vals = np.concatenate((self.coef,
+                               -self.adv_coef * (t_adv != 0.0)))
+        dheat = sparse.coo_matrix((vals, (rows, cols)),
+                                  shape=(self.n, self.n))
+        return dheat.tocsc()
+
+    def rosenbrock_matrix(self, temps, power, omegas, dt):
+        """Factorizes the matrix of the linear systems solved by
+        rosenbrock_step, I - gamma*dt*J, with J the Jacobian of dtempdt.
+
+        :param temps: component temperatures, in kelvin
+        :type temps: np.ndarray
+        :param power: nuclear power density
+        :type power: float
+        :param omegas: decay heat nuclear data
+        :type omegas: np.ndarray
+        :param dt: the size of the step, in seconds
+        :type dt: float
+        :return: the sparse LU factorization
+        :rtype: scipy.sparse.linalg.SuperLU
+        """
+        from scipy.sparse.linalg import splu
+        gamma = 1.0 + 1.0 / np.sqrt(2.0)
+        dtemp = self.jacobian(temps, power, omegas)[2]
+        return splu(sparse.identity(self.n, format='csc') - gamma * dt * dtemp)
+
+    def rosenbrock_step(self, temps, power, omegas, dt, lu=None):
+        """Advances the component temperatures over dt, at a constant power,
+        by one step of ROS2, the second order, L-stable, linearly implicit
+        Rosenbrock method of Verwer et al. (1999). It takes two evaluations
+        of dtempdt and remains stable for steps much longer than the thermal
+        time constants. ROS2 is second order for any approximation of the
+        Jacobian, so the factorization of a previous step may be reused.
+
+        :param temps: component temperatures at the start of the step, in
+          kelvin
+        :type temps: np.ndarray
+        :param power: nuclear power density, averaged over the step
+        :type power: float
+        :param omegas: decay heat nuclear data, averaged over the step
+        :type omegas: np.ndarray
+        :param dt: the size of the step, in seconds
+        :type dt: float
+        :param lu: the factorization from rosenbrock_matrix, for the same dt,
+          or None to factorize at the start of this step
+        :type lu: scipy.sparse.linalg.SuperLU
+        :return: the component temperatures at the end of the step, in kelvin
+        :rtype: np.ndarray
+        """
+        if lu is None:
+            lu = self.rosenbrock_matrix(temps, power, omegas, dt)
+        k1 = lu.solve(self.dtempdt(temps, power, omegas))
+        k2 = lu.solve(self.dtempdt(temps + dt * k1, power, omegas) - 2.0 * k1)
+        return temps + dt * (1.5 * k1 + 0.5 * k2)
+
+    def steady_state(self, temps, power, omegas, tol=1e-10, maxiter=50):
+        """Solves for the temperatures at which the net heat gain of every
+        component is zero, for a constant power, by Newton iterations on the
+        sparse heat balance. Super components, and components without any
+        heat transfer (e.g. a fixed inlet), keep their temperatures.
+
+        :param temps: initial guess of the component temperatures, in kelvin
+        :type temps: np.ndarray
+        :param power: nuclear power density
+        :type power: float
+        :param omegas: decay heat nuclear data
+        :type omegas: np.ndarray
+        :param tol: relative tolerance on the temperature update
+        :type tol: float
+        :param maxiter: maximum number of Newton iterations
+        :type maxiter: int
+        :return: the steady state component temperatures, in kelvin
+        :rtype: np.ndarray
+        """
+        from scipy.sparse.linalg import spsolve
+        temps = np.array(temps, dtype=float)
+        coupled = np.diff(self.dheat_dtemp(temps).tocsr().indptr) > 0
+        a = np.flatnonzero(self.active & coupled)
+        for i in range(maxiter):
+            q = self.heat(temps, power, omegas)[a]
+            jac = self.dheat_dtemp(temps)[a][:, a]
+            dtemps = spsolve(jac.tocsc(), -q)
+            if not np.all(np.isfinite(dtemps)):
+                msg = "The heat balance has no steady state. Each component "
+                msg += "must be connected to a heat sink, e.g. advection."
+                raise RuntimeError(msg)
+            temps[a] += dtemps
+            if np.linalg.norm(dtemps) <= tol * np.linalg.norm(temps[a]):
+                return temps
+        msg = "The steady state was not found within "
+        msg += str(maxiter) + " Newton iterations."
+        raise RuntimeError(msg)
@@ -1,5 +1,6 @@
 import numpy as np
 from pyrk.inp import validation
+from pyrk.history import History
 from pyrk.utilities.ur import units
 import logging
 log = logging.getLogger(__name__)
@@ -12,26 +13,126 @@ class Timer(object):
                  t0=0.0 * units.seconds,
                  tf=1.0 * units.seconds,
                  dt=1.0 * units.seconds,
-                 t_feedback=0.0 * units.seconds):
+                 t_feedback=0.0 * units.seconds,
+                 windows=None,
+                 history=None):
         """Initialize the timer object. There should be only one.
 
+        The timesteps are the output grid of the simulation. The coupled
+        solvers take their own adaptive steps and interpolate onto it, so
+        the output can be fine where the transient is fast (e.g. around a
+        reactivity insertion) and coarse elsewhere, through windows.
+
         :param t0: first times in the simulation
         :type t0: float, units of seconds
         :param tf: last time in the simulation
         :type tf: float, units of seconds
         :param dt: size of the timestep
         :type dt: float, units of seconds
+        :param windows: (t_start, t_end, dt) tuples, each overriding the size
+          of the timestep between t_start and t_end
+        :type windows: list of tuples of floats, units of seconds
+        :param history: the number of latest timesteps of the solution held
+          in memory, None to hold every timestep. With a history, memory use
+          does not grow with the length of the simulation, and the earlier
+          timesteps are only found in the database.
+        :type history: int
         """
         self.t0 = validation.validate_ge("t0", t0, 0.0 * units.seconds)
         self.t_feedback = validation.validate_ge("t_feedback", t_feedback, t0)
         self.tf = validation.validate_ge("tf", tf, t_feedback)
         self.dt = validation.validate_g("dt", dt, 0.0 * units.seconds)
-        self.series = units.Quantity(np.linspace(start=t0.magnitude,
-                                                 stop=tf.magnitude,
-                                                 num=self.timesteps()),
-                                     'seconds')
+        self._t0 = float(self.t0.to('seconds').magnitude)
+        self._dt = float(self.dt.to('seconds').magnitude)
+        self.windows = self.validate_windows(windows)
+        if self.windows:
+            self._series = self.windowed_series()
+        else:
+            self._series = np.linspace(start=self._t0,
+                                       stop=float(tf.to('seconds').magnitude),
+                                       num=self.timesteps())
+        self.series = units.Quantity(self._series, 'seconds')
         self.ts = 0
         self.t_idx_feedback = self.t_idx(t_feedback)
+        if history is not None:
+            # the multirate solver extrapolates from the two timesteps before
+            history = validation.validate_ge("history", history, 3)
+        self.history = history
+
+    def allocate(self, shape=(), unit=None):
+        """Allocates the history of a quantity, zeroed, indexed by timestep.
+        This is an array over every timestep, or, if the timer has a history,
+        a History of the latest timesteps that also holds the one at which
+        feedback starts, the reference of the temperature feedback.
+
+        :param shape: the shape of the value at each timestep, () for floats
+        :type shape: tuple
+        :param unit: the units of the values, None for floats
+        :type unit: str
+        :return: the history of the quantity
+        :rtype: np.ndarray, Quantity or History
+        """
+        if self.history is not None:
+            return History(self.history, shape=shape,
+                           pinned=[self.t_idx_feedback], unit=unit)
+        arr = np.zeros(shape=(self.timesteps(),) + tuple(shape), dtype=float)
+        if unit is None:
+            return arr
+        return units.Quantity(arr, unit)
+
+    def validate_windows(self, windows):
+        """Checks that the output windows lie within the simulation, do not
+        overlap and have positive timesteps, and sorts them by start time.
+
+        :param windows: (t_start, t_end, dt) tuples
+        :type windows: list of tuples of floats, units of seconds
+        :return: the windows, as (t_start, t_end, dt) floats in seconds
+        :rtype: list of tuples
+        """
+        if windows is None:
+            return []
+        to_ret = []
+        for t_start, t_end, dt in windows:
+            validation.validate_ge("window t_start", t_start, self.t0)
+            validation.validate_le("window t_end", t_end, self.tf)
+            validation.validate_g("window t_end", t_end, t_start)
+            validation.validate_g("window dt", dt, 0.0 * units.seconds)
+            to_ret.append((float(t_start.to('seconds').magnitude),
+                           float(t_end.to('seconds').magnitude),
+                           float(dt.to('seconds').magnitude)))
+        to_ret.sort()
+        for prev, nxt in zip(to_ret[:-1], to_ret[1:]):
+            if nxt[0] < prev[1]:
+                msg = "Output windows must not overlap, but the window "
+                msg += "starting at " + str(nxt[0]) + " s begins before the "
+                msg += "window ending at " + str(prev[1]) + " s."
+                raise ValueError(msg)
+        return to_ret
+
+    def windowed_series(self):
+        """Builds the output grid from the windows, with the default dt
+        between them. Each segment is split evenly, with steps no larger than
+        its dt, so that the window boundaries lie on the grid.
+
+        :return: the times of the output grid, in seconds
+        :rtype: np.ndarray
+        """
+        tf = float(self.tf.to('seconds').magnitude)
+        segments = []
+        start = self._t0
+        for t_start, t_end, dt in self.windows:
+            if t_start > start:
+                segments.append((start, t_start, self._dt))
+            segments.append((t_start, t_end, dt))
+            start = t_end
+        if tf > start:
+            segments.append((start, tf, self._dt))
+        pts = []
+        for a, b, step in segments:
+            n = max(1, int(np.ceil((b - a) / step - 1e-9)))
+            pts.append(np.linspace(a, b, n + 1)[:-1])
+        pts.append([tf])
+        return np.concatenate(pts)
 
     def t_idx(self, time):
         """given the actual time, in seconds, this returns the index of t.
@@ -40,8 +141,27 @@ class Timer(object):
         :type time: float, units of seconds
         :return: index
         """
+        if self.windows:
+            return self.t_idx_float(float(time.to('seconds').magnitude))
         return self.idx_from_t(time=time, t0=self.t0, dt=self.dt)
 
+    def t_idx_float(self, time):
+        """given the actual time, as a float in seconds, this returns the
+        index of t. This is the unit-free counterpart of t_idx.
+
+        :param time: the actual time
+        :type time: float, in seconds
+        :return: index
+        """
+        if not self.windows:
+            return int(round((time - self._t0) / self._dt))
+        idx = int(np.searchsorted(self._series, time))
+        if idx == len(self._series):
+            return idx - 1
+        if idx > 0 and time - self._series[idx - 1] < self._series[idx] - time:
+            return idx - 1
+        return idx
+
     def idx_from_t(self, time, t0, dt):
         """given the any time, in seconds, this returns the index of t.
 
@@ -63,10 +183,14 @@ class Timer(object):
 
         :param t_idx: the index to convert to simulation time
         """
+        if self.windows:
+            return self.series[t_idx]
         return self.t0 + self.dt * float(t_idx)
 
     def timesteps(self):
         """Returns the number of timesteps in this simulation"""
+        if self.windows:
+            return len(self._series)
         return self.t_idx(self.tf) + 1
 
     def advance_one_timestep(self):
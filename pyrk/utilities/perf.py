@@ -0,0 +1,72 @@
+# Licensed under a 3-clause BSD style license - see LICENSE
+"""
+This module holds lightweight performance counters: the number of calls and
+the cumulative wall time of the phases of a simulation, cheap enough to stay
+on in production. They are written to the /metadata/perf table at the end of
+each simulation.
+"""
+import functools
+import time
+
+
+class Perf(object):
+    """This class accumulates counts and wall times, by name
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.times = {}
+
+    def reset(self):
+        """Forgets every count and time"""
+        self.counts.clear()
+        self.times.clear()
+
+    def add(self, name, count=1, elapsed=0.0):
+        """Adds to the count and the cumulative wall time of name
+
+        :param name: the name of the counter
+        :type name: str
+        :param count: the number of calls, or of steps, to add
+        :type count: int
+        :param elapsed: the wall time to add, in seconds
+        :type elapsed: float
+        """
+        self.counts[name] = self.counts.get(name, 0) + count
+        self.times[name] = self.times.get(name, 0.0) + elapsed
+
+    def count(self, name):
+        """The count of name, 0 if it was never added to
+
+        :param name: the name of the counter
+        :type name: str
+        """
+        return self.counts.get(name, 0)
+
+    def timed(self, name):
+        """A decorator that counts the calls of a function, and their wall
+        time, under name
+
+        :param name: the name of the counter
+        :type name: str
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.add(name, 1, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def rows(self):
+        """Returns the rows of the perf table, one per counter, by name"""
+        return [{'name': name,
+                 'count': self.counts[name],
+                 'time': self.times[name]} for name in sorted(self.counts)]
+
+
+perf = Perf()
+"""perf (Perf): the counters of the running simulation"""
@@ -21,7 +21,8 @@ def plot(y, si):
     """Creates plots for interesting values in the simulation.
     :param y: The full solution array
     :type y: np.ndarray"""
-    x = si.timer.series.magnitude
+    # a terminal event may have stopped the simulation before tf
+    x = si.timer.series.magnitude[:len(y)]
     plot_power(x, y, si)
     plot_reactivity(x, si)
     plot_power_w_reactivity(x=x, y=y, si=si)
@@ -36,7 +37,7 @@ def plot_reactivity(x, si):
     """Plots the reactivity
     :param x: The time series
     :type x: np.ndarray"""
-    plt.plot(x, si.ne._rho, color=my_colors(1, len(si.ne._rho)),
+    plt.plot(x, si.ne._rho[:len(x)], color=my_colors(1, len(si.ne._rho)),
              marker='.')
     plt.xlabel("Time [s]")
     plt.ylabel("Reactivity [$\Delta k/k$]")
@@ -55,7 +56,7 @@ def plot_power(x, y, si):
 
 def plot_power_w_reactivity(x, si, y):
     power = y[:, 0]
-    rho = si.ne._rho
+    rho = si.ne._rho[:len(x)]
     plt.plot(x, power, color=my_colors(0, 2), marker='.', label="Power")
     plt.plot(x, rho, color=my_colors(1, 2), marker='.',
              label="External Reactivity")
@@ -114,6 +115,70 @@ def plot_omegas(x, y, si):
     saveplot("omegas", plt)
 
 
+def plot_results(res, plotdir='images', max_points=10000):
+    """Creates the plots of the results of a simulation, read from its
+    database. At most max_points timesteps of each quantity are read, evenly
+    strided and up to the last, so that long simulations are never read
+    whole and are plotted to their end.
+
+    :param res: the results of the simulation
+    :type res: pyrk.db.results.Results
+    :param plotdir: the directory where the plots are placed
+    :type plotdir: str
+    :param max_points: the largest number of timesteps plotted
+    :type max_points: int
+    """
+    x = res.time.thin(max_points)
+    power = res.power.thin(max_points)
+    plot_lines("power", x, [power], [None], "Power [units]", plotdir)
+    x_n = res.time_at(res.neutronics_t_idx.thin(max_points))
+    rho = res.rho.thin(max_points)
+    plot_lines("reactivity", x_n, [rho], [None],
+               r"Reactivity [$\Delta k/k$]", plotdir)
+    plot_lines("pow_and_rho", [x, x_n], [power, rho],
+               ["Power", "Reactivity"],
+               r"Power and Reactivity [$\Delta k$]", plotdir)
+    for name, col, label in [('zetas', res.zetas, r'\zeta_i [\#/dr^3]'),
+                             ('omegas', res.omegas, r'\omega_i [\#/dr^3]')]:
+        if col is not None and col.ncols:
+            rows = col.thin(max_points)
+            plot_lines(name, x_n, rows.T,
+                       ["i = " + str(i + 1) for i in range(col.ncols)],
+                       "$" + label + "$", plotdir)
+    if res.temps is not None:
+        x_th = res.time_at(res.th_t_idx.thin(max_points))
+        temps = res.temps.thin(max_points)
+        plot_lines("temps", x_th, temps.T, res.components, "Temperature [K]",
+                   plotdir)
+        for num, name in enumerate(res.components):
+            plot_lines(name + " Temp[K]", x_th, [temps[:, num]], [name],
+                       "Temperature [K]", plotdir)
+
+
+def plot_lines(name, x, ys, labels, ylabel, plotdir='images'):
+    """Plots lines against time, and saves the plot
+
+    :param name: the name of the plot
+    :type name: str
+    :param x: the times, or the times of each line
+    :type x: np.ndarray, or list of them
+    :param ys: the values of each line
+    :type ys: list of np.ndarray
+    :param labels: the labels of the lines, None for no legend
+    :type labels: list of str
+    """
+    xs = x if isinstance(x, list) else [x] * len(ys)
+    for num, (x_i, y, label) in enumerate(zip(xs, ys, labels)):
+        plt.plot(x_i, y, color=my_colors(num, max(2, len(ys))), marker='.',
+                 label=label)
+    if any(label is not None for label in labels):
+        plt.legend()
+    plt.xlabel("Time [s]")
+    plt.ylabel(ylabel)
+    plt.title(ylabel)
+    saveplot(name, plt, plotdir)
+
+
 def saveplot(name, plt, plotdir='images'):
     if not os.path.exists(plotdir):
         os.makedirs(plotdir)
@@ -1,4 +1,5 @@
 from pyrk.timer import Timer
+from pyrk.utilities.perf import perf
 import sys
 import time
 
@@ -16,6 +17,7 @@ class ProgressBar(object):
         self.avg_time = 0
         self.last_progress = 0
 
+    @perf.timed('bar_update')
     def bar_update(self, timer=Timer()):
         """
         Responsible for filling the timebar.
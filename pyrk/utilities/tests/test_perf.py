@@ -0,0 +1,20 @@
+from pyrk.utilities.perf import Perf
+
+
+def test_timed():
+    perf = Perf()
+
+    @perf.timed('twice')
+    def twice(x):
+        return 2 * x
+
+    assert twice(3) == 6
+    assert twice(4) == 8
+    assert perf.count('twice') == 2
+    assert perf.times['twice'] >= 0.0
+    perf.add('steps', 5)
+    assert perf.rows() == [{'name': 'steps', 'count': 5, 'time': 0.0},
+                           {'name': 'twice', 'count': 2,
+                            'time': perf.times['twice']}]
+    perf.reset()
+    assert perf.count('twice') == 0